@@ -1,10 +1,14 @@
+import sys
 import time
 import logging
 import csv
 import os
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
-import re
+import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
 from dateutil import relativedelta
@@ -17,6 +21,15 @@ from selenium.common.exceptions import WebDriverException, NoSuchElementExceptio
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from review_index import ReviewIndex
+from review_time import parse_review_time
+
+# crawl_db.py dùng chung với Crawl_res_feature_Final.py nằm ở thư mục Crawl
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crawl_db import CrawlDB
+from crawl_scheduler import RecrawlScheduler
+from tab_pool import BACKGROUND_TAB_ARGUMENTS, TabPool, run_in_tabs
+
 # Cấu hình logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,7 +48,10 @@ REVIEW_FIELDNAMES = [
     "Service_type", "Meal_type", "Language", "Created_at", "Crawl_date"
 ]
 
-def setup_driver(headless=False):
+# Khóa dùng khi nhiều worker cùng khởi tạo trình duyệt
+driver_setup_lock = threading.Lock()
+
+def setup_driver(headless=False, background_tabs=False):
     chrome_options = Options()
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument("--start-maximized")
@@ -47,6 +63,10 @@ def setup_driver(headless=False):
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
+    if background_tabs:
+        # Tab nền (prefetch) phải tải với tốc độ bình thường
+        for argument in BACKGROUND_TAB_ARGUMENTS:
+            chrome_options.add_argument(argument)
 
     try:
         service = Service(ChromeDriverManager().install())
@@ -85,173 +105,434 @@ def check_for_existing_review(driver, existing_google_ids):
     for container in review_containers[-10:]:
         try:
             google_review_id = container.get_attribute("data-review-id")
-            if google_review_id in existing_google_ids:
+            if google_review_id and google_review_id in existing_google_ids:
                 return True
         except NoSuchElementException:
             pass
     return False
 
-def process_and_save_batch(driver, start_index, end_index, Restaurant_id, existing_reviews, output_file, next_id_ref):
-    review_containers = driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium")
-    batch_containers = review_containers[start_index:end_index]
-    new_reviews = []
+# Script tìm vị trí đánh giá watermark trong feed bằng selector theo data-review-id,
+# kèm số đánh giá đã tải và Review_time của đánh giá cuối cùng.
+FIND_WATERMARK_JS = """
+const gid = arguments[0];
+const containers = document.querySelectorAll("div.jftiEf.fontBodyMedium");
+const mark = document.querySelector('div.jftiEf.fontBodyMedium[data-review-id="' + CSS.escape(gid) + '"]');
+const last = containers.length ? containers[containers.length - 1].querySelector("span.rsqaWe") : null;
+return {
+    index: mark ? Array.prototype.indexOf.call(containers, mark) : -1,
+    count: containers.length,
+    last_time: last ? last.innerText : null
+};
+"""
+
+def find_watermark(driver, watermark):
+    """Tìm watermark (đánh giá mới nhất của lần crawl trước) trong feed đã sắp xếp Newest.
+
+    Nếu không thấy Google_review_id của watermark (vd. đánh giá đã bị xóa) nhưng
+    đánh giá cuối cùng đã cũ hơn Created_at của watermark thì cũng coi là đã vượt qua.
+
+    Returns:
+        int hoặc None: Số đánh giá đứng trước watermark (chỉ cần xử lý các đánh giá
+        này), None nếu chưa gặp watermark.
+    """
+    try:
+        result = driver.execute_script(FIND_WATERMARK_JS, watermark["Google_review_id"])
+    except WebDriverException as e:
+        logger.warning(f"Lỗi khi tìm watermark: {e}")
+        return None
+    if result["index"] >= 0:
+        return result["index"]
+    created_at = watermark.get("Created_at")
+    if created_at and result["last_time"]:
+        last_date = convert_review_time(datetime.now(), result["last_time"])
+        if last_date and last_date.strftime("%Y-%m-%d") < created_at:
+            return result["count"]
+    return None
+
+# Script trích xuất toàn bộ trường của các đánh giá trong [start, end) bằng một lần gọi execute_script.
+# Trả về JSON thuần (null nếu không có phần tử) để tránh mỗi trường một round trip tới chromedriver.
+EXTRACT_REVIEWS_JS = """
+const start = arguments[0];
+const end = arguments[1];
+const containers = document.querySelectorAll("div.jftiEf.fontBodyMedium");
+const stop = (end === null || end > containers.length) ? containers.length : end;
+const textOf = (root, selector) => {
+    const el = root.querySelector(selector);
+    return el ? el.innerText : null;
+};
+const result = [];
+for (let i = start; i < stop; i++) {
+    const c = containers[i];
+    const ratingElem = c.querySelector("span[aria-label]");
+    result.push({
+        google_review_id: c.getAttribute("data-review-id"),
+        name: textOf(c, "div.d4r55"),
+        info: textOf(c, "div.RfnDt"),
+        rating: ratingElem ? ratingElem.getAttribute("aria-label") : null,
+        time: textOf(c, "span.rsqaWe"),
+        text: textOf(c, "span.wiI7pd"),
+        language: textOf(c, "div.oqftme"),
+        sub_ratings: Array.from(c.querySelectorAll("span.RfDO5c"), el => el.innerText)
+    });
+}
+return result;
+"""
+
+def build_review_data(raw, Restaurant_id, crawl_time):
+    """Chuyển dữ liệu thô trả về từ EXTRACT_REVIEWS_JS thành một dòng review_data.
+
+    Returns:
+        dict hoặc None nếu đánh giá không có nội dung Review_text.
+    """
+    review_data = {
+        "Review_id": "",
+        "Google_review_id": "",
+        "Restaurant_id": Restaurant_id,
+        "Reviewer_name": "",
+        "Reviewer_info": "",
+        "Rating": "",
+        "Review_time": "",
+        "Review_text": "",
+        "Service_rating": "",
+        "Food_rating": "",
+        "Atmosphere_rating": "",
+        "Service_type": "",
+        "Meal_type": "",
+        "Language": "",
+        "Created_at": "",
+        "Crawl_date": crawl_time.strftime("%Y-%m-%d")
+    }
+
+    if raw.get("google_review_id") is None:
+        logger.warning("Không tìm thấy Google_review_id")
+    review_data["Google_review_id"] = raw.get("google_review_id") or ""
+
+    if raw.get("name") is None:
+        logger.warning("Không tìm thấy Reviewer_name")
+    review_data["Reviewer_name"] = raw.get("name") or ""
+
+    if raw.get("info") is None:
+        logger.warning("Không tìm thấy Reviewer_info")
+    review_data["Reviewer_info"] = raw.get("info") or ""
+
+    try:
+        rating_text = (raw.get("rating") or "").split()[0]
+        review_data["Rating"] = float(rating_text.replace(',', '.'))
+    except (IndexError, ValueError):
+        logger.warning("Không tìm thấy hoặc lỗi khi lấy Rating")
+
+    if raw.get("time") is None:
+        logger.warning("Không tìm thấy Review_time")
+    review_data["Review_time"] = raw.get("time") or ""
+
+    if raw.get("text") is None:
+        logger.warning("Không tìm thấy Review_text")
+    review_data["Review_text"] = raw.get("text") or ""
+
+    text = raw.get("language")
+    if text is None:
+        logger.warning("Không tìm thấy Language")
+    elif "(" in text and ")" in text:
+        review_data["Language"] = text.split("(")[-1].replace(")", "").strip()
+
+    for text in raw.get("sub_ratings") or []:
+        text = text.strip()
+        if "Service:" in text:
+            review_data["Service_rating"] = text.split(":")[-1].strip()
+        elif "Food:" in text:
+            review_data["Food_rating"] = text.split(":")[-1].strip()
+        elif "Atmosphere:" in text:
+            review_data["Atmosphere_rating"] = text.split(":")[-1].strip()
+        elif text in ["Dine in", "Takeout"]:
+            review_data["Service_type"] = text
+        elif text in ["Breakfast", "Lunch", "Dessert", "Brunch", "Dinner", "Seating"]:
+            review_data["Meal_type"] = text
+
+    # Bỏ qua nếu Review_text rỗng
+    if not review_data["Review_text"].strip():
+        logger.info(f"Bỏ qua đánh giá vì không có nội dung Review_text.")
+        return None
+
+    # Tính Created_at từ Review_time
+    created_date = convert_review_time(crawl_time, review_data["Review_time"])
+    review_data["Created_at"] = created_date.strftime("%Y-%m-%d") if created_date else ""
+
+    review_data["Reviewer_name"] = review_data["Reviewer_name"][:500] if review_data["Reviewer_name"] else ""
+    review_data["Reviewer_info"] = review_data["Reviewer_info"][:500] if review_data["Reviewer_info"] else ""
+    review_data["Review_time"] = review_data["Review_time"][:100] if review_data["Review_time"] else ""
+    review_data["Language"] = review_data["Language"][:100] if review_data["Language"] else ""
+    return review_data
+
+def extract_review_batch(driver, start_index, end_index, Restaurant_id):
+    """Trích xuất dữ liệu các đánh giá trong khoảng [start_index, end_index).
+
+    Toàn bộ trường của cả batch được lấy bằng một lần execute_script, và chỉ các
+    container từ start_index trở đi được trả về nên chi phí mỗi batch không tăng
+    theo số đánh giá đã tải. end_index=None nghĩa là đến hết danh sách.
+
+    Returns:
+        list: Danh sách review_data (chưa có Review_id), đã bỏ các đánh giá không có nội dung.
+    """
     crawl_time = datetime.now()
+    try:
+        raw_reviews = driver.execute_script(EXTRACT_REVIEWS_JS, start_index, end_index) or []
+    except WebDriverException as e:
+        logger.error(f"Lỗi khi trích xuất batch đánh giá [{start_index}, {end_index}): {e}")
+        return []
 
-    for container in batch_containers:
-        review_data = {
-            "Review_id": "",
-            "Google_review_id": "",
-            "Restaurant_id": Restaurant_id,
-            "Reviewer_name": "",
-            "Reviewer_info": "",
-            "Rating": "",
-            "Review_time": "",
-            "Review_text": "",
-            "Service_rating": "",
-            "Food_rating": "",
-            "Atmosphere_rating": "",
-            "Service_type": "",
-            "Meal_type": "",
-            "Language": "",
-            "Created_at": "",
-            "Crawl_date": crawl_time.strftime("%Y-%m-%d")
-        }
-        
-        try:
-            review_data["Google_review_id"] = container.get_attribute("data-review-id") or ""
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Google_review_id")
-        
-        try:
-            review_data["Reviewer_name"] = container.find_element(By.CSS_SELECTOR, "div.d4r55").text or ""
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Reviewer_name")
-        
-        try:
-            review_data["Reviewer_info"] = container.find_element(By.CSS_SELECTOR, "div.RfnDt").text or ""
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Reviewer_info")
-        
-        try:
-            rating_elem = container.find_element(By.CSS_SELECTOR, "span[aria-label]")
-            rating_text = rating_elem.get_attribute('aria-label').split()[0]
-            review_data["Rating"] = float(rating_text.replace(',', '.'))
-        except (NoSuchElementException, ValueError):
-            logger.warning("Không tìm thấy hoặc lỗi khi lấy Rating")
-        
-        try:
-            review_data["Review_time"] = container.find_element(By.CSS_SELECTOR, "span.rsqaWe").text or ""
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Review_time")
-        
-        try:
-            review_data["Review_text"] = container.find_element(By.CSS_SELECTOR, "span.wiI7pd").text or ""
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Review_text")
-        
-        try:
-            language_elem = container.find_element(By.CSS_SELECTOR, "div.oqftme")
-            text = language_elem.text
-            if "(" in text and ")" in text:
-                review_data["Language"] = text.split("(")[-1].replace(")", "").strip()
-        except NoSuchElementException:
-            logger.warning("Không tìm thấy Language")
-        
-        rating_elements = container.find_elements(By.CSS_SELECTOR, "span.RfDO5c")
-        for elem in rating_elements:
-            text = elem.text.strip()
-            if "Service:" in text:
-                review_data["Service_rating"] = text.split(":")[-1].strip()
-            elif "Food:" in text:
-                review_data["Food_rating"] = text.split(":")[-1].strip()
-            elif "Atmosphere:" in text:
-                review_data["Atmosphere_rating"] = text.split(":")[-1].strip()
-            elif text in ["Dine in", "Takeout"]:
-                review_data["Service_type"] = text
-            elif text in ["Breakfast", "Lunch", "Dessert", "Brunch", "Dinner", "Seating"]:
-                review_data["Meal_type"] = text
-        
-        # Bỏ qua nếu Review_text rỗng
-        if not review_data["Review_text"].strip():
-            logger.info(f"Bỏ qua đánh giá vì không có nội dung Review_text.")
-            continue
-        
-        # Tính Created_at từ Review_time
-        created_date = convert_review_time(crawl_time, review_data["Review_time"])
-        review_data["Created_at"] = created_date.strftime("%Y-%m-%d") if created_date else ""
-
-        review_data["Reviewer_name"] = review_data["Reviewer_name"][:500] if review_data["Reviewer_name"] else ""
-        review_data["Reviewer_info"] = review_data["Reviewer_info"][:500] if review_data["Reviewer_info"] else ""
-        review_data["Review_time"] = review_data["Review_time"][:100] if review_data["Review_time"] else ""
-        review_data["Language"] = review_data["Language"][:100] if review_data["Language"] else ""
-        
+    new_reviews = []
+    for raw in raw_reviews:
+        review_data = build_review_data(raw, Restaurant_id, crawl_time)
+        if review_data:
+            new_reviews.append(review_data)
+    return new_reviews
+
+def save_reviews(reviews, Restaurant_id, existing_reviews, output_file, next_id_ref):
+    """Lọc trùng, gán Review_id và ghi các đánh giá mới vào CSV.
+
+    Nếu existing_reviews là CrawlDB, đánh giá được ghi vào bảng reviews trong một
+    transaction thay vì nối vào CSV.
+
+    Returns:
+        int: Số đánh giá mới đã ghi, None nếu ghi thất bại.
+    """
+    new_reviews = []
+    batch_keys = set()
+    next_id = next_id_ref['value']
+    for review_data in reviews:
         google_review_id = review_data["Google_review_id"].strip()
-        if google_review_id and (Restaurant_id, google_review_id) not in existing_reviews:
-            review_data["Review_id"] = str(next_id_ref['value'])
+        key = (Restaurant_id, google_review_id)
+        if google_review_id and key not in existing_reviews and key not in batch_keys:
+            review_data["Review_id"] = str(next_id)
             new_reviews.append(review_data)
-            existing_reviews.add((Restaurant_id, google_review_id))
-            next_id_ref['value'] += 1
+            batch_keys.add(key)
+            next_id += 1
 
     if new_reviews:
         try:
-            with open(output_file, mode="a", newline="", encoding="utf-8-sig") as f:
-                writer = csv.DictWriter(f, fieldnames=REVIEW_FIELDNAMES)
-                writer.writerows(new_reviews)
-            logger.info(f"Đã thêm {len(new_reviews)} đánh giá mới cho nhà hàng {Restaurant_id} trong batch.")
-            return len(new_reviews)
+            if isinstance(existing_reviews, CrawlDB):
+                # CrawlDB tự gán lại Review_id và chỉ tăng next_id_ref cho đánh giá thực sự được thêm
+                added = existing_reviews.insert_reviews(new_reviews)
+            else:
+                with open(output_file, mode="a", newline="", encoding="utf-8-sig") as f:
+                    writer = csv.DictWriter(f, fieldnames=REVIEW_FIELDNAMES)
+                    writer.writerows(new_reviews)
+                # Chỉ ghi nhận ID và khóa trùng sau khi ghi file thành công để Review_id không bị hở
+                next_id_ref['value'] = next_id
+                existing_reviews.update(batch_keys)
+                added = len(new_reviews)
+            logger.info(f"Đã thêm {added} đánh giá mới cho nhà hàng {Restaurant_id} trong batch.")
+            return added
         except Exception as e:
-            logger.error(f"Lỗi khi ghi file CSV {output_file}: {e}")
-            return 0
+            logger.error(f"Lỗi khi ghi đánh giá vào {output_file}: {e}")
+            return None
     return 0
 
-def scroll_and_click_more(driver, scrollable_div, existing_google_ids, output_file, Restaurant_id, existing_reviews, next_id_ref, max_scrolls=20, batch_size=100):
-    last_height = driver.execute_script("return arguments[0].scrollHeight;", scrollable_div)
-    scroll_count = 0
-    reviews_loaded = 0
+def newest_review_watermark(driver):
+    """Lấy Google_review_id và Created_at của đánh giá đầu tiên (mới nhất) trong feed.
+
+    Returns:
+        dict hoặc None nếu feed trống.
+    """
+    try:
+        raw_reviews = driver.execute_script(EXTRACT_REVIEWS_JS, 0, 1) or []
+    except WebDriverException as e:
+        logger.warning(f"Lỗi khi lấy đánh giá mới nhất: {e}")
+        return None
+    if not raw_reviews or not raw_reviews[0].get("google_review_id"):
+        return None
+    created_date = convert_review_time(datetime.now(), raw_reviews[0].get("time"))
+    return {
+        "Google_review_id": raw_reviews[0]["google_review_id"],
+        "Created_at": created_date.strftime("%Y-%m-%d") if created_date else ""
+    }
+
+def process_and_save_batch(driver, start_index, end_index, Restaurant_id, existing_reviews, output_file, next_id_ref, write_queue=None):
+    """Trích xuất một batch đánh giá và lưu lại.
+
+    Nếu có write_queue (chế độ nhiều worker), batch được gửi cho writer duy nhất
+    (review_writer) để lọc trùng, gán Review_id và ghi file.
+
+    Returns:
+        int: Số đánh giá đã ghi (hoặc đã gửi cho writer), None nếu ghi thất bại.
+    """
+    reviews = extract_review_batch(driver, start_index, end_index, Restaurant_id)
+    if write_queue is not None:
+        if reviews:
+            write_queue.put(("reviews", Restaurant_id, reviews))
+        return len(reviews)
+    return save_reviews(reviews, Restaurant_id, existing_reviews, output_file, next_id_ref)
+
+def review_writer(write_queue, existing_reviews, output_file, next_id_ref, added_ref):
+    """Writer duy nhất sở hữu file CSV, tập existing_reviews và bộ đếm Review_id.
+
+    Nhận các (loại, Restaurant_id, dữ liệu) từ write_queue cho đến khi gặp None:
+    "reviews" là một batch đánh giá, "watermark" là tham số set_watermark của nhà hàng
+    gửi sau batch cuối cùng. Watermark chỉ được ghi nếu mọi batch trước đó của nhà hàng
+    đã lưu thành công, để lần crawl sau không dừng cuộn trước các đánh giá chưa được lưu.
+    "release" được worker gửi khi xong nhà hàng: writer giải phóng tập ID của nhà hàng
+    sau khi đã ghi batch cuối, nếu không lần lọc trùng của writer sẽ nạp lại tập này.
+    Vì chỉ một luồng gán ID nên Review_id luôn duy nhất và liên tục.
+    """
+    failed = set()
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+        kind, Restaurant_id, payload = item
+        try:
+            if kind == "reviews":
+                added = save_reviews(payload, Restaurant_id, existing_reviews, output_file, next_id_ref)
+                if added is None:
+                    failed.add(Restaurant_id)
+                else:
+                    added_ref['value'] += added
+            elif kind == "watermark":
+                if Restaurant_id in failed:
+                    logger.warning(f"Không cập nhật watermark của nhà hàng {Restaurant_id} vì có batch đánh giá ghi thất bại.")
+                else:
+                    existing_reviews.set_watermark(Restaurant_id, *payload)
+            elif kind == "release":
+                existing_reviews.release(Restaurant_id)
+                failed.discard(Restaurant_id)
+        except Exception as e:
+            failed.add(Restaurant_id)
+            logger.error(f"Lỗi writer khi lưu đánh giá cho nhà hàng {Restaurant_id}: {e}")
+
+# Script bất đồng bộ: cuộn container xuống cuối rồi chờ MutationObserver báo có phần tử mới.
+# Trả về ngay khi số phần tử khớp selector tăng, hoặc sau quietMs nếu không có gì mới.
+WAIT_FOR_NEW_ITEMS_JS = """
+const container = arguments[0], selector = arguments[1], quietMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const countNow = () => container.querySelectorAll(selector).length;
+const before = countNow();
+let finished = false, observer = null, timer = null, nudge = null;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(timer);
+    clearInterval(nudge);
+    const count = countNow();
+    done({count: count, grown: count > before});
+};
+observer = new MutationObserver(() => { if (countNow() > before) finish(); });
+observer.observe(container, {childList: true, subtree: true});
+container.scrollTop = container.scrollHeight;
+// Cuộn lại định kỳ để kích hoạt lazy-load nếu lần cuộn đầu không có tác dụng
+nudge = setInterval(() => { container.scrollTop = container.scrollHeight; }, 1000);
+timer = setTimeout(finish, quietMs);
+"""
+
+def wait_for_new_items(driver, container, item_selector, quiet_period=5):
+    """Cuộn container và chờ phần tử mới xuất hiện thay vì sleep cố định.
+
+    Args:
+        driver: WebDriver instance.
+        container: Phần tử có thể cuộn.
+        item_selector: CSS selector của phần tử trong danh sách.
+        quiet_period: Số giây không có phần tử mới thì coi là hết danh sách.
+
+    Returns:
+        tuple: (số phần tử hiện có, True nếu có phần tử mới).
+    """
+    driver.set_script_timeout(quiet_period + 10)
+    result = driver.execute_async_script(WAIT_FOR_NEW_ITEMS_JS, container, item_selector, int(quiet_period * 1000))
+    return result["count"], result["grown"]
+
+# Script mở rộng toàn bộ nội dung đánh giá bị rút gọn trong một lần gọi.
+# Nút đã click được đánh dấu data-expanded để không click lại ở các bước cuộn sau.
+EXPAND_REVIEWS_JS = """
+const root = arguments[0] || document;
+const buttons = root.querySelectorAll("div.MyEned button.w8nwRe.kyuRq:not([data-expanded])");
+let expanded = 0;
+for (const btn of buttons) {
+    btn.setAttribute("data-expanded", "1");
+    try {
+        btn.click();
+        expanded++;
+    } catch (e) {}
+}
+return expanded;
+"""
+
+def expand_all_reviews(driver, scrollable_div=None):
+    """Click tất cả nút 'More' chưa được mở rộng trong feed bằng một execute_script.
+
+    Returns:
+        int: Số đánh giá đã được mở rộng.
+    """
+    try:
+        return driver.execute_script(EXPAND_REVIEWS_JS, scrollable_div) or 0
+    except WebDriverException as e:
+        logger.warning(f"Lỗi khi mở rộng đánh giá: {e}")
+        return 0
+
+def scroll_and_click_more(driver, scrollable_div, existing_google_ids, output_file, Restaurant_id, existing_reviews, next_id_ref, batch_size=100, write_queue=None, quiet_period=5, watermark=None, max_reviews=2500):
+    """Cuộn danh sách đánh giá, mở rộng 'More' và lưu theo batch.
+
+    Mỗi bước cuộn tiếp tục ngay khi có div.jftiEf mới; dừng khi không có đánh giá
+    mới trong quiet_period giây, gặp đánh giá đã tồn tại, hoặc đã tải hơn max_reviews
+    đánh giá (giới hạn số phần tử DOM trong tab ở lần crawl đầu của nhà hàng có rất
+    nhiều đánh giá; None là không giới hạn).
+
+    Nếu có watermark (feed đã sắp xếp Newest), vị trí watermark được kiểm tra trước
+    mỗi bước cuộn và chỉ các đánh giá đứng trước nó được xử lý, nên nhà hàng chỉ có
+    vài đánh giá mới không cần cuộn thêm.
+
+    Returns:
+        bool: False nếu có batch ghi thất bại. Với write_queue các batch chỉ được gửi đi,
+        kết quả ghi do review_writer theo dõi.
+    """
+    reviews_loaded = len(driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium"))
     last_processed = 0  
+    saved = True
     
-    while scroll_count < max_scrolls:
-        current_reviews = len(driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium"))
-        logger.info(f"Đã tải {current_reviews} đánh giá.")
-
-        more_buttons = driver.find_elements(By.CSS_SELECTOR, "div.MyEned button.w8nwRe.kyuRq")
-        for btn in more_buttons:
-            if click(driver, btn, wait_time=0.5):
-                time.sleep(0.5)
-        
-        driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", scrollable_div)
-        time.sleep(1.5)
-        
-        new_height = driver.execute_script("return arguments[0].scrollHeight;", scrollable_div)
-        new_reviews = len(driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium"))
+    expand_all_reviews(driver, scrollable_div)
+    while True:
+        logger.info(f"Đã tải {reviews_loaded} đánh giá.")
+
+        if watermark:
+            stop_index = find_watermark(driver, watermark)
+            if stop_index is not None:
+                logger.info(f"Gặp watermark sau {stop_index} đánh giá mới, dừng cuộn.")
+                reviews_loaded = stop_index
+                break
+
+        new_reviews, grown = wait_for_new_items(driver, scrollable_div, "div.jftiEf.fontBodyMedium", quiet_period)
+
+        # Mở rộng các đánh giá vừa tải trước khi trích xuất
+        expanded = expand_all_reviews(driver, scrollable_div)
+        if expanded:
+            logger.info(f"Đã mở rộng {expanded} đánh giá.")
         
-        # Kiểm tra xem có gặp đánh giá đã tồn tại chưa
-        if check_for_existing_review(driver, existing_google_ids):
+        # Kiểm tra xem có gặp đánh giá đã tồn tại chưa (khi chưa có watermark)
+        if not watermark and check_for_existing_review(driver, existing_google_ids):
             logger.info("Gặp đánh giá đã tồn tại từ lần crawl trước, dừng cuộn.")
-            if new_reviews > last_processed:
-                process_and_save_batch(driver, last_processed, new_reviews, Restaurant_id, existing_reviews, output_file, next_id_ref)
+            reviews_loaded = new_reviews
             break
         
-        if new_height == last_height and new_reviews == reviews_loaded:
-            scroll_count += 1
-            if scroll_count >= 3 or new_reviews > 2500:
-                logger.info("Đạt giới hạn, dừng cuộn.")
-                if new_reviews > last_processed:
-                    process_and_save_batch(driver, last_processed, new_reviews, Restaurant_id, existing_reviews, output_file, next_id_ref)
-                break
-        else:
-            scroll_count = 0
-            logger.info(f"Tải thêm dữ liệu mới. Đánh giá mới: {new_reviews}")
+        if not grown:
+            logger.info(f"Không có đánh giá mới sau {quiet_period} giây, dừng cuộn.")
+            reviews_loaded = new_reviews
+            break
+        if max_reviews is not None and new_reviews > max_reviews:
+            logger.info(f"Đạt giới hạn {max_reviews} đánh giá, dừng cuộn.")
+            reviews_loaded = new_reviews
+            break
+        logger.info(f"Tải thêm dữ liệu mới. Đánh giá mới: {new_reviews}")
 
         while new_reviews >= last_processed + batch_size:
-            added = process_and_save_batch(driver, last_processed, last_processed + batch_size, Restaurant_id, existing_reviews, output_file, next_id_ref)
+            if process_and_save_batch(driver, last_processed, last_processed + batch_size, Restaurant_id, existing_reviews, output_file, next_id_ref, write_queue) is None:
+                saved = False
             last_processed += batch_size
         
-        last_height = new_height
         reviews_loaded = new_reviews
 
     if reviews_loaded > last_processed:
-        process_and_save_batch(driver, last_processed, reviews_loaded, Restaurant_id, existing_reviews, output_file, next_id_ref)
+        if process_and_save_batch(driver, last_processed, reviews_loaded, Restaurant_id, existing_reviews, output_file, next_id_ref, write_queue) is None:
+            saved = False
+    return saved
 
 def click_sort_newest(driver, wait):
     try:
@@ -296,32 +577,18 @@ def click_sort_newest(driver, wait):
         return False
       
 def convert_review_time(created_time, review_time):
+    """Tính Created_at của một đánh giá. Xử lý cả cột thì dùng review_time.convert_review_times."""
     if pd.isnull(review_time) or not review_time:
         return None
-    if "hour" in review_time.lower() or "minute" in review_time.lower():
-        return created_time.date()
 
-    review_time = re.sub(r'\bEdited\b\s*', '', review_time, flags=re.IGNORECASE)
-    
-    review_time = re.sub(r'\ba\b', '1', review_time, flags=re.IGNORECASE)
-
-    match = re.match(r"(\d+)\s*(day|week|month|year)s?\s*ago", review_time, re.IGNORECASE)
-    if not match:
+    # parse_review_time được cache theo chuỗi Review_time
+    parsed = parse_review_time(review_time)
+    if parsed is None:
         logger.warning(f"Không thể phân tích Review_time: {review_time}")
         return None
     
-    amount, unit = int(match.group(1)), match.group(2).lower()
-
-    if unit == "day":
-        return (created_time - relativedelta.relativedelta(days=amount)).date()
-    elif unit == "week":
-        return (created_time - relativedelta.relativedelta(weeks=amount)).date()
-    elif unit == "month":
-        return (created_time - relativedelta.relativedelta(months=amount)).date()
-    elif unit == "year":
-        return (created_time - relativedelta.relativedelta(years=amount)).date()
-    
-    return None
+    # parsed.days/parsed.months đã quy đổi tuần -> ngày, năm -> tháng; giờ/phút là 0
+    return (created_time - relativedelta.relativedelta(days=parsed.days, months=parsed.months)).date()
 
 def init_csv(output_file="reviews_all.csv"):
     if not os.path.isfile(output_file):
@@ -336,21 +603,43 @@ def init_csv(output_file="reviews_all.csv"):
     else:
         logger.info(f"File CSV {output_file} đã tồn tại.")
 
-def scrape_reviews(driver, wait, Restaurant_id, existing_google_ids, existing_reviews, output_file, next_id_ref):
+def scrape_reviews(driver, wait, Restaurant_id, existing_google_ids, existing_reviews, output_file, next_id_ref, write_queue=None, watermarks=None, num_of_reviews=None):
+    """Mở tab Reviews, sắp xếp Newest rồi cuộn và lưu đánh giá mới.
+
+    watermarks (ReviewIndex hoặc CrawlDB) cung cấp watermark của lần crawl trước
+    và được cập nhật bằng đánh giá mới nhất sau khi cuộn xong, kèm num_of_reviews
+    (số lượt đánh giá hiện tại) để lần sau bỏ qua nếu không đổi. Watermark chỉ được
+    dùng khi sắp xếp Newest thành công và chỉ được cập nhật khi mọi batch đã lưu thành
+    công; với write_queue, việc cập nhật được gửi cho review_writer sau batch cuối.
+    """
     added = 0
     try:
         reviews_tabs = wait.until(
             EC.presence_of_all_elements_located((By.XPATH, "//div[text()='Reviews']"))
         )
         if reviews_tabs and click(driver, reviews_tabs[0]):
-            if not click_sort_newest(driver, wait):
+            sorted_newest = click_sort_newest(driver, wait)
+            if not sorted_newest:
                 logger.warning("Không thể sắp xếp theo 'Newest', tiếp tục với mặc định.")
+            use_watermark = sorted_newest and watermarks is not None
+            watermark = watermarks.watermark(Restaurant_id) if use_watermark else None
             
             scrollable_divs = wait.until(
                 EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.m6QErb.DxyBCb.kA9KIf.dS8AEf"))
             )
             if scrollable_divs:
-                scroll_and_click_more(driver, scrollable_divs[0], existing_google_ids, output_file, Restaurant_id, existing_reviews, next_id_ref)
+                saved = scroll_and_click_more(driver, scrollable_divs[0], existing_google_ids, output_file, Restaurant_id, existing_reviews, next_id_ref, write_queue=write_queue, watermark=watermark)
+                if use_watermark:
+                    newest = newest_review_watermark(driver)
+                    if newest:
+                        watermark_args = (newest["Google_review_id"], newest["Created_at"], num_of_reviews)
+                        if write_queue is not None:
+                            # Batch của nhà hàng còn nằm trong hàng đợi, writer ghi watermark sau khi lưu xong
+                            write_queue.put(("watermark", Restaurant_id, watermark_args))
+                        elif saved:
+                            watermarks.set_watermark(Restaurant_id, *watermark_args)
+                        else:
+                            logger.warning(f"Không cập nhật watermark của nhà hàng {Restaurant_id} vì có batch đánh giá ghi thất bại.")
             
             total_reviews = len(driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium"))
             logger.info(f"Tìm thấy {total_reviews} đánh giá tổng cộng.")
@@ -361,80 +650,364 @@ def scrape_reviews(driver, wait, Restaurant_id, existing_google_ids, existing_re
     
     return added  
 
-def update_reviews_and_save(driver, restaurants_file="restaurants.csv", output_file="reviews_all.csv", batch_size=10):
-    wait = WebDriverWait(driver, 10)
-    
+def csv_review_count(row):
+    """Num_of_reviews của nhà hàng trong restaurants.csv (hoặc cơ sở dữ liệu), None nếu trống."""
+    value = row.get('Num_of_reviews')
+    try:
+        if value is None or pd.isnull(value) or value == "":
+            return None
+        return int(float(str(value).replace(",", "")))
+    except (TypeError, ValueError):
+        return None
+
+def live_review_count(driver):
+    """Số lượt đánh giá hiển thị trên panel nhà hàng đang mở, None nếu không đọc được."""
+    try:
+        reviews_elem = driver.find_element(By.CSS_SELECTOR, "div.F7nice span[aria-label*='reviews']")
+        return int(reviews_elem.get_attribute("aria-label").split()[0].replace(",", ""))
+    except (NoSuchElementException, AttributeError, IndexError, ValueError):
+        return None
+
+def review_count_unchanged(watermarks, restaurant_id, review_count):
+    """True nếu review_count bằng Num_of_reviews đã ghi nhận ở lần crawl đánh giá trước."""
+    crawled_count = watermarks.crawled_count(restaurant_id)
+    return review_count is not None and crawled_count is not None and int(crawled_count) == review_count
+
+def log_skip_ratio(skipped, total_restaurants):
+    ratio = skipped / total_restaurants if total_restaurants else 0
+    logger.info(f"Bỏ qua {skipped}/{total_restaurants} nhà hàng ({ratio:.1%}) vì số lượt đánh giá không đổi.")
+
+def read_restaurants(restaurants_file, db=None):
+    """Đọc danh sách nhà hàng cần crawl đánh giá.
+
+    Nếu có db và bảng restaurants không trống thì đọc từ cơ sở dữ liệu, ngược lại đọc CSV.
+
+    Returns:
+        DataFrame hoặc None nếu đọc thất bại.
+    """
+    if db is not None and db.count_restaurants() > 0:
+        return pd.DataFrame(db.restaurants_for_reviews(), columns=["Restaurant_id", "Url", "Restaurant_name", "Num_of_reviews"])
     try:
         restaurants_df = pd.read_csv(restaurants_file)
         if 'Restaurant_id' not in restaurants_df.columns or 'Url' not in restaurants_df.columns or 'Restaurant_name' not in restaurants_df.columns:
             raise ValueError("File restaurants.csv phải chứa các cột 'Restaurant_id', 'Url', và 'Restaurant_name'")
+        return restaurants_df
     except Exception as e:
         logger.error(f"Lỗi khi đọc file {restaurants_file}: {e}")
-        return 0
+        return None
+
+def open_review_store(output_file, db_file=None):
+    """Mở nơi lưu đánh giá: CrawlDB nếu có db_file, ngược lại ReviewIndex của CSV.
 
-    existing_reviews = set()
-    next_id = 1
-    if os.path.isfile(output_file):
+    Lần đầu dùng cơ sở dữ liệu (bảng reviews trống), reviews_all.csv có sẵn được
+    nạp vào để giữ nguyên Review_id và chống trùng với dữ liệu cũ.
+    """
+    if db_file:
+        db = CrawlDB(db_file)
+        if db.max_review_id() == 0 and os.path.isfile(output_file):
+            db.import_reviews_csv(output_file)
+        return db
+    return ReviewIndex(output_file)
+
+def finish_review_store(existing_reviews, output_file):
+    """Với CrawlDB: xuất lại reviews_all.csv để tương thích rồi đóng kết nối."""
+    if isinstance(existing_reviews, CrawlDB):
         try:
-            with open(output_file, mode="r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    google_review_id = row.get("Google_review_id", "").strip()
-                    restaurant_id = row.get("Restaurant_id", "")
-                    if google_review_id and restaurant_id:
-                        existing_reviews.add((restaurant_id, google_review_id))
-                    if row.get("Review_id"):
-                        try:
-                            current_id = int(row["Review_id"])
-                            next_id = max(next_id, current_id + 1)
-                        except ValueError:
-                            logger.warning(f"Review_id không hợp lệ: {row['Review_id']}")
-        except Exception as e:
-            logger.error(f"Lỗi khi đọc file CSV {output_file}: {e}")
-            return 0
+            existing_reviews.export_reviews_csv(output_file)
+        finally:
+            existing_reviews.close()
+
+def schedule_path(output_file):
+    """Đường dẫn file trạng thái lịch crawl (RecrawlScheduler) của file đánh giá."""
+    return os.path.splitext(output_file)[0] + "_schedule.json"
+
+def plan_restaurants(restaurants_df, scheduler, existing_reviews, output_file):
+    """Danh sách (index, row) nhà hàng cần crawl, theo thứ tự ưu tiên nếu có scheduler.
+
+    Tốc độ của nhà hàng chưa có lịch sử được ước lượng từ Created_at của đánh giá đã lưu.
+    """
+    indexed_rows = list(restaurants_df.iterrows())
+    if scheduler is None:
+        return indexed_rows
+    try:
+        if isinstance(existing_reviews, CrawlDB):
+            reviews_df = pd.DataFrame(existing_reviews.review_dates(), columns=["Restaurant_id", "Created_at"])
+        else:
+            reviews_df = pd.read_csv(output_file, usecols=["Restaurant_id", "Created_at"], encoding="utf-8-sig")
+        scheduler.seed_from_reviews(reviews_df)
+    except Exception as e:
+        logger.warning(f"Không ước lượng được tốc độ từ Created_at: {e}")
+    return scheduler.plan(indexed_rows)
+
+def load_restaurants(driver, wait, indexed_rows, prefetch=False):
+    """Mở lần lượt trang của các nhà hàng.
+
+    Với prefetch, trang của nhà hàng kế tiếp được tải trong một tab nền (TabPool 2 tab)
+    trong lúc nhà hàng hiện tại đang được crawl, nên thời gian mỗi nhà hàng gần bằng
+    max(tải trang, crawl) thay vì tải trang + crawl. Driver nên được tạo với
+    setup_driver(background_tabs=True).
+
+    Args:
+        driver: WebDriver instance.
+        wait: WebDriverWait instance.
+        indexed_rows: Danh sách (index, row) nhà hàng.
+        prefetch: Tải trước nhà hàng kế tiếp trong tab nền.
+
+    Yields:
+        tuple: (index, row, ready, elapsed) với ready False nếu trang không tải được và
+        elapsed là số giây tải trang; driver đang ở tab của nhà hàng.
+    """
+    if not prefetch:
+        for i, row in indexed_rows:
+            start = time.monotonic()
+            try:
+                driver.get(row['Url'])
+                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.DUwDvf")))
+                ready = True
+            except TimeoutException as e:
+                logger.error(f"Lỗi scrape {row['Url']}: {e}")
+                ready = False
+            yield i, row, ready, time.monotonic() - start
+        return
+
+    pool = TabPool(driver, 2, "h1.DUwDvf")
+    try:
+        for (i, row), ready, elapsed in run_in_tabs(pool, indexed_rows, lambda item: item[1]['Url']):
+            if not ready:
+                logger.error(f"Lỗi scrape {row['Url']}: quá thời gian tải trang")
+            yield i, row, ready, elapsed
+    finally:
+        pool.close()
+
+def update_reviews_and_save(driver, restaurants_file="restaurants.csv", output_file="reviews_all.csv", batch_size=10, db_file=None, skip_unchanged=None, scheduler=None, prefetch=False):
+    """Crawl đánh giá lần lượt từng nhà hàng.
+
+    skip_unchanged bỏ qua nhà hàng có số lượt đánh giá bằng lần crawl trước:
+    "csv" so sánh Num_of_reviews trong restaurants.csv (nên cập nhật bằng
+    Crawl_res_feature_Final.py trước) và không cần mở trang; "live" mở trang và
+    đọc số lượt đánh giá trên panel, chỉ bỏ qua tab Reviews.
+
+    scheduler (RecrawlScheduler) chỉ chọn các nhà hàng có nhiều đánh giá mới kỳ
+    vọng nhất trong budget và crawl theo thứ tự ưu tiên.
+
+    prefetch tải trang nhà hàng kế tiếp trong tab nền trong lúc crawl nhà hàng hiện
+    tại (load_restaurants).
+    """
+    wait = WebDriverWait(driver, 10)
+
+    try:
+        existing_reviews = open_review_store(output_file, db_file)
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc chỉ mục đánh giá của {output_file}: {e}")
+        return 0
+
+    restaurants_df = read_restaurants(restaurants_file, existing_reviews if db_file else None)
+    if restaurants_df is None:
+        finish_review_store(existing_reviews, output_file)
+        return 0
 
     added = 0
+    skipped = 0
     total_restaurants = len(restaurants_df)
-    next_id_ref = {'value': next_id} 
+    next_id_ref = existing_reviews.next_id_ref
+    indexed_rows = plan_restaurants(restaurants_df, scheduler, existing_reviews, output_file)
+
+    # Nhà hàng bỏ qua theo restaurants.csv không cần mở trang
+    to_crawl = []
+    for i, row in indexed_rows:
+        restaurant_id = str(row['Restaurant_id'])
+        review_count = csv_review_count(row)
+        if skip_unchanged == "csv" and review_count_unchanged(existing_reviews, restaurant_id, review_count):
+            logger.info(f"Bỏ qua nhà hàng {i+1}/{total_restaurants}: {row['Restaurant_name']} (số lượt đánh giá không đổi: {review_count})")
+            skipped += 1
+            if scheduler is not None:
+                scheduler.record(restaurant_id, review_count, None)
+            continue
+        to_crawl.append((i, row))
 
-    for i, row in restaurants_df.iterrows():
+    for n, (i, row, ready, elapsed) in enumerate(load_restaurants(driver, wait, to_crawl, prefetch), start=1):
         restaurant_id = str(row['Restaurant_id'])
         url = row['Url']
         restaurant_name = str(row['Restaurant_name'])
-        logger.info(f"Scraping đánh giá cho nhà hàng {i+1}/{total_restaurants}: {restaurant_name}")
+        review_count = csv_review_count(row)
+        logger.info(f"Scraping đánh giá cho nhà hàng {i+1}/{total_restaurants}: {restaurant_name} (tải {elapsed:.1f} giây)")
         
-        existing_google_ids = {gid for rid, gid in existing_reviews if rid == restaurant_id}
+        existing_google_ids = existing_reviews.known_ids(restaurant_id)
+        start = time.monotonic() - elapsed
         
         try:
-            driver.get(url)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.DUwDvf")))
-
-            scrape_added = scrape_reviews(driver, wait, restaurant_id, existing_google_ids, existing_reviews, output_file, next_id_ref)
-            added += scrape_added 
+            if not ready:
+                continue
+            live_count = live_review_count(driver)
+            if live_count is not None:
+                review_count = live_count
+            if skip_unchanged == "live" and review_count_unchanged(existing_reviews, restaurant_id, live_count):
+                logger.info(f"Bỏ qua tab Reviews của {restaurant_name} (số lượt đánh giá không đổi: {live_count})")
+                skipped += 1
+            else:
+                scrape_added = scrape_reviews(driver, wait, restaurant_id, existing_google_ids, existing_reviews, output_file, next_id_ref,
+                                              watermarks=existing_reviews, num_of_reviews=review_count)
+                added += scrape_added 
+            if scheduler is not None:
+                scheduler.record(restaurant_id, review_count, time.monotonic() - start)
         except (TimeoutException, NoSuchElementException) as e:
             logger.error(f"Lỗi scrape {url}: {e}")
             continue
+        finally:
+            existing_reviews.release(restaurant_id)
 
-        if (i + 1) % batch_size == 0:
-            logger.info(f"Đã xử lý {i+1}/{total_restaurants} nhà hàng...")
+        if n % batch_size == 0:
+            logger.info(f"Đã xử lý {n}/{len(to_crawl)} nhà hàng...")
 
+    finish_review_store(existing_reviews, output_file)
+    if skip_unchanged:
+        log_skip_ratio(skipped, total_restaurants)
     logger.info(f"Hoàn thành! Đã thêm {added} đánh giá mới và lưu vào {output_file}.") 
     return added
 
+def crawl_reviews_worker(worker_id, task_queue, review_index, output_file, write_queue, total_restaurants, headless=False, skip_unchanged=None, scheduler=None):
+    """Worker: lấy lần lượt nhà hàng từ task_queue và crawl đánh giá trên trình duyệt riêng.
+
+    Các batch đánh giá được gửi sang write_queue, worker không tự ghi file và không tự
+    giải phóng tập ID của nhà hàng (review_writer làm sau khi ghi xong).
+
+    Returns:
+        int: Số nhà hàng bị bỏ qua vì số lượt đánh giá không đổi.
+    """
+    skipped = 0
+    driver = None
+    try:
+        # ChromeDriverManager không an toàn khi cài đặt song song
+        with driver_setup_lock:
+            driver = setup_driver(headless=headless)
+        wait = WebDriverWait(driver, 10)
+        while True:
+            try:
+                i, row = task_queue.get_nowait()
+            except queue.Empty:
+                break
+            restaurant_id = str(row['Restaurant_id'])
+            url = row['Url']
+            review_count = csv_review_count(row)
+            if skip_unchanged == "csv" and review_count_unchanged(review_index, restaurant_id, review_count):
+                logger.info(f"[Worker {worker_id}] Bỏ qua nhà hàng {i+1}/{total_restaurants}: {row['Restaurant_name']} (số lượt đánh giá không đổi: {review_count})")
+                skipped += 1
+                if scheduler is not None:
+                    scheduler.record(restaurant_id, review_count, None)
+                continue
+            logger.info(f"[Worker {worker_id}] Scraping đánh giá cho nhà hàng {i+1}/{total_restaurants}: {row['Restaurant_name']}")
+            start = time.monotonic()
+            try:
+                driver.get(url)
+                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.DUwDvf")))
+                live_count = live_review_count(driver)
+                if live_count is not None:
+                    review_count = live_count
+                if skip_unchanged == "live" and review_count_unchanged(review_index, restaurant_id, live_count):
+                    logger.info(f"[Worker {worker_id}] Bỏ qua tab Reviews của {row['Restaurant_name']} (số lượt đánh giá không đổi: {live_count})")
+                    skipped += 1
+                else:
+                    scrape_reviews(driver, wait, restaurant_id, review_index.known_ids(restaurant_id),
+                                   None, output_file, None, write_queue=write_queue, watermarks=review_index,
+                                   num_of_reviews=review_count)
+                if scheduler is not None:
+                    scheduler.record(restaurant_id, review_count, time.monotonic() - start)
+            except (TimeoutException, NoSuchElementException) as e:
+                logger.error(f"[Worker {worker_id}] Lỗi scrape {url}: {e}")
+            finally:
+                # Writer còn lọc trùng các batch trong hàng đợi nên chỉ giải phóng sau batch cuối
+                write_queue.put(("release", restaurant_id, None))
+    except WebDriverException as e:
+        logger.error(f"[Worker {worker_id}] Lỗi trình duyệt, dừng worker: {e}")
+    finally:
+        if driver:
+            driver.quit()
+            logger.info(f"[Worker {worker_id}] Đã đóng trình duyệt.")
+    return skipped
+
+def update_reviews_parallel(restaurants_file="restaurants.csv", output_file="reviews_all.csv", num_workers=2, headless=False, db_file=None, skip_unchanged=None, scheduler=None):
+    """Crawl đánh giá của nhiều nhà hàng cùng lúc bằng num_workers trình duyệt.
+
+    Các worker lấy nhà hàng từ một hàng đợi chung và gửi batch đánh giá cho một
+    writer duy nhất (review_writer). Writer sở hữu reviews_all.csv, tập
+    existing_reviews và bộ đếm next_id_ref nên Review_id vẫn duy nhất và liên tục.
+    Với db_file, writer ghi vào cơ sở dữ liệu SQLite thay cho CSV. skip_unchanged
+    và scheduler giống update_reviews_and_save; hàng đợi được xếp theo thứ tự ưu tiên.
+
+    Returns:
+        int: Số đánh giá mới đã thêm.
+    """
+    try:
+        existing_reviews = open_review_store(output_file, db_file)
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc chỉ mục đánh giá của {output_file}: {e}")
+        return 0
+
+    restaurants_df = read_restaurants(restaurants_file, existing_reviews if db_file else None)
+    if restaurants_df is None:
+        finish_review_store(existing_reviews, output_file)
+        return 0
+
+    task_queue = queue.Queue()
+    for i, row in plan_restaurants(restaurants_df, scheduler, existing_reviews, output_file):
+        task_queue.put((i, row))
+    total_restaurants = len(restaurants_df)
+
+    next_id_ref = existing_reviews.next_id_ref
+    added_ref = {'value': 0}
+    write_queue = queue.Queue()
+    writer_thread = threading.Thread(
+        target=review_writer,
+        args=(write_queue, existing_reviews, output_file, next_id_ref, added_ref),
+        name="review-writer"
+    )
+    writer_thread.start()
+
+    num_workers = max(1, min(num_workers, total_restaurants))
+    logger.info(f"Crawl đánh giá {total_restaurants} nhà hàng với {num_workers} worker.")
+    skipped = 0
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(crawl_reviews_worker, w + 1, task_queue, existing_reviews,
+                                output_file, write_queue, total_restaurants, headless, skip_unchanged, scheduler)
+                for w in range(num_workers)
+            ]
+            skipped = sum(future.result() for future in futures)
+    finally:
+        write_queue.put(None)
+        writer_thread.join()
+        finish_review_store(existing_reviews, output_file)
+
+    if skip_unchanged:
+        log_skip_ratio(skipped, total_restaurants)
+    logger.info(f"Hoàn thành! Đã thêm {added_ref['value']} đánh giá mới và lưu vào {output_file}.")
+    return added_ref['value']
+
 def main(restaurants_file=r"D:\Nam3_Ky2\DeAnThucHanh\Crawl\Code_Crawl\restaurants.csv", 
          output_dir=r"D:\Nam3_Ky2\DeAnThucHanh\Crawl\Data",
-         batch_size=10, headless=False):
+         batch_size=10, headless=False, num_workers=1, db_file=None, skip_unchanged=None, budget_minutes=None,
+         prefetch=False):
     
     output_file = os.path.join(output_dir, "reviews_all.csv")
     start_time = datetime.now()
     logger.info(f"Bắt đầu crawl đánh giá: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
     driver = None
+    scheduler = None
+    if budget_minutes is not None:
+        # Budget là số giây trình duyệt: mỗi worker có budget_minutes phút
+        scheduler = RecrawlScheduler(schedule_path(output_file), budget_minutes * 60 * max(1, num_workers))
     try:
-        driver = setup_driver(headless=headless)
         init_csv(output_file)
         logger.info("Bắt đầu cập nhật đánh giá...")
-        added = update_reviews_and_save(driver, restaurants_file, output_file, batch_size)
+        if num_workers > 1:
+            added = update_reviews_parallel(restaurants_file, output_file, num_workers, headless, db_file, skip_unchanged,
+                                            scheduler)
+        else:
+            driver = setup_driver(headless=headless, background_tabs=prefetch)
+            added = update_reviews_and_save(driver, restaurants_file, output_file, batch_size, db_file, skip_unchanged,
+                                            scheduler, prefetch)
         logger.info(f"Hoàn thành cập nhật đánh giá! Đã thêm {added} đánh giá mới.")
     except (TimeoutException, WebDriverException) as e:
         logger.error(f"Lỗi trong quá trình thực thi: {e}")
@@ -447,4 +1020,17 @@ def main(restaurants_file=r"D:\Nam3_Ky2\DeAnThucHanh\Crawl\Code_Crawl\restaurant
         logger.info(f"Kết thúc crawl: {end_time.strftime('%Y-%m-%d %H:%M:%S')}, thời gian chạy: {end_time - start_time}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl đánh giá nhà hàng trên Google Maps.")
+    parser.add_argument("--workers", type=int, default=1, help="Số trình duyệt crawl đánh giá song song.")
+    parser.add_argument("--headless", action="store_true", help="Chạy trình duyệt ở chế độ không giao diện.")
+    parser.add_argument("--db", default=None, help="File SQLite để lưu đánh giá (reviews_all.csv vẫn được xuất để tương thích).")
+    parser.add_argument("--skip-unchanged", choices=["csv", "live"], default=None,
+                        help="Bỏ qua nhà hàng có số lượt đánh giá không đổi so với lần crawl trước "
+                             "(csv: theo restaurants.csv, live: theo panel trên trang).")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Số phút chạy cho mỗi trình duyệt; chỉ crawl các nhà hàng có nhiều đánh giá mới kỳ vọng nhất.")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Tải trước trang nhà hàng kế tiếp trong tab nền trong lúc crawl nhà hàng hiện tại (khi --workers 1).")
+    args = parser.parse_args()
+    main(headless=args.headless, num_workers=args.workers, db_file=args.db, skip_unchanged=args.skip_unchanged,
+         budget_minutes=args.budget, prefetch=args.prefetch)
\ No newline at end of file
@@ -0,0 +1,325 @@
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Ký tự không phải chữ/số được coi là dấu phân cách từ
+SEPARATOR_PATTERN = re.compile(r"[^0-9a-z]+")
+# Bảng dịch byte cho cả cột: chữ hoa -> chữ thường, giữ 0-9a-z và \n (ranh giới địa chỉ),
+# mọi byte khác -> dấu cách
+BYTE_TABLE = bytes(
+    c + 32 if 65 <= c <= 90 else c if 48 <= c <= 57 or 97 <= c <= 122 or c == 10 else 32
+    for c in range(256)
+)
+# Danh sách có tối đa chừng này tên thì tìm tên đúng chính tả bằng vòng lặp str.rfind như
+# find_district; danh sách dài hơn dùng regex trie (xem benchmark())
+SHORT_LIST = 16
+
+
+def normalize_text(text):
+    """Chuẩn hóa chuỗi để so khớp: bỏ dấu tiếng Việt, đ -> d, chữ thường, gộp dấu phân cách.
+
+    "Hòa Vang", "Hoà Vang" và "Hoa Vang" đều thành "hoa vang".
+    """
+    # NFD tách dấu khỏi chữ cái, encode ascii bỏ các dấu đó (đ không tách được nên thay trước)
+    text = unicodedata.normalize("NFD", str(text).lower().replace("đ", "d"))
+    text = text.encode("ascii", "ignore").decode("ascii")
+    return SEPARATOR_PATTERN.sub(" ", text).strip()
+
+
+def is_word_char(ch):
+    # Giống \w của re trên str: chữ, số (kể cả chữ có dấu) và "_"
+    return ch.isalnum() or ch == "_"
+
+
+def join_lines(texts):
+    """Nối nhiều chuỗi thành một khối, mỗi chuỗi một dòng (\n bên trong chuỗi thành dấu cách)."""
+    try:
+        joined = "\n".join(texts)
+    except TypeError:
+        texts = [str(text) for text in texts]
+        joined = "\n".join(texts)
+    if joined.count("\n") != len(texts) - 1:
+        # \n bên trong một chuỗi không được tính là ranh giới giữa hai chuỗi
+        joined = "\n".join(text.replace("\n", " ") for text in texts)
+    return joined
+
+
+def normalize_bytes(texts):
+    """Chuẩn hóa nhiều chuỗi một lượt thành bytes ascii, mỗi chuỗi một dòng.
+
+    Cùng quy tắc với normalize_text (dấu phân cách thành dấu cách nhưng không gộp), làm
+    trên cả khối nên chi phí NFD/encode chỉ trả một lần cho cả cột.
+    """
+    joined = join_lines(texts).replace("đ", "d").replace("Đ", "D")
+    return unicodedata.normalize("NFD", joined).encode("ascii", "ignore").translate(BYTE_TABLE)
+
+
+def trie_insert(trie, word, value):
+    node = trie
+    for ch in word:
+        node = node.setdefault(ch, {})
+    node[""] = value
+
+
+def trie_pattern(node, values, space=" +"):
+    # Regex của một nút trie: nhánh con trước, nhánh kết thúc tại nút đứng sau cùng nên
+    # regex luôn thử tên dài hơn trước rồi mới lùi về tên ngắn hơn. Mỗi tên kết thúc bằng
+    # một nhóm rỗng "()"; values ghi giá trị của tên theo thứ tự nhóm để m.lastindex cho
+    # biết tên nào khớp
+    branches = [re.escape(ch).replace("\\ ", space) + trie_pattern(child, values, space)
+                for ch, child in sorted(node.items()) if ch]
+    if "" in node:
+        values.append(node[""])
+        branches.append("()")
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+
+def compile_trie(trie, space=" +"):
+    """Biên dịch trie thành regex chỉ khớp trọn từ.
+
+    Returns:
+        tuple: (regex dạng str, danh sách giá trị theo số nhóm; phần tử 0 không dùng đến).
+    """
+    values = [-1]
+    body = trie_pattern(trie, values, space) if trie else ""
+    # Không có tên nào thì không khớp gì
+    return (r"\b" + body + r"\b" if body else r"(?!)"), values
+
+
+def first_match_per_line(matches, newlines, group_values):
+    """Lấy kết quả đầu tiên của mỗi dòng từ một lần finditer trên cả khối.
+
+    Returns:
+        tuple: (mảng số dòng, mảng giá trị của tên khớp trên dòng đó).
+    """
+    found = [(m.start(), m.lastindex) for m in matches]
+    if not found:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    starts, groups = np.array(found, dtype=np.int64).T
+    lines, first = np.unique(np.searchsorted(newlines, starts), return_index=True)
+    return lines, np.asarray(group_values, dtype=np.int64)[groups[first]]
+
+
+class AddressMatcher:
+    """Tìm tên địa danh (quận/huyện, phường, đường, ...) trong địa chỉ, không phụ thuộc thứ tự danh sách.
+
+    Quy tắc rightmost-longest: trong các tên xuất hiện trọn từ ("Hải Châu" không khớp
+    trong "Hải Châu1"), chọn tên kết thúc sau cùng trong địa chỉ, tên dài nhất nếu nhiều
+    tên cùng kết thúc ở đó. Đây là leftmost-longest trên địa chỉ đọc ngược: địa chỉ Việt
+    Nam đi từ cụ thể đến tổng quát (số nhà, đường, phường, quận, thành phố), nên tên đứng
+    sau cùng là cấp hành chính lớn nhất. "Kiệt 12 Hoàng Sa, Thọ Quang, Sơn Trà" cho "Sơn
+    Trà" và "Sơn Trà Điện Ngọc, Mỹ An, Ngũ Hành Sơn" cho "Ngũ Hành Sơn", bất kể thứ tự
+    trong Quan.csv; leftmost-longest trên địa chỉ đọc xuôi sẽ trả về tên đường trùng tên quận.
+
+    Tên viết đúng chính tả (như trong names) được tìm trước trên địa chỉ gốc; chỉ địa chỉ
+    không chứa tên nào viết đúng mới được chuẩn hóa (bỏ dấu, chữ thường) để khớp "Hai
+    Chau", "HẢI CHÂU", "Hoà Vang". Với danh sách ngắn (tối đa SHORT_LIST tên, như 8
+    quận/huyện), bước đầu là vòng lặp rfind giống find_district; với danh sách dài (phường,
+    đường), mọi tên được dựng thành trie và biên dịch một lần thành regex, nên mỗi địa chỉ
+    chỉ duyệt một lượt bất kể số tên. Hai cách cho cùng kết quả (xem benchmark()).
+    """
+
+    def __init__(self, names):
+        """
+        Args:
+            names: Danh sách tên chuẩn. Các tên trùng nhau sau khi chuẩn hóa chỉ giữ tên đầu tiên.
+        """
+        self.names = []
+        self.spellings = []
+        keys = set()
+        trie = {}
+        exact_trie = {}
+        for name in names:
+            if pd.isna(name):
+                continue
+            key = normalize_text(name)
+            if not key or key in keys:
+                continue
+            keys.add(key)
+            spelling = str(name).strip()
+            # Cả hai regex chạy trên chuỗi đảo ngược để tìm từ phải sang
+            trie_insert(trie, key[::-1], len(self.names))
+            trie_insert(exact_trie, spelling[::-1], len(self.names))
+            self.names.append(name)
+            self.spellings.append(spelling)
+        self.indexed_spellings = list(enumerate(self.spellings))
+        # Văn bản chuẩn hóa đã qua BYTE_TABLE nên \b đúng là ranh giới chữ/số
+        pattern, self.group_names = compile_trie(trie)
+        self.pattern = re.compile(pattern.encode("ascii"))
+        pattern, self.exact_group_names = compile_trie(exact_trie, space=" ")
+        self.exact_pattern = re.compile(pattern)
+
+    @classmethod
+    def from_csv(cls, csv_file, column="Quận huyện"):
+        """Tạo matcher từ một cột của file CSV (mặc định Quan.csv)."""
+        return cls(pd.read_csv(csv_file, encoding="utf-8-sig")[column].dropna().tolist())
+
+    def find_exact(self, address, use_loop=None):
+        """Tìm tên viết đúng chính tả (phân biệt dấu, hoa thường) theo quy tắc rightmost-longest.
+
+        Args:
+            address: Chuỗi địa chỉ.
+            use_loop: True thì duyệt từng tên bằng rfind, False thì dùng regex trie; None thì
+                dùng vòng lặp khi danh sách có tối đa SHORT_LIST tên.
+
+        Returns:
+            int: Vị trí tên trong names, -1 nếu không có.
+        """
+        if use_loop is None:
+            use_loop = len(self.names) <= SHORT_LIST
+        if not use_loop:
+            m = self.exact_pattern.search(address[::-1])
+            return self.exact_group_names[m.lastindex] if m else -1
+        best, best_end = -1, -1
+        # Lọc nhanh các tên có trong địa chỉ rồi mới kiểm tra ranh giới từ
+        for index, spelling in [pair for pair in self.indexed_spellings if pair[1] in address]:
+            # Lần xuất hiện trọn từ cuối cùng của tên này
+            start = address.rfind(spelling)
+            while start >= 0:
+                end = start + len(spelling)
+                if ((start == 0 or not is_word_char(address[start - 1]))
+                        and (end == len(address) or not is_word_char(address[end]))):
+                    if end > best_end or end == best_end and len(spelling) > len(self.spellings[best]):
+                        best, best_end = index, end
+                    break
+                start = address.rfind(spelling, 0, end - 1)
+        return best
+
+    def find_all(self, address):
+        """Tìm mọi tên xuất hiện trọn từ trong địa chỉ đã chuẩn hóa, không chồng nhau (rightmost-longest).
+
+        Returns:
+            list: Các (start, end, name) theo thứ tự xuất hiện; start/end tính trên chuỗi đã chuẩn hóa.
+        """
+        if address is None or pd.isna(address):
+            return []
+        text = normalize_text(address).encode("ascii")
+        return [(len(text) - m.end(), len(text) - m.start(), self.names[self.group_names[m.lastindex]])
+                for m in self.pattern.finditer(text[::-1])][::-1]
+
+    def match(self, address, default=None):
+        """Tên theo quy tắc rightmost-longest, default nếu địa chỉ rỗng hoặc không chứa tên nào."""
+        if address is None or pd.isna(address):
+            return default
+        address = str(address)
+        index = self.find_exact(address)
+        if index < 0:
+            m = self.pattern.search(normalize_text(address).encode("ascii")[::-1])
+            index = self.group_names[m.lastindex] if m else -1
+        return self.names[index] if index >= 0 else default
+
+    def tag(self, addresses, default=None):
+        """Gán tên cho cả một cột địa chỉ; mỗi địa chỉ khác nhau chỉ được xử lý một lần.
+
+        Với danh sách dài, các địa chỉ khác nhau được nối (đảo ngược) thành một khối và quét
+        bằng một lần finditer; vị trí khớp được gán về địa chỉ theo vị trí các dấu xuống
+        dòng. Chỉ các địa chỉ không chứa tên viết đúng chính tả mới được chuẩn hóa.
+
+        Args:
+            addresses: Series địa chỉ.
+            default: Giá trị cho địa chỉ rỗng hoặc không khớp tên nào.
+
+        Returns:
+            Series cùng index với addresses.
+        """
+        addresses = pd.Series(addresses)
+        codes, uniques = pd.factorize(addresses)
+        found = np.full(len(uniques), -1, dtype=np.int64)
+        if len(uniques):
+            texts = uniques.tolist()
+            if not all(isinstance(text, str) for text in texts):
+                texts = [str(text) for text in texts]
+            if len(self.names) <= SHORT_LIST:
+                found[:] = [self.find_exact(text) for text in texts]
+            else:
+                # Khối đảo ngược: dòng j là địa chỉ thứ n - 1 - j
+                newlines = np.cumsum([len(text) + 1 for text in reversed(texts)]) - 1
+                lines, values = first_match_per_line(self.exact_pattern.finditer(join_lines(texts)[::-1]),
+                                                     newlines, self.exact_group_names)
+                found[len(texts) - 1 - lines] = values
+            rest = np.flatnonzero(found < 0)
+            if len(rest):
+                data = normalize_bytes([texts[i] for i in rest])[::-1]
+                newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+                lines, values = first_match_per_line(self.pattern.finditer(data), newlines, self.group_names)
+                found[rest[len(rest) - 1 - lines]] = values
+        # found = -1 (không khớp) và codes = -1 (giá trị rỗng) đều trỏ vào default ở cuối
+        choices = self.names + [default]
+        values = np.array([choices[index] for index in found.tolist()] + [default], dtype=object)
+        return pd.Series(values[codes], index=addresses.index, dtype=object)
+
+
+def benchmark(n=100_000):
+    """So sánh find_district của notebook (duyệt từng tên cho mỗi dòng) với AddressMatcher.tag.
+
+    Địa chỉ giả lập có dạng "số đường, phường, quận, Đà Nẵng" nên biết trước quận đúng;
+    đường "Hoàng Sa" (trùng tên huyện Hoàng Sa) và phường "Hải Châu 1" (chứa tên quận Hải
+    Châu) là các trường hợp mà kết quả của find_district phụ thuộc thứ tự Quan.csv. Đo với
+    8 quận/huyện của Quan.csv (vòng lặp), với danh sách lớn hơn (quận + phường + đường,
+    regex trie) và với cột Address của Data/restaurants.csv nếu có; mỗi trường hợp cũng
+    kiểm tra hai cách tìm tên đúng chính tả của AddressMatcher cho cùng kết quả.
+    """
+    import os
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    quan_list = pd.read_csv(os.path.join(here, "Quan.csv"), encoding="utf-8-sig")["Quận huyện"].dropna().tolist()
+    # Hoàng Sa là huyện đảo, không có địa chỉ nhà hàng
+    districts = [quan for quan in quan_list if quan != "Hoàng Sa"]
+    wards = ["Hải Châu 1", "Thuận Phước", "Phước Ninh", "An Hải Bắc", "Mỹ An", "Hòa Khánh Bắc", "Khuê Trung"]
+    streets = ["Bạch Đằng", "Trần Phú", "Võ Nguyên Giáp", "Nguyễn Văn Linh", "Lê Duẩn", "Hùng Vương", "Hoàng Sa"]
+    truth = pd.Series([districts[k % len(districts)] for k in range(n)])
+    addresses = pd.Series([
+        f"{k} {streets[k % len(streets)]}, {wards[(k // len(streets)) % len(wards)]}, {truth[k]}, Đà Nẵng 550000"
+        for k in range(n)
+    ])
+    # Tên giả lập thêm cho danh sách lớn, không xuất hiện trong địa chỉ
+    filler = [f"Tổ {k} Khu dân cư" for k in range(500)]
+
+    cases = [
+        (f"{n:,} địa chỉ giả lập", addresses, quan_list, truth),
+        (f"{n:,} địa chỉ giả lập", addresses, filler + streets + wards + quan_list, None),
+    ]
+    restaurants_file = os.path.join(here, "..", "Data", "restaurants.csv")
+    if os.path.exists(restaurants_file):
+        real = pd.read_csv(restaurants_file)["Address"]
+        cases.insert(1, (f"{len(real):,} địa chỉ restaurants.csv", real, quan_list, None))
+
+    for label, data, names, expected_truth in cases:
+        def find_district(address):
+            # Cách của notebook: trả về tên đầu tiên trong danh sách xuất hiện trong địa chỉ
+            for quan in names:
+                if pd.notna(address) and quan in address:
+                    return quan
+            return "Không xác định"
+
+        start = time.perf_counter()
+        expected = data.apply(find_district)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = AddressMatcher(names)
+        result = matcher.tag(data, default="Không xác định")
+        tag_time = time.perf_counter() - start
+
+        # Vòng lặp (danh sách ngắn) và regex trie (danh sách dài) phải cho cùng kết quả
+        unique = [str(address) for address in data.dropna().unique()]
+        assert ([matcher.find_exact(address, use_loop=True) for address in unique]
+                == [matcher.find_exact(address, use_loop=False) for address in unique]), \
+            "Vòng lặp và regex trie cho kết quả khác nhau"
+
+        differ = int((result != expected).sum())
+        print(f"{label}, {len(names)} tên: find_district {loop_time:.4f} s, "
+              f"AddressMatcher.tag {tag_time:.4f} s, {differ} dòng khác kết quả")
+        if expected_truth is not None:
+            print(f"    Đúng quận: find_district {int((expected == expected_truth).sum()):,}/{len(data):,}, "
+                  f"AddressMatcher.tag {int((result == expected_truth).sum()):,}/{len(data):,}")
+        if differ and len(data) < n:
+            for address, old, new in zip(data[result != expected], expected[result != expected], result[result != expected]):
+                print(f"    {address!r}: {old} -> {new}")
+
+
+if __name__ == "__main__":
+    benchmark()
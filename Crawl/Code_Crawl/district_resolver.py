@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from address_matcher import AddressMatcher
+
+logger = logging.getLogger(__name__)
+
+# Ranh giới quận/huyện (GeoJSON, WGS84), đặt cùng thư mục với Quan.csv. Có thể lấy từ
+# GADM cấp 2 hoặc OpenStreetMap (admin_level=6) của Đà Nẵng; tên quận nằm trong một
+# trong các thuộc tính NAME_PROPERTIES và phải trùng với tên trong Quan.csv.
+DEFAULT_GEOJSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "districts.geojson")
+DEFAULT_QUAN_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Quan.csv")
+NAME_PROPERTIES = ["Quận huyện", "name", "NAME_2", "ten_huyen"]
+# Số ô lưới theo mỗi chiều của chỉ mục không gian
+GRID_SIZE = 64
+
+
+def read_polygons(geojson_file, name_property=None):
+    """Đọc các vùng từ file GeoJSON.
+
+    Returns:
+        list: Các (name, rings), rings là danh sách mảng (n, 2) kinh độ/vĩ độ của mọi vòng
+        (vỏ và lỗ) trong Polygon/MultiPolygon.
+    """
+    with open(geojson_file, encoding="utf-8") as f:
+        data = json.load(f)
+    features = data["features"] if data.get("type") == "FeatureCollection" else [data]
+
+    polygons = []
+    for feature in features:
+        properties = feature.get("properties") or {}
+        keys = [name_property] if name_property else NAME_PROPERTIES
+        name = next((properties[key] for key in keys if properties.get(key)), None)
+        geometry = feature.get("geometry") or {}
+        if name is None or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        parts = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+        rings = [np.asarray(ring, dtype=float)[:, :2] for part in parts for ring in part if len(ring) >= 3]
+        if rings:
+            polygons.append((name, rings))
+    return polygons
+
+
+def points_in_rings(lng, lat, rings):
+    """Kiểm tra một loạt điểm có nằm trong vùng (quy tắc chẵn-lẻ, nên lỗ được trừ ra)."""
+    inside = np.zeros(len(lng), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            if ay == by:
+                continue
+            crosses = (ay > lat) != (by > lat)
+            inside ^= crosses & (lng < (bx - ax) * (lat - ay) / (by - ay) + ax)
+    return inside
+
+
+class DistrictResolver:
+    """Xác định quận/huyện từ Latitude/Longitude bằng point-in-polygon.
+
+    Vùng bao của toàn bộ ranh giới được chia thành lưới GRID_SIZE x GRID_SIZE, mỗi quận
+    lưu các ô giao với khung bao của nó. Khi phân loại, mỗi điểm chỉ được kiểm tra
+    với các quận có ô chứa điểm, và mỗi quận được kiểm tra vector hóa trên mọi điểm
+    cùng lúc. Điểm không có tọa độ dùng AddressMatcher trên địa chỉ.
+    """
+
+    def __init__(self, geojson_file=DEFAULT_GEOJSON, fallback=None, name_property=None, grid_size=GRID_SIZE,
+                 require_boundaries=True):
+        """
+        Args:
+            geojson_file: File GeoJSON ranh giới quận/huyện.
+            fallback: AddressMatcher dùng khi thiếu tọa độ, mặc định tạo từ Quan.csv.
+            name_property: Thuộc tính chứa tên quận, mặc định thử NAME_PROPERTIES.
+            require_boundaries: Báo lỗi nếu không có ranh giới nào đọc được. Đặt False để
+                chủ động chỉ xác định quận/huyện theo địa chỉ.
+
+        Raises:
+            FileNotFoundError: Nếu require_boundaries và không có geojson_file.
+            ValueError: Nếu require_boundaries và file không đọc được hoặc không có vùng nào.
+        """
+        self.fallback = fallback if fallback is not None else AddressMatcher.from_csv(DEFAULT_QUAN_CSV)
+        self.polygons = []
+        self.polygon_cells = []
+        if os.path.isfile(geojson_file):
+            try:
+                self.polygons = read_polygons(geojson_file, name_property)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                if require_boundaries:
+                    raise ValueError(f"Không đọc được ranh giới quận/huyện {geojson_file}: {e}") from e
+                logger.warning(f"Không đọc được ranh giới quận/huyện {geojson_file}: {e}")
+            if require_boundaries and not self.polygons:
+                raise ValueError(f"{geojson_file} không có vùng Polygon/MultiPolygon nào có tên quận/huyện.")
+        elif require_boundaries:
+            raise FileNotFoundError(
+                f"Không tìm thấy {geojson_file}. Tải ranh giới quận/huyện Đà Nẵng (GADM cấp 2 hoặc "
+                f"OpenStreetMap admin_level=6) về đường dẫn này, hoặc dùng require_boundaries=False "
+                f"để chỉ xác định theo địa chỉ."
+            )
+        else:
+            logger.warning(f"Không tìm thấy {geojson_file}, chỉ xác định quận/huyện theo địa chỉ.")
+        logger.info(f"Đã tải {len(self.polygons)} vùng ranh giới quận/huyện.")
+        self.build_grid(grid_size)
+
+    def build_grid(self, grid_size):
+        self.grid_size = grid_size
+        # Với mỗi quận: các ô lưới giao với khung bao của quận
+        self.polygon_cells = []
+        if not self.polygons:
+            return
+        boxes = []
+        for _, rings in self.polygons:
+            points = np.vstack(rings)
+            boxes.append((points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()))
+        boxes = np.array(boxes)
+        self.origin = boxes[:, 0].min(), boxes[:, 1].min()
+        # Tránh ô rộng 0 khi mọi vùng thẳng hàng
+        self.cell_width = max(boxes[:, 2].max() - self.origin[0], 1e-9) / grid_size
+        self.cell_height = max(boxes[:, 3].max() - self.origin[1], 1e-9) / grid_size
+        for min_x, min_y, max_x, max_y in boxes:
+            col0, row0 = self.cell_of(min_x, min_y)
+            col1, row1 = self.cell_of(max_x, max_y)
+            cols, rows = np.meshgrid(np.arange(col0, col1 + 1), np.arange(row0, row1 + 1))
+            self.polygon_cells.append((rows * grid_size + cols).ravel())
+
+    def cell_of(self, lng, lat):
+        col = np.clip(((np.asarray(lng) - self.origin[0]) // self.cell_width).astype(int), 0, self.grid_size - 1)
+        row = np.clip(((np.asarray(lat) - self.origin[1]) // self.cell_height).astype(int), 0, self.grid_size - 1)
+        return col, row
+
+    def locate(self, latitudes, longitudes):
+        """Tên quận chứa mỗi điểm, None nếu thiếu tọa độ hoặc nằm ngoài mọi vùng.
+
+        Returns:
+            ndarray (object) cùng độ dài với latitudes.
+        """
+        lat = pd.to_numeric(pd.Series(latitudes), errors="coerce").to_numpy(dtype=float)
+        lng = pd.to_numeric(pd.Series(longitudes), errors="coerce").to_numpy(dtype=float)
+        result = np.full(len(lat), None, dtype=object)
+        if not self.polygons:
+            return result
+
+        valid = ~(np.isnan(lat) | np.isnan(lng))
+        # Điểm ngoài khung bao của lưới không thuộc quận nào
+        valid &= (lng >= self.origin[0]) & (lng <= self.origin[0] + self.cell_width * self.grid_size)
+        valid &= (lat >= self.origin[1]) & (lat <= self.origin[1] + self.cell_height * self.grid_size)
+        index = np.flatnonzero(valid)
+        if not len(index):
+            return result
+        col, row = self.cell_of(lng[index], lat[index])
+        cell = row * self.grid_size + col
+
+        assigned = np.zeros(len(index), dtype=bool)
+        for (name, rings), cells in zip(self.polygons, self.polygon_cells):
+            # Chỉ kiểm tra các điểm chưa gán nằm trong ô lưới của quận
+            positions = np.flatnonzero(np.isin(cell, cells) & ~assigned)
+            if not len(positions):
+                continue
+            inside = points_in_rings(lng[index[positions]], lat[index[positions]], rings)
+            result[index[positions[inside]]] = name
+            assigned[positions[inside]] = True
+        return result
+
+    def resolve(self, latitudes, longitudes, addresses=None, default=None):
+        """Quận/huyện cho cả một bảng nhà hàng.
+
+        Args:
+            latitudes, longitudes: Series tọa độ (có thể thiếu).
+            addresses: Series địa chỉ cùng index, dùng khi thiếu tọa độ.
+            default: Giá trị khi không xác định được.
+
+        Returns:
+            Series cùng index với latitudes.
+        """
+        latitudes = pd.Series(latitudes)
+        result = pd.Series(self.locate(latitudes, longitudes), index=latitudes.index, dtype=object)
+        if addresses is not None:
+            # Chỉ dùng địa chỉ cho điểm thiếu tọa độ, điểm có tọa độ nằm ngoài mọi vùng giữ default
+            lat = pd.to_numeric(latitudes, errors="coerce")
+            lng = pd.to_numeric(pd.Series(longitudes, index=latitudes.index), errors="coerce")
+            missing = lat.isna() | lng.isna()
+            if not self.polygons:
+                missing[:] = True
+            if missing.any():
+                result[missing] = self.fallback.tag(pd.Series(addresses, index=latitudes.index)[missing])
+        if default is not None:
+            result = result.where(result.notna(), default)
+        return result
@@ -0,0 +1,116 @@
+import hashlib
+import time
+import tracemalloc
+
+import numpy as np
+
+# Khi bộ đệm khóa mới vượt quá ngưỡng này (hoặc 1/8 mảng đã sắp xếp) thì gộp vào mảng
+MIN_PENDING = 1024
+
+
+def key_hash(key):
+    """Băm một khóa (chuỗi hoặc tuple chuỗi, vd. (Restaurant_id, Google_review_id)) thành số 64-bit."""
+    if isinstance(key, tuple):
+        key = "\x1f".join(str(part) for part in key)
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CompactKeySet:
+    """Tập khóa lọc trùng gọn: lưu hash 64-bit trong mảng NumPy đã sắp xếp.
+
+    Thay thế cho set các chuỗi/tuple trong save_reviews và check_for_existing_review
+    (hỗ trợ `key in s`, `s.add(key)`, `s.update(keys)`), mỗi khóa chỉ tốn 8 byte thay
+    vì hàng trăm byte cho tuple và hai chuỗi Google_review_id dài.
+
+    Sai số: hai khóa khác nhau chỉ bị coi là trùng khi hash 64-bit trùng nhau. Với n
+    khóa đã lưu, xác suất một khóa mới bị báo nhầm là đã tồn tại không vượt quá
+    n / 2^64 (khoảng 5.4e-13 với 10 triệu đánh giá). Khi xảy ra, đánh giá mới đó bị
+    bỏ qua; không bao giờ có trường hợp đánh giá đã tồn tại bị ghi lại lần nữa.
+    """
+
+    def __init__(self, keys=()):
+        self.hashes = np.unique(np.fromiter((key_hash(k) for k in keys), dtype=np.uint64))
+        self.pending = set()
+
+    def merge(self):
+        if self.pending:
+            pending = np.fromiter(self.pending, dtype=np.uint64, count=len(self.pending))
+            self.hashes = np.union1d(self.hashes, pending)
+            self.pending = set()
+
+    def add_hash(self, h):
+        if not self.contains_hash(h):
+            self.pending.add(h)
+            if len(self.pending) > max(MIN_PENDING, len(self.hashes) // 8):
+                self.merge()
+
+    def contains_hash(self, h):
+        if h in self.pending:
+            return True
+        i = np.searchsorted(self.hashes, np.uint64(h))
+        return i < len(self.hashes) and int(self.hashes[i]) == h
+
+    def add(self, key):
+        self.add_hash(key_hash(key))
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def copy(self):
+        other = CompactKeySet()
+        other.hashes = self.hashes.copy()
+        other.pending = set(self.pending)
+        return other
+
+    def __contains__(self, key):
+        return self.contains_hash(key_hash(key))
+
+    def __len__(self):
+        return len(self.hashes) + len(self.pending)
+
+    def nbytes(self):
+        """Bộ nhớ xấp xỉ (byte) của mảng hash và bộ đệm."""
+        return self.hashes.nbytes + len(self.pending) * 36
+
+
+def benchmark(n=1_000_000, restaurants=200):
+    """So sánh bộ nhớ và tốc độ tra cứu giữa set tuple hiện tại và CompactKeySet.
+
+    Sinh n khóa (Restaurant_id, Google_review_id) giả lập với Google_review_id dài
+    như thật (~60 ký tự base64) và in kết quả.
+    """
+    def make_keys():
+        return [(str(i % restaurants + 1), f"ChZDSUhNMG9nS0VJQ0FnSUQ{i:012d}xYnpYQRAB{i:08x}") for i in range(n)]
+
+    # Bộ nhớ của set gồm cả các tuple và chuỗi mà nó giữ lại
+    tracemalloc.start()
+    keys = make_keys()
+    key_set = set(keys)
+    del keys
+    set_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    keys = make_keys()
+    probes = keys[: min(n, 100_000)]
+
+    start = time.perf_counter()
+    assert all(k in key_set for k in probes)
+    set_lookup = time.perf_counter() - start
+    del key_set
+
+    start = time.perf_counter()
+    compact = CompactKeySet(keys)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    assert all(k in compact for k in probes)
+    compact_lookup = time.perf_counter() - start
+
+    print(f"{n:,} khóa, {len(probes):,} lần tra cứu")
+    print(f"set tuple     : {set_bytes / 2**20:8.1f} MiB, tra cứu {set_lookup * 1e6 / len(probes):.2f} µs/lần")
+    print(f"CompactKeySet : {compact.nbytes() / 2**20:8.1f} MiB, tra cứu {compact_lookup * 1e6 / len(probes):.2f} µs/lần"
+          f", dựng {build_time:.1f} s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,188 @@
+import csv
+import json
+import logging
+import os
+import re
+import threading
+
+from review_dedup import CompactKeySet
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewIndex:
+    """Chỉ mục phụ (sidecar) của reviews_all.csv theo Restaurant_id.
+
+    Thư mục <tên file>_index/ chứa meta.json (kích thước CSV đã được lập chỉ mục và
+    Review_id lớn nhất) và mỗi nhà hàng một file <Restaurant_id>.ids liệt kê các
+    Google_review_id đã biết. Khi khởi động chỉ cần đọc meta.json; tập ID của từng
+    nhà hàng chỉ được nạp khi cần. Nếu kích thước CSV khác với meta (CSV bị sửa bên
+    ngoài hoặc chưa có chỉ mục) thì chỉ mục được dựng lại một lần từ CSV.
+
+    Đối tượng dùng được thay cho tập existing_reviews: hỗ trợ `(rid, gid) in index`
+    và `index.update(keys)`. next_id_ref là bộ đếm Review_id dùng chung với save_reviews.
+
+    watermarks.json lưu watermark của từng nhà hàng: Google_review_id và Created_at
+    của đánh giá mới nhất ở lần crawl trước, dùng để dừng cuộn sớm khi sắp xếp Newest,
+    cùng Num_of_reviews lúc crawl để bỏ qua nhà hàng không có đánh giá mới.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.index_dir = os.path.splitext(output_file)[0] + "_index"
+        self.meta_file = os.path.join(self.index_dir, "meta.json")
+        self.watermarks_file = os.path.join(self.index_dir, "watermarks.json")
+        self.ids = {}
+        self.watermarks = {}
+        self.lock = threading.RLock()
+        self.next_id_ref = {'value': 1}
+        self.open()
+
+    def csv_size(self):
+        return os.path.getsize(self.output_file) if os.path.isfile(self.output_file) else 0
+
+    def ids_file(self, restaurant_id):
+        safe_id = re.sub(r"[^0-9A-Za-z_-]", "_", str(restaurant_id))
+        return os.path.join(self.index_dir, f"{safe_id}.ids")
+
+    def open(self):
+        """Đọc meta.json, dựng lại chỉ mục nếu không khớp với CSV."""
+        meta = None
+        if os.path.isfile(self.meta_file):
+            try:
+                with open(self.meta_file, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Không đọc được chỉ mục {self.meta_file}: {e}")
+        if meta is None or meta.get("csv_size") != self.csv_size() or not os.path.isfile(self.watermarks_file):
+            self.rebuild()
+        else:
+            self.next_id_ref['value'] = int(meta.get("max_review_id", 0)) + 1
+            try:
+                with open(self.watermarks_file, encoding="utf-8") as f:
+                    self.watermarks = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Không đọc được watermark {self.watermarks_file}: {e}")
+            logger.info(f"Đã mở chỉ mục đánh giá {self.index_dir}, Review_id tiếp theo: {self.next_id_ref['value']}")
+
+    def rebuild(self):
+        """Quét CSV một lần để dựng lại toàn bộ chỉ mục.
+
+        Watermark của mỗi nhà hàng là đánh giá có Created_at lớn nhất; nếu bằng nhau
+        thì lấy đánh giá của lần crawl sau, rồi Review_id nhỏ hơn (trong một lần crawl
+        đánh giá được ghi theo thứ tự Newest nên đánh giá mới nhất có ID nhỏ nhất).
+        """
+        logger.info(f"Dựng lại chỉ mục đánh giá từ {self.output_file}...")
+        ids_by_restaurant = {}
+        newest = {}
+        max_id = 0
+        if os.path.isfile(self.output_file):
+            with open(self.output_file, mode="r", encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    google_review_id = row.get("Google_review_id", "").strip()
+                    restaurant_id = row.get("Restaurant_id", "")
+                    review_id = 0
+                    if row.get("Review_id"):
+                        try:
+                            review_id = int(row["Review_id"])
+                            max_id = max(max_id, review_id)
+                        except ValueError:
+                            logger.warning(f"Review_id không hợp lệ: {row['Review_id']}")
+                    if google_review_id and restaurant_id:
+                        ids_by_restaurant.setdefault(restaurant_id, []).append(google_review_id)
+                        created_at = row.get("Created_at", "")
+                        if created_at:
+                            rank = (created_at, row.get("Crawl_date", ""), -review_id)
+                            if restaurant_id not in newest or rank > newest[restaurant_id][0]:
+                                newest[restaurant_id] = (rank, google_review_id, created_at)
+
+        with self.lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            for name in os.listdir(self.index_dir):
+                if name.endswith(".ids"):
+                    os.remove(os.path.join(self.index_dir, name))
+            for restaurant_id, google_ids in ids_by_restaurant.items():
+                with open(self.ids_file(restaurant_id), mode="w", encoding="utf-8") as f:
+                    f.write("\n".join(google_ids) + "\n")
+            self.ids = {}
+            self.next_id_ref['value'] = max_id + 1
+            self.watermarks = {
+                restaurant_id: {"Google_review_id": google_review_id, "Created_at": created_at}
+                for restaurant_id, (_, google_review_id, created_at) in newest.items()
+            }
+            self.write_watermarks()
+            self.write_meta()
+        logger.info(f"Đã lập chỉ mục {len(ids_by_restaurant)} nhà hàng, Review_id tiếp theo: {max_id + 1}")
+
+    def write_meta(self):
+        meta = {"csv_size": self.csv_size(), "max_review_id": self.next_id_ref['value'] - 1}
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, mode="w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+    def write_watermarks(self):
+        tmp_file = self.watermarks_file + ".tmp"
+        with open(tmp_file, mode="w", encoding="utf-8") as f:
+            json.dump(self.watermarks, f, ensure_ascii=False)
+        os.replace(tmp_file, self.watermarks_file)
+
+    def watermark(self, restaurant_id):
+        """Watermark {Google_review_id, Created_at} của nhà hàng, None nếu chưa có."""
+        with self.lock:
+            return self.watermarks.get(str(restaurant_id))
+
+    def set_watermark(self, restaurant_id, google_review_id, created_at, num_of_reviews=None):
+        """Ghi nhận đánh giá mới nhất (và số lượt đánh giá lúc crawl) sau khi đã crawl xong một nhà hàng."""
+        with self.lock:
+            self.watermarks[str(restaurant_id)] = {"Google_review_id": google_review_id, "Created_at": created_at,
+                                                   "Num_of_reviews": num_of_reviews}
+            self.write_watermarks()
+
+    def crawled_count(self, restaurant_id):
+        """Num_of_reviews của nhà hàng ở lần crawl đánh giá trước, None nếu chưa có."""
+        watermark = self.watermark(restaurant_id)
+        return watermark.get("Num_of_reviews") if watermark else None
+
+    def google_ids(self, restaurant_id):
+        """Tập Google_review_id (CompactKeySet) của một nhà hàng, nạp từ file ở lần gọi đầu."""
+        with self.lock:
+            if restaurant_id not in self.ids:
+                google_ids = CompactKeySet()
+                path = self.ids_file(restaurant_id)
+                if os.path.isfile(path):
+                    with open(path, encoding="utf-8") as f:
+                        google_ids = CompactKeySet(line.strip() for line in f if line.strip())
+                self.ids[restaurant_id] = google_ids
+            return self.ids[restaurant_id]
+
+    def known_ids(self, restaurant_id):
+        """Bản sao tập Google_review_id đã biết trước khi crawl nhà hàng này."""
+        with self.lock:
+            return self.google_ids(restaurant_id).copy()
+
+    def release(self, restaurant_id):
+        """Giải phóng tập ID đã nạp của một nhà hàng sau khi crawl xong."""
+        with self.lock:
+            self.ids.pop(restaurant_id, None)
+
+    def __contains__(self, key):
+        restaurant_id, google_review_id = key
+        return google_review_id in self.google_ids(restaurant_id)
+
+    def update(self, keys):
+        """Ghi nhận các (Restaurant_id, Google_review_id) vừa được thêm vào CSV.
+
+        Gọi sau khi CSV đã được ghi và next_id_ref đã cập nhật.
+        """
+        by_restaurant = {}
+        for restaurant_id, google_review_id in keys:
+            by_restaurant.setdefault(restaurant_id, []).append(google_review_id)
+        with self.lock:
+            for restaurant_id, google_ids in by_restaurant.items():
+                with open(self.ids_file(restaurant_id), mode="a", encoding="utf-8") as f:
+                    f.write("\n".join(google_ids) + "\n")
+                if restaurant_id in self.ids:
+                    self.ids[restaurant_id].update(google_ids)
+            self.write_meta()
@@ -0,0 +1,244 @@
+import re
+import time
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Đơn vị -> (số ngày, số tháng) của một đơn vị. Giờ/phút/giây tính là cùng ngày crawl.
+UNIT_OFFSETS = {
+    "second": (0, 0),
+    "minute": (0, 0),
+    "hour": (0, 0),
+    "day": (1, 0),
+    "week": (7, 0),
+    "month": (0, 1),
+    "year": (0, 12),
+}
+
+# Bảng ngôn ngữ của Review_time trên Google Maps. Thêm ngôn ngữ mới chỉ cần thêm một mục:
+#   edited: tiền tố "đã chỉnh sửa"; numbers: từ chỉ số lượng; units: từ chỉ đơn vị
+#   (đã gồm dạng số nhiều nếu có); template: thứ tự số lượng, đơn vị và hậu tố.
+LANGUAGES = {
+    "en": {
+        "edited": ["edited"],
+        "numbers": {"a": 1, "an": 1, "one": 1},
+        "units": {
+            "seconds": "second", "second": "second", "minutes": "minute", "minute": "minute",
+            "hours": "hour", "hour": "hour", "days": "day", "day": "day", "weeks": "week", "week": "week",
+            "months": "month", "month": "month", "years": "year", "year": "year",
+        },
+        "template": r"{amount}\s*{unit}\s+ago",
+    },
+    "vi": {
+        "edited": ["đã chỉnh sửa", "đã sửa"],
+        "numbers": {"một": 1},
+        "units": {
+            "giây": "second", "phút": "minute", "giờ": "hour", "ngày": "day",
+            "tuần": "week", "tháng": "month", "năm": "year",
+        },
+        "template": r"{amount}\s*{unit}\s+trước",
+    },
+}
+
+ReviewTimeOffset = namedtuple("ReviewTimeOffset", ["amount", "unit", "language"])
+ReviewTimeOffset.__doc__ = "Khoảng thời gian tương đối đã phân tích: amount đơn vị unit trước thời điểm crawl."
+ReviewTimeOffset.days = property(lambda self: self.amount * UNIT_OFFSETS[self.unit][0])
+ReviewTimeOffset.months = property(lambda self: self.amount * UNIT_OFFSETS[self.unit][1])
+
+
+def alternation(words):
+    # Từ dài đứng trước để "an" không bị khớp thành "a", "months" không thành "month"
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+def compile_language(table):
+    pattern = r"(?:(?:{edited})\s+)?".format(edited=alternation(table["edited"])) + table["template"].format(
+        amount=r"(?P<amount>\d+|{numbers})".format(numbers=alternation(table["numbers"])),
+        unit=r"(?P<unit>{units})".format(units=alternation(table["units"])),
+    )
+    return re.compile(pattern)
+
+
+# Biên dịch một lần khi import, dùng chung cho mọi lần gọi
+COMPILED_LANGUAGES = [(code, table, compile_language(table)) for code, table in LANGUAGES.items()]
+
+
+@lru_cache(maxsize=65536)
+def parse_review_time(review_time):
+    """Phân tích Review_time tương đối theo bảng LANGUAGES.
+
+    Ví dụ: "3 weeks ago", "Edited a year ago", "2 tuần trước", "Đã chỉnh sửa một năm trước".
+    Kết quả được cache theo chuỗi vì mỗi lần crawl chỉ có vài trăm chuỗi khác nhau.
+
+    Returns:
+        ReviewTimeOffset hoặc None nếu không phân tích được.
+    """
+    if not review_time:
+        return None
+    text = unicodedata.normalize("NFC", review_time).strip().lower()
+    for code, table, pattern in COMPILED_LANGUAGES:
+        match = pattern.match(text)
+        if match:
+            amount = match.group("amount")
+            amount = int(amount) if amount.isdigit() else table["numbers"][amount]
+            return ReviewTimeOffset(amount, table["units"][match.group("unit")], code)
+    return None
+
+
+def convert_review_times(review_times, crawl_dates):
+    """Tính Created_at cho cả một cột Review_time.
+
+    Mỗi chuỗi Review_time khác nhau chỉ được phân tích một lần, sau đó ngày được
+    tính bằng phép toán vector trên cả cột. Trừ tháng/năm giống relativedelta: nếu
+    ngày không tồn tại trong tháng đích thì lấy ngày cuối tháng (31/3 - 1 tháng = 28/2).
+
+    Args:
+        review_times: Series chuỗi Review_time.
+        crawl_dates: Series ngày crawl (cùng index) hoặc một ngày dùng chung.
+
+    Returns:
+        Series datetime64 (đã bỏ giờ), NaT nếu không phân tích được.
+    """
+    review_times = pd.Series(review_times)
+    if isinstance(crawl_dates, pd.Series):
+        crawl = pd.to_datetime(crawl_dates).reindex(review_times.index)
+    else:
+        crawl = pd.Series(pd.Timestamp(crawl_dates), index=review_times.index)
+    crawl = crawl.dt.normalize()
+
+    codes, uniques = pd.factorize(review_times)
+    days_per = np.zeros(len(uniques) + 1, dtype=np.int64)
+    months_per = np.zeros(len(uniques) + 1, dtype=np.int64)
+    valid_per = np.zeros(len(uniques) + 1, dtype=bool)
+    for k, value in enumerate(uniques):
+        parsed = parse_review_time(value) if isinstance(value, str) else None
+        if parsed:
+            days_per[k] = parsed.days
+            months_per[k] = parsed.months
+            valid_per[k] = True
+    # codes = -1 (giá trị rỗng) trỏ vào phần tử cuối, luôn không hợp lệ
+    days = days_per[codes]
+    months = months_per[codes]
+    valid = valid_per[codes] & crawl.notna().to_numpy()
+
+    result = crawl - pd.to_timedelta(days, unit="D")
+
+    has_months = valid & (months > 0)
+    if has_months.any():
+        base = crawl[has_months]
+        ym = base.dt.year.to_numpy() * 12 + base.dt.month.to_numpy() - 1 - months[has_months]
+        year, month = ym // 12, ym % 12 + 1
+        first = pd.to_datetime(pd.DataFrame({"year": year, "month": month, "day": 1}))
+        day = np.minimum(base.dt.day.to_numpy(), first.dt.days_in_month.to_numpy())
+        result[has_months] = (first + pd.to_timedelta(day - 1, unit="D")).to_numpy()
+
+    result[~valid] = pd.NaT
+    return result
+
+
+def benchmark(n=1_000_000):
+    """So sánh convert_review_time từng dòng (cách notebook đang dùng) với convert_review_times.
+
+    Cách từng dòng được đo trên 100.000 dòng rồi quy đổi cho n dòng.
+    """
+    from dateutil import relativedelta
+
+    def convert_row(created_time, review_time):
+        # Bản sao convert_review_time trước đây: regex và relativedelta cho mỗi dòng
+        if pd.isnull(review_time) or not review_time:
+            return None
+        if "hour" in review_time.lower() or "minute" in review_time.lower():
+            return created_time.date()
+        review_time = re.sub(r'\bEdited\b\s*', '', review_time, flags=re.IGNORECASE)
+        review_time = re.sub(r'\ba\b', '1', review_time, flags=re.IGNORECASE)
+        match = re.match(r"(\d+)\s*(day|week|month|year)s?\s*ago", review_time, re.IGNORECASE)
+        if not match:
+            return None
+        amount, unit = int(match.group(1)), match.group(2).lower()
+        return (created_time - relativedelta.relativedelta(**{unit + "s": amount})).date()
+
+    rng = np.random.default_rng(0)
+    units = ["day", "week", "month", "year"]
+    samples = [f"{k} {u}s ago" for u in units for k in range(2, 12)] + \
+        [f"a {u} ago" for u in units] + [f"Edited {k} months ago" for k in range(2, 12)] + \
+        ["3 hours ago", "a minute ago", None]
+    crawl_days = pd.date_range("2025-01-01", periods=60, freq="D")
+    df = pd.DataFrame({
+        "Review_time": rng.choice(np.array(samples, dtype=object), n),
+        "Crawl_date": crawl_days[rng.integers(0, len(crawl_days), n)] + pd.Timedelta(hours=13),
+    })
+
+    sample = df.head(min(n, 100_000))
+    start = time.perf_counter()
+    expected = [convert_row(c.to_pydatetime(), r) for c, r in zip(sample["Crawl_date"], sample["Review_time"])]
+    row_time = (time.perf_counter() - start) * n / len(sample)
+
+    parse_review_time.cache_clear()
+    start = time.perf_counter()
+    result = convert_review_times(df["Review_time"], df["Crawl_date"])
+    batch_time = time.perf_counter() - start
+
+    got = [d.date() if not pd.isnull(d) else None for d in result.head(len(sample))]
+    assert got == expected, "Kết quả convert_review_times khác convert_review_time"
+    print(f"{n:,} dòng, {df['Review_time'].nunique()} chuỗi Review_time khác nhau")
+    print(f"từng dòng (ước tính): {row_time:8.2f} s")
+    print(f"convert_review_times: {batch_time:8.2f} s")
+
+
+def benchmark_parser(n=200_000):
+    """So sánh regex mỗi lần gọi (parse_review_time trước đây) với bảng mẫu đã biên dịch.
+
+    Đo parse_review_time khi không dùng cache để chỉ so sánh phần phân tích chuỗi.
+    """
+    def parse_old(review_time):
+        # Bản sao parse_review_time trước đây: chỉ tiếng Anh, re.sub/re.match mỗi lần gọi
+        lowered = review_time.lower()
+        if "hour" in lowered or "minute" in lowered:
+            return 0, "day"
+        review_time = re.sub(r'\bEdited\b\s*', '', review_time, flags=re.IGNORECASE)
+        review_time = re.sub(r'\ba\b', '1', review_time, flags=re.IGNORECASE)
+        match = re.match(r"(\d+)\s*(day|week|month|year)s?\s*ago", review_time, re.IGNORECASE)
+        if not match:
+            return None
+        return int(match.group(1)), match.group(2).lower()
+
+    english = [f"{k} {u}s ago" for u in ["day", "week", "month", "year"] for k in range(2, 12)] + \
+        ["a day ago", "a week ago", "a month ago", "a year ago", "Edited 3 months ago", "3 hours ago"]
+    vietnamese = [f"{k} {u} trước" for u in ["ngày", "tuần", "tháng", "năm"] for k in range(2, 12)] + \
+        ["một năm trước", "Đã chỉnh sửa 3 tháng trước", "3 giờ trước"]
+    english = (english * (n // len(english) + 1))[:n]
+    vietnamese = (vietnamese * (n // len(vietnamese) + 1))[:n]
+    parse_uncached = parse_review_time.__wrapped__
+
+    for old, new in zip(map(parse_old, english), map(parse_uncached, english)):
+        # Cách cũ trả về (0, "day") cho giờ/phút
+        same = (new.days, "day") if new.unit in ("hour", "minute") else (new.amount, new.unit)
+        assert old == same, "Kết quả parse_review_time khác cách cũ"
+
+    start = time.perf_counter()
+    for value in english:
+        parse_old(value)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in english:
+        parse_uncached(value)
+    new_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = [parse_uncached(value) for value in vietnamese]
+    vi_time = time.perf_counter() - start
+    assert all(parsed), "Có Review_time tiếng Việt không phân tích được"
+
+    print(f"{n:,} chuỗi mỗi loại (không cache)")
+    print(f"regex mỗi lần gọi (tiếng Anh):   {old_time:8.2f} s")
+    print(f"bảng mẫu biên dịch (tiếng Anh):  {new_time:8.2f} s")
+    print(f"bảng mẫu biên dịch (tiếng Việt): {vi_time:8.2f} s")
+
+
+if __name__ == "__main__":
+    benchmark_parser()
+    benchmark()
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import logging
 import csv
@@ -5,6 +6,12 @@ import os
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 import json
+import argparse
+import math
+import queue
+import threading
+from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -17,6 +24,12 @@ from selenium.webdriver.support import expected_conditions as EC
 from openlocationcode import openlocationcode as olc
 import pandas as pd
 
+from cdp_engine import CDPBrowser, CDPError
+from crawl_db import CrawlDB
+from crawl_scheduler import RecrawlScheduler
+from maps_url import parse_place_url, parse_place_urls, restaurant_key, restaurant_keys
+from tab_pool import BACKGROUND_TAB_ARGUMENTS, TabPool, run_in_tabs
+
 # Cấu hình logging
 logging.basicConfig(
     level=logging.INFO,
@@ -41,11 +54,17 @@ BASE_FIELDNAMES = [
     "Latitude", "Longitude", "Crawl_date"
 ]
 
-def setup_driver(headless=False):
+# Khóa dùng khi nhiều worker cùng khởi tạo trình duyệt
+driver_setup_lock = threading.Lock()
+# Khóa dùng khi nhiều worker cùng ghi journal
+journal_lock = threading.Lock()
+
+def setup_driver(headless=False, background_tabs=False):
     """Thiết lập và cấu hình trình duyệt Chrome.
 
     Args:
         headless (bool): Chạy trình duyệt ở chế độ không giao diện nếu True.
+        background_tabs (bool): Không giảm tốc tab nền (dùng khi tải nhiều tab song song).
 
     Returns:
         WebDriver: Trình duyệt Chrome đã được cấu hình.
@@ -64,6 +83,9 @@ def setup_driver(headless=False):
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
+    if background_tabs:
+        for argument in BACKGROUND_TAB_ARGUMENTS:
+            chrome_options.add_argument(argument)
 
     try:
         service = Service(ChromeDriverManager().install())
@@ -79,41 +101,76 @@ def setup_driver(headless=False):
         logger.error(f"Lỗi khi thiết lập trình duyệt: {e}")
         raise
 
-def scroll_until_end(driver, scrollable_div, max_attempts=5):
-    """Cuộn tìm div chứa danh sách nhà hàng đến khi không còn dữ liệu mới.
+# Script bất đồng bộ: cuộn container xuống cuối rồi chờ MutationObserver báo có phần tử mới.
+# Trả về ngay khi số phần tử khớp selector tăng, hoặc sau quietMs nếu không có gì mới.
+WAIT_FOR_NEW_ITEMS_JS = """
+const container = arguments[0], selector = arguments[1], quietMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const countNow = () => container.querySelectorAll(selector).length;
+const before = countNow();
+let finished = false, observer = null, timer = null, nudge = null;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(timer);
+    clearInterval(nudge);
+    const count = countNow();
+    done({count: count, grown: count > before});
+};
+observer = new MutationObserver(() => { if (countNow() > before) finish(); });
+observer.observe(container, {childList: true, subtree: true});
+container.scrollTop = container.scrollHeight;
+// Cuộn lại định kỳ để kích hoạt lazy-load nếu lần cuộn đầu không có tác dụng
+nudge = setInterval(() => { container.scrollTop = container.scrollHeight; }, 1000);
+timer = setTimeout(finish, quietMs);
+"""
+
+def wait_for_new_items(driver, container, item_selector, quiet_period=8):
+    """Cuộn container và chờ phần tử mới xuất hiện thay vì sleep cố định.
 
     Args:
         driver: WebDriver instance.
-        scrollable_div: Phần tử div có thể cuộn.
-        max_attempts: Số lần tối đa kiểm tra nếu không có dữ liệu mới (5 lần).
-    """
-    last_height = driver.execute_script("return arguments[0].scrollHeight;", scrollable_div)
-    no_change_count = 0
-    last_restaurant_count = 0
+        container: Phần tử có thể cuộn.
+        item_selector: CSS selector của phần tử trong danh sách.
+        quiet_period: Số giây không có phần tử mới thì coi là hết danh sách.
 
-    while no_change_count < max_attempts:
-        restaurants = driver.find_elements(By.CSS_SELECTOR, ".Nv2PK.THOPZb.CpccDe")
-        total_restaurants = len(restaurants)
-        new_count = total_restaurants - last_restaurant_count
-        logger.info(f"Tìm thấy {total_restaurants} nhà hàng (mới: {new_count if new_count > 0 else 0})")
+    Returns:
+        tuple: (số phần tử hiện có, True nếu có phần tử mới).
+    """
+    driver.set_script_timeout(quiet_period + 10)
+    result = driver.execute_async_script(WAIT_FOR_NEW_ITEMS_JS, container, item_selector, int(quiet_period * 1000))
+    return result["count"], result["grown"]
 
-        driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", scrollable_div)
-        time.sleep(2)
+def scroll_until_end(driver, scrollable_div, quiet_period=8, on_new_items=None):
+    """Cuộn tìm div chứa danh sách nhà hàng đến khi không còn dữ liệu mới.
 
-        new_height = driver.execute_script("return arguments[0].scrollHeight;", scrollable_div)
-        updated_total = len(driver.find_elements(By.CSS_SELECTOR, ".Nv2PK.THOPZb.CpccDe"))
+    Mỗi bước cuộn tiếp tục ngay khi có .Nv2PK mới xuất hiện trong feed, và chỉ
+    dừng khi không có nhà hàng mới trong quiet_period giây.
 
-        if new_height == last_height and updated_total == total_restaurants:
-            no_change_count += 1
-            logger.info(f"Không tìm thấy dữ liệu mới: {no_change_count}/{max_attempts}")
-        else:
-            no_change_count = 0
-            logger.info(f"Đã cuộn và tìm thấy thêm dữ liệu!")
+    Args:
+        driver: WebDriver instance.
+        scrollable_div: Phần tử div có thể cuộn.
+        quiet_period: Số giây không có dữ liệu mới thì coi là hết danh sách (8 giây).
+        on_new_items: Hàm gọi (không tham số) trước lần cuộn đầu và sau mỗi lần có nhà
+            hàng mới, dùng để xử lý link ngay trong lúc cuộn.
+    """
+    total_restaurants = len(driver.find_elements(By.CSS_SELECTOR, ".Nv2PK.THOPZb.CpccDe"))
+    updated_total = total_restaurants
+    if on_new_items:
+        on_new_items()
 
-        last_height = new_height
-        last_restaurant_count = total_restaurants  
+    while True:
+        updated_total, grown = wait_for_new_items(driver, scrollable_div, ".Nv2PK.THOPZb.CpccDe", quiet_period)
+        if not grown:
+            logger.info(f"Không tìm thấy dữ liệu mới sau {quiet_period} giây.")
+            break
+        logger.info(f"Tìm thấy {updated_total} nhà hàng (mới: {updated_total - total_restaurants})")
+        total_restaurants = updated_total
+        if on_new_items:
+            on_new_items()
     
-    logger.info(f"Hoàn thành cuộn! Tìm thấy tổng cộng {total_restaurants} nhà hàng.")
+    logger.info(f"Hoàn thành cuộn! Tìm thấy tổng cộng {updated_total} nhà hàng.")
 
 def safe_click(driver, element, wait_time=2, retries=3):
     """Click phần tử bằng JavaScript với cơ chế thử lại.
@@ -162,52 +219,98 @@ def init_csv(output_file="restaurants.csv"):
     else:
         logger.info(f"File CSV {output_file} đã tồn tại.")
 
-def save_links(driver, output_file="restaurants.csv"):
-    """Crawl danh sách link và tên nhà hàng.
-    Thêm các nhà hàng mới vào CSV dựa trên tên nhà hàng để tránh trùng lặp.
+def collect_links(driver, position_ref=None):
+    """Đọc link và tên nhà hàng trong danh sách kết quả đang hiển thị.
     Bỏ qua các nhà hàng trong blacklist_res.
 
     Args:
         driver: WebDriver instance.
-        output_file: Đường dẫn file CSV.
+        position_ref: Dict {'value': số div đầu feed đã đọc} khi gọi lặp lại trong lúc cuộn.
+            Chỉ các div sau vị trí này được đọc, và vị trí được dời tới thẻ nhà hàng cuối
+            cùng đã đọc (div loading ở cuối feed được đọc lại ở lần sau), nên mỗi thẻ chỉ
+            đọc một lần. None thì đọc cả danh sách.
+
+    Returns:
+        list: Các dict {Url, Restaurant_name}, None nếu không tìm thấy danh sách.
     """
     wait = WebDriverWait(driver, 10)
+    # Hai div đầu của feed không phải thẻ nhà hàng
+    start = 2 if position_ref is None else max(2, position_ref['value'])
+    blacklist = {black_name.lower() for black_name in blacklist_res}
     try:
         element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='feed']")))
-        divs = element.find_elements(By.XPATH, "./div[position() > 2 and not(@class='TFQHme')]")
+        divs = element.find_elements(By.XPATH, f"./div[position() > {start}]")
         restaurants = []
-        for div in divs:
+        last_card = start
+        # Vị trí tính trên mọi div nên không lọc div ngăn cách TFQHme bằng XPath nữa;
+        # div này không chứa a.hfpxzc nên vẫn bị bỏ qua như trước
+        for position, div in enumerate(divs, start + 1):
             a_tags = div.find_elements(By.CSS_SELECTOR, "a.hfpxzc")
             if a_tags:
+                last_card = position
                 url = a_tags[0].get_attribute("href")
                 name = a_tags[0].get_attribute("aria-label")
                 if url and "google.com/maps/place" in url and name:
                     # Chuẩn hóa tên nhà hàng để kiểm tra blacklist
                     normalized_name = name.strip().lower()
                     # Kiểm tra xem tên nhà hàng có trong blacklist không
-                    if normalized_name not in [black_name.lower() for black_name in blacklist_res]:
+                    if normalized_name not in blacklist:
                         restaurants.append({"Url": url, "Restaurant_name": name})
                     else:
                         logger.info(f"Bỏ qua nhà hàng trong blacklist: {name}")
+        if position_ref is not None:
+            position_ref['value'] = last_card
         logger.info(f"Tìm thấy {len(restaurants)} nhà hàng (sau khi lọc blacklist).")
     except TimeoutException as e:
         logger.error(f"Không thể tìm thấy danh sách nhà hàng: {e}")
+        return None
+    return restaurants
+
+def save_links(driver, output_file="restaurants.csv", db=None):
+    """Crawl danh sách link và tên nhà hàng rồi thêm các nhà hàng mới (write_links).
+
+    Args:
+        driver: WebDriver instance.
+        output_file: Đường dẫn file CSV.
+        db: CrawlDB; nếu có thì thêm nhà hàng mới vào cơ sở dữ liệu thay vì CSV.
+    """
+    restaurants = collect_links(driver)
+    if restaurants is not None:
+        write_links(restaurants, output_file, db)
+
+def write_links(restaurants, output_file="restaurants.csv", db=None):
+    """Thêm các nhà hàng mới vào CSV, chống trùng theo place ID trong Url (theo tên nếu
+    Url không có place ID) nên các chi nhánh cùng tên vẫn được giữ riêng. Tọa độ
+    được lấy luôn từ Url.
+
+    Args:
+        restaurants: Danh sách dict {Url, Restaurant_name}.
+        output_file: Đường dẫn file CSV.
+        db: CrawlDB; nếu có thì thêm nhà hàng mới vào cơ sở dữ liệu thay vì CSV.
+    """
+    if db is not None:
+        try:
+            count_new = db.add_restaurants(restaurants)
+            logger.info(f"Đã thêm {count_new} nhà hàng mới vào {db.db_file}")
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi cơ sở dữ liệu {db.db_file}: {e}")
         return
 
-    existing_names = set()
+    existing_keys = set()
     next_id = 1
     try:
         with open(output_file, mode="r", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row["Restaurant_name"]:
-                    existing_names.add(row["Restaurant_name"].strip().lower())
-                if row["Restaurant_id"]:
-                    try:
-                        current_id = int(row["Restaurant_id"])
-                        next_id = max(next_id, current_id + 1)
-                    except ValueError:
-                        logger.warning(f"Restaurant_id không hợp lệ: {row['Restaurant_id']}")
+            rows = list(csv.DictReader(f))
+        # Khóa của mọi nhà hàng đã có được tính một lượt trên cả cột Url
+        existing_keys.update(restaurant_keys([row["Url"] for row in rows],
+                                             [row["Restaurant_name"] for row in rows]).dropna())
+        for row in rows:
+            if row["Restaurant_id"]:
+                try:
+                    current_id = int(row["Restaurant_id"])
+                    next_id = max(next_id, current_id + 1)
+                except ValueError:
+                    logger.warning(f"Restaurant_id không hợp lệ: {row['Restaurant_id']}")
     except Exception as e:
         logger.error(f"Lỗi khi đọc file CSV {output_file}: {e}")
         return
@@ -217,22 +320,44 @@ def save_links(driver, output_file="restaurants.csv"):
             writer = csv.DictWriter(f, fieldnames=BASE_FIELDNAMES)
             count_new = 0
             for restaurant in restaurants:
-                name = restaurant["Restaurant_name"].strip().lower()
-                if name not in existing_names:
+                key = restaurant_key(restaurant["Url"], restaurant["Restaurant_name"])
+                if key not in existing_keys:
                     restaurant_id = str(next_id)
+                    _, latitude, longitude = parse_place_url(restaurant["Url"])
                     writer.writerow({
                         "Restaurant_id": restaurant_id,
                         "Url": restaurant["Url"],
-                        "Restaurant_name": restaurant["Restaurant_name"]
+                        "Restaurant_name": restaurant["Restaurant_name"],
+                        "Latitude": latitude if latitude is not None else "",
+                        "Longitude": longitude if longitude is not None else ""
                     })
                     count_new += 1
-                    existing_names.add(name)
+                    existing_keys.add(key)
                     next_id += 1
             logger.info(f"Đã thêm {count_new} nhà hàng mới vào {output_file}")
     except Exception as e:
         logger.error(f"Lỗi khi ghi file CSV {output_file}: {e}")
 
 
+# Tab 'About' và các nhóm feature trong tab đó
+ABOUT_TAB_XPATH = "//div[text()='About']"
+FEATURE_TITLE_XPATH = "//h2[@class='iL3Qke fontTitleSmall']"
+FEATURE_ITEMS_XPATH = "./following-sibling::ul//span[@aria-label]"
+# Đọc mọi nhóm feature trong một lần gọi (engine CDP), trả về các [title, items]
+EXTRACT_FEATURES_JS = """
+const titleXpath = arguments[0], itemsXpath = arguments[1];
+const snapshot = (xpath, context) => {
+    const snap = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < snap.snapshotLength; i++) nodes.push(snap.snapshotItem(i));
+    return nodes;
+};
+return snapshot(titleXpath, document).map(title => [
+    title.innerText.trim(),
+    snapshot(itemsXpath, title).map(item => item.getAttribute("aria-label")).filter(label => label)
+]);
+"""
+
 def extract_features(driver, wait):
     """Crawl feature types từ tab 'About'.
 
@@ -246,16 +371,16 @@ def extract_features(driver, wait):
     feature_dict = {}
     try:
         about_tabs = wait.until(
-            EC.presence_of_all_elements_located((By.XPATH, "//div[text()='About']"))
+            EC.presence_of_all_elements_located((By.XPATH, ABOUT_TAB_XPATH))
         )
         if about_tabs and safe_click(driver, about_tabs[0]):
-            wait.until(EC.presence_of_element_located((By.XPATH, "//h2[@class='iL3Qke fontTitleSmall']")))
-            title_elements = driver.find_elements(By.XPATH, "//h2[@class='iL3Qke fontTitleSmall']")
+            wait.until(EC.presence_of_element_located((By.XPATH, FEATURE_TITLE_XPATH)))
+            title_elements = driver.find_elements(By.XPATH, FEATURE_TITLE_XPATH)
             for title_elem in title_elements:
                 title = title_elem.text.title()
                 if title:
                     try:
-                        items = title_elem.find_elements(By.XPATH, "./following-sibling::ul//span[@aria-label]")
+                        items = title_elem.find_elements(By.XPATH, FEATURE_ITEMS_XPATH)
                         items_list = [item.get_attribute('aria-label') for item in items if item.get_attribute('aria-label')]
                         feature_dict[title] = items_list
                     except Exception as e:
@@ -267,16 +392,227 @@ def extract_features(driver, wait):
         logger.warning(f"Lỗi khi truy cập tab 'About': {e}")
     return feature_dict
 
-def scrape_restaurant(driver, wait):
-    """Thu thập thông tin cơ bản và feature types của một nhà hàng.
+# XPath của các trường trong panel tổng quan nhà hàng
+PRICE_XPATH = '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/span/span/span/span[2]/span/span'
+RATING_XPATH = '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/div[2]/span[1]/span[1]'
+TYPE_XPATHS = [
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[2]/span[1]/span/button',
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/h2/span'
+]
+ADDRESS_XPATHS = [
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[9]/div[3]/button/div/div[2]/div[1]',
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[11]/div[3]/button/div/div[2]/div[1]',
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[13]/div[3]/button/div/div[2]/div[1]',
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[7]/div[3]/button/div/div[2]/div[1]'
+]
+PLUS_CODE_XPATH = "//button[contains(@aria-label, 'Plus code') and @class='CsEnBe']"
+
+# Script thử tất cả selector trong một lần gọi, trả về selector đầu tiên có text.
+MATCH_SELECTORS_JS = """
+const selectors = arguments[0];
+for (let i = 0; i < selectors.length; i++) {
+    const [by, value] = selectors[i];
+    let nodes = [];
+    if (by === "xpath") {
+        const snap = document.evaluate(value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let j = 0; j < snap.snapshotLength; j++) nodes.push(snap.snapshotItem(j));
+    } else {
+        nodes = Array.from(document.querySelectorAll(value));
+    }
+    const texts = nodes.map(n => n.innerText.trim()).filter(t => t);
+    if (texts.length) return {index: i, texts: texts};
+}
+return null;
+"""
+
+class SelectorFallback:
+    """Danh sách selector dự phòng (XPath/CSS) cho một trường trên trang.
+
+    Tất cả selector được thử cùng lúc trong một WebDriverWait (mỗi lần poll là một
+    execute_script) nên trả về ngay khi bất kỳ layout nào khớp. Số lần khớp của từng
+    selector được thống kê trong suốt lần chạy và selector khớp nhiều nhất được ưu tiên.
+    """
+
+    def __init__(self, name, selectors):
+        """
+        Args:
+            name: Tên trường (dùng cho log).
+            selectors: Danh sách (By.XPATH | By.CSS_SELECTOR, giá trị) theo thứ tự ưu tiên ban đầu.
+        """
+        self.name = name
+        self.selectors = list(selectors)
+        self.hits = [0] * len(self.selectors)
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def ordered(self):
+        """Trả về danh sách chỉ số selector, selector khớp nhiều nhất đứng trước."""
+        with self.lock:
+            return sorted(range(len(self.selectors)), key=lambda i: -self.hits[i])
+
+    def record(self, index):
+        """Ghi nhận selector thứ index đã khớp (None nếu không selector nào khớp)."""
+        with self.lock:
+            if index is None:
+                self.misses += 1
+            else:
+                self.hits[index] += 1
+
+    def find_texts(self, driver, timeout=10):
+        """Chờ đến khi một selector bất kỳ có phần tử chứa text.
+
+        Args:
+            driver: WebDriver instance.
+            timeout: Thời gian chờ tối đa (giây) cho tất cả selector.
+
+        Returns:
+            list: Text của các phần tử khớp, rỗng nếu hết thời gian chờ.
+        """
+        order = self.ordered()
+        candidates = [list(self.selectors[i]) for i in order]
+        try:
+            match = WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script(MATCH_SELECTORS_JS, candidates)
+            )
+        except TimeoutException:
+            self.record(None)
+            return []
+        self.record(order[match["index"]])
+        return match["texts"]
+
+    def stats(self):
+        """Chuỗi thống kê số lần khớp của từng selector."""
+        with self.lock:
+            parts = [f"#{i + 1}={hits}" for i, hits in enumerate(self.hits)]
+            return f"{self.name}: " + ", ".join(parts) + f", không khớp={self.misses}"
+
+TYPE_SELECTORS = SelectorFallback("Restaurant_type", [(By.XPATH, xpath) for xpath in TYPE_XPATHS])
+ADDRESS_SELECTORS = SelectorFallback("Address", [(By.XPATH, xpath) for xpath in ADDRESS_XPATHS])
+
+# Script đọc toàn bộ panel tổng quan trong một lần execute_script.
+# Trường không tồn tại trả về chuỗi rỗng thay vì chờ timeout.
+EXTRACT_OVERVIEW_JS = """
+const priceXpath = arguments[0], ratingXpath = arguments[1];
+const typeXpaths = arguments[2], addressXpaths = arguments[3], plusCodeXpath = arguments[4];
+const all = (xpath) => {
+    const snap = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < snap.snapshotLength; i++) nodes.push(snap.snapshotItem(i));
+    return nodes;
+};
+const first = (xpath) => all(xpath)[0] || null;
+const textOf = (el) => el ? el.innerText.trim() : "";
+
+let type = "", typeIndex = -1;
+for (let i = 0; i < typeXpaths.length; i++) {
+    const texts = all(typeXpaths[i]).map(textOf).filter(t => t);
+    if (texts.length) { type = texts.join(", "); typeIndex = i; break; }
+}
+let address = "", addressIndex = -1;
+for (let i = 0; i < addressXpaths.length; i++) {
+    const text = textOf(first(addressXpaths[i]));
+    if (text) { address = text; addressIndex = i; break; }
+}
+const reviews = document.querySelector("div.F7nice span[aria-label*='reviews']");
+const phone = document.querySelector('button[data-item-id^="phone:tel"]');
+const plusCode = first(plusCodeXpath);
+return {
+    price: textOf(first(priceXpath)),
+    rating: textOf(first(ratingXpath)),
+    reviews_label: reviews ? (reviews.getAttribute("aria-label") || "") : "",
+    phone: phone ? (phone.getAttribute("data-item-id") || "") : "",
+    type: type,
+    type_index: typeIndex,
+    address: address,
+    address_index: addressIndex,
+    plus_code_label: plusCode ? (plusCode.getAttribute("aria-label") || "") : ""
+};
+"""
+
+def decode_plus_code(aria_label):
+    """Giải mã Plus Code (dạng rút gọn) thành tọa độ quanh Đà Nẵng.
 
     Args:
-        driver: WebDriver instance.
-        wait: WebDriverWait instance.
+        aria_label: aria-label của nút Plus code.
 
     Returns:
-        dict: Thông tin cơ bản và list feature types.
+        tuple: (latitude, longitude) hoặc None nếu không hợp lệ.
     """
+    if not aria_label:
+        return None
+    plus_code = aria_label.replace("Plus code: ", "").strip()
+    code = plus_code.split()[0]
+    if olc.isValid(code):
+        reference_latitude, reference_longitude = 16.067, 108.220
+        full_code = olc.recoverNearest(code, reference_latitude, reference_longitude)
+        decoded = olc.decode(full_code)
+        return decoded.latitudeCenter, decoded.longitudeCenter
+    return None
+
+def overview_arguments():
+    """Tham số cho EXTRACT_OVERVIEW_JS, XPath loại nhà hàng/địa chỉ theo thứ tự khớp nhiều nhất.
+
+    Returns:
+        tuple: (type_order, address_order, arguments) để truyền cho apply_overview.
+    """
+    type_order = TYPE_SELECTORS.ordered()
+    address_order = ADDRESS_SELECTORS.ordered()
+    arguments = [PRICE_XPATH, RATING_XPATH, [TYPE_XPATHS[i] for i in type_order],
+                 [ADDRESS_XPATHS[i] for i in address_order], PLUS_CODE_XPATH]
+    return type_order, address_order, arguments
+
+def apply_overview(data, panel, type_order, address_order):
+    """Điền kết quả của EXTRACT_OVERVIEW_JS vào data và ghi nhận selector đã khớp."""
+    type_index = panel.get("type_index", -1)
+    TYPE_SELECTORS.record(type_order[type_index] if type_index >= 0 else None)
+    address_index = panel.get("address_index", -1)
+    ADDRESS_SELECTORS.record(address_order[address_index] if address_index >= 0 else None)
+
+    data["Price_level"] = panel.get("price", "")
+    data["Rating_average"] = panel.get("rating", "")
+    if not data["Rating_average"]:
+        logger.warning("Lỗi khi lấy rating")
+
+    try:
+        reviews_text = panel.get("reviews_label", "").split()[0].replace(",", "")
+        data["Num_of_reviews"] = int(reviews_text)
+    except (IndexError, ValueError):
+        logger.warning("Lỗi khi lấy số lượt đánh giá")
+
+    data["Phone"] = panel.get("phone", "").replace("phone:tel:", "")
+    data["Restaurant_type"] = panel.get("type", "")
+    if not data["Restaurant_type"]:
+        logger.warning("Lỗi khi lấy loại nhà hàng")
+    data["Address"] = panel.get("address", "")
+    if not data["Address"]:
+        logger.warning("Lỗi khi lấy địa chỉ")
+
+    if data["Latitude"] == "":
+        try:
+            coords = decode_plus_code(panel.get("plus_code_label", ""))
+            if coords:
+                data["Latitude"], data["Longitude"] = coords
+        except ValueError:
+            logger.warning("Lỗi khi lấy tọa độ từ Plus Code")
+
+def extract_overview(driver, data):
+    """Đọc panel tổng quan nhà hàng bằng một script duy nhất và điền vào data.
+
+    Args:
+        driver: WebDriver instance.
+        data: Dict kết quả của scrape_restaurant.
+    """
+    # Thử XPath theo thứ tự khớp nhiều nhất trong lần chạy
+    type_order, address_order, arguments = overview_arguments()
+    try:
+        panel = driver.execute_script(EXTRACT_OVERVIEW_JS, *arguments) or {}
+    except WebDriverException as e:
+        logger.warning(f"Lỗi khi đọc panel tổng quan: {e}")
+        return
+    apply_overview(data, panel, type_order, address_order)
+
+def empty_restaurant_data(coords=None):
+    """Dict kết quả rỗng của scrape_restaurant, có sẵn tọa độ nếu đã biết từ Url."""
     data = {
         "Restaurant_type": "",
         "Rating_average": "",
@@ -289,21 +625,39 @@ def scrape_restaurant(driver, wait):
         "Crawl_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "feature_type": {}
     }
+    if coords:
+        data["Latitude"], data["Longitude"] = coords
+    return data
+
+def scrape_restaurant(driver, wait, single_script=False, coords=None):
+    """Thu thập thông tin cơ bản và feature types của một nhà hàng.
+
+    Args:
+        driver: WebDriver instance.
+        wait: WebDriverWait instance.
+        single_script: Đọc panel tổng quan bằng một lần execute_script (extract_overview)
+            thay vì từng find_element/WebDriverWait riêng lẻ.
+        coords: (latitude, longitude) đã đọc từ Url; nếu có thì không cần đọc Plus Code.
+
+    Returns:
+        dict: Thông tin cơ bản và list feature types.
+    """
+    data = empty_restaurant_data(coords)
+
+    if single_script:
+        extract_overview(driver, data)
+        data["feature_type"] = extract_features(driver, wait)
+        return data
 
     # Lấy thông tin
     try:
-        data["Price_level"] = driver.find_element(
-            By.XPATH,
-            '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/span/span/span/span[2]/span/span'
-        ).text
+        data["Price_level"] = driver.find_element(By.XPATH, PRICE_XPATH).text
     except (NoSuchElementException, TimeoutException):
         logger.warning("Lỗi khi lấy mức giá")
 
     try:
         data["Rating_average"] = wait.until(
-            EC.presence_of_element_located((By.XPATH,
-                '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/div[2]/span[1]/span[1]'
-            ))
+            EC.presence_of_element_located((By.XPATH, RATING_XPATH))
         ).text
     except (TimeoutException, NoSuchElementException):
         logger.warning("Lỗi khi lấy rating")
@@ -321,193 +675,1230 @@ def scrape_restaurant(driver, wait):
     except (NoSuchElementException, TimeoutException):
         logger.warning("Lỗi khi lấy số điện thoại")
         
-    type_xpaths = [
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[2]/span[1]/span/button',
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/h2/span'
-    ]
-    for xpath in type_xpaths:
-        try:
-            type_elems = wait.until(EC.presence_of_all_elements_located((By.XPATH, xpath)))
-            if type_elems and any(elem.text.strip() for elem in type_elems):
-                data["Restaurant_type"] = ', '.join([elem.text.strip() for elem in type_elems if elem.text.strip()])
-                break
-        except (TimeoutException, NoSuchElementException):
-            continue
+    type_texts = TYPE_SELECTORS.find_texts(driver)
+    data["Restaurant_type"] = ', '.join(type_texts)
     if not data["Restaurant_type"]:
         logger.warning("Lỗi khi lấy loại nhà hàng")
 
-    address_xpaths = [
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[9]/div[3]/button/div/div[2]/div[1]',
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[11]/div[3]/button/div/div[2]/div[1]',
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[13]/div[3]/button/div/div[2]/div[1]',
-        '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[7]/div[3]/button/div/div[2]/div[1]'
-    ]
-    for xpath in address_xpaths:
-        try:
-            addr_elem = wait.until(EC.presence_of_element_located((By.XPATH, xpath)))
-            if addr_elem.text.strip():
-                data["Address"] = addr_elem.text.strip()
-                break
-        except (TimeoutException, NoSuchElementException):
-            continue
+    address_texts = ADDRESS_SELECTORS.find_texts(driver)
+    data["Address"] = address_texts[0] if address_texts else ""
     if not data["Address"]:
         logger.warning("Lỗi khi lấy địa chỉ")   
     
-    try:
-        plus_code_elem = driver.find_element(
-            By.XPATH, "//button[contains(@aria-label, 'Plus code') and @class='CsEnBe']"
-        )
-        aria_label = plus_code_elem.get_attribute("aria-label")
-        if aria_label:
-            plus_code = aria_label.replace("Plus code: ", "").strip()
-            code = plus_code.split()[0]
-            if olc.isValid(code):
-                reference_latitude, reference_longitude = 16.067, 108.220
-                full_code = olc.recoverNearest(code, reference_latitude, reference_longitude)
-                decoded = olc.decode(full_code)
-                data["Latitude"], data["Longitude"] = decoded.latitudeCenter, decoded.longitudeCenter
-    except (NoSuchElementException, ValueError):
-        logger.warning("Lỗi khi lấy tọa độ từ Plus Code")
+    if not coords:
+        try:
+            plus_code_elem = driver.find_element(By.XPATH, PLUS_CODE_XPATH)
+            coords = decode_plus_code(plus_code_elem.get_attribute("aria-label"))
+            if coords:
+                data["Latitude"], data["Longitude"] = coords
+        except (NoSuchElementException, ValueError):
+            logger.warning("Lỗi khi lấy tọa độ từ Plus Code")
 
     # Lấy feature types
     data["feature_type"] = extract_features(driver, wait)
 
     return data
 
-def update_details_and_save(driver, output_file="restaurants.csv", batch_size=10):
-    """Cập nhật thông tin cơ bản và feature types cho từng nhà hàng.
-    Sau đó lưu toàn bộ vào CSV với cột chứa JSON items cho từng cho feature types.
+def open_restaurant_db(db_file, output_file):
+    """Mở cơ sở dữ liệu SQLite; lần đầu (bảng restaurants trống) nạp sẵn dữ liệu từ CSV.
+
+    Args:
+        db_file: Đường dẫn file SQLite.
+        output_file: Đường dẫn file CSV nhà hàng hiện có.
+
+    Returns:
+        CrawlDB.
+    """
+    db = CrawlDB(db_file)
+    if db.count_restaurants() == 0 and os.path.isfile(output_file):
+        db.import_restaurants_csv(output_file)
+    return db
+
+def read_restaurant_rows(output_file):
+    """Đọc tất cả rows và danh sách cột feature từ file CSV nhà hàng.
 
     Args:
-        driver: WebDriver instance.
         output_file: Đường dẫn file CSV.
-        batch_size: Số lượng mỗi batch log tiến độ.
 
     Returns:
-        int: Số lượng nhà hàng được cập nhật.
+        tuple: (rows, feature_cols) hoặc (None, []) nếu đọc thất bại.
     """
-    wait = WebDriverWait(driver, 10)
-    
-    # Đọc tất cả rows từ CSV
-    rows = []
-    feature_cols = []
     try:
         with open(output_file, mode="r", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
             feature_cols = [col for col in reader.fieldnames if col not in BASE_FIELDNAMES]
             rows = list(reader)
+        return rows, feature_cols
     except Exception as e:
+        logger.error(f"Lỗi khi đọc file CSV {output_file}: {e}")
+        return None, []
+
+def fill_url_coordinates(records):
+    """Điền Latitude/Longitude từ !3d/!4d trong Url vào các record đã gộp, không cần mở trang.
+
+    Tọa độ trong Url là tọa độ của địa điểm nên được ưu tiên hơn tọa độ giải mã từ
+    Plus Code. Record vừa scrape đã có tọa độ này (merge_restaurant_data so sánh với
+    dòng cũ), nên hàm chỉ thực sự sửa các record không được scrape lại (không được lập
+    lịch, scrape thất bại). Tọa độ đổi được tính là thay đổi và cập nhật Crawl_date như
+    merge_restaurant_data; record có Url không chứa tọa độ giữ nguyên giá trị cũ.
+
+    Args:
+        records: Danh sách record (current_data) sẽ được lưu (sửa tại chỗ).
+
+    Returns:
+        int: Số record có tọa độ thay đổi.
+    """
+    parsed = parse_place_urls([record.get("Url", "") for record in records])
+    found = parsed["Latitude"].notna() & parsed["Longitude"].notna()
+    changed = 0
+    for i, latitude, longitude in zip(parsed.index[found], parsed["Latitude"][found], parsed["Longitude"][found]):
+        record = records[i]
+        coords = (str(latitude), str(longitude))
+        if (str(record.get("Latitude", "")), str(record.get("Longitude", ""))) != coords:
+            record["Latitude"], record["Longitude"] = coords
+            record["Crawl_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            changed += 1
+    if changed:
+        logger.info(f"Cập nhật tọa độ từ Url cho {changed} nhà hàng không được scrape lại.")
+    return changed
+
+def merge_restaurant_data(row, data, feature_cols, row_index):
+    """Gộp dữ liệu vừa scrape với dòng cũ trong CSV.
+
+    Giữ giá trị cũ nếu giá trị mới rỗng, gộp feature types và chỉ cập nhật
+    Crawl_date khi có thay đổi.
+
+    Args:
+        row: Dòng cũ đọc từ CSV.
+        data: Kết quả của scrape_restaurant.
+        feature_cols: Danh sách cột feature trong CSV.
+        row_index: Vị trí dòng (dùng cho log).
+
+    Returns:
+        tuple: (current_data, has_change).
+    """
+    url = row.get("Url", "")
+
+    # Reconstruct feature_type_old from row
+    feature_type_old = {}
+    for col in feature_cols:
+        val = row.get(col, "")
+        if val:
+            try:
+                feature_type_old[col] = json.loads(val)
+            except json.JSONDecodeError:
+                logger.warning(f"Lỗi parse JSON cho cột {col} ở row {row_index+1}")
+                feature_type_old[col] = []
+        else:
+            feature_type_old[col] = []
+
+    has_change = False
+    current_data = {
+        "Restaurant_id": row.get("Restaurant_id", ""),
+        "Url": url,
+        "Restaurant_name": row.get("Restaurant_name", "Unknown")
+    }
+    for k in data.keys():
+        if k == "Crawl_date" or k == "feature_type":
+            continue
+        new_val = str(data.get(k, ""))
+        old_val = str(row.get(k, ""))
+        if new_val.strip() == "" and old_val.strip() != "":
+            data[k] = old_val
+        elif new_val != old_val:
+            has_change = True
+    current_data.update({k: data.get(k, row.get(k, "")) for k in data.keys() if k != "feature_type" and k != "Crawl_date"})
+
+    # Xử lý feature_type
+    feature_new = data["feature_type"]
+    if feature_new:  # Không rỗng
+        feature_merged = {**feature_type_old, **feature_new}
+        if feature_merged != feature_type_old:
+            has_change = True
+    else:
+        feature_merged = feature_type_old
+        if feature_type_old:
+            logger.info(f"Giữ nguyên features cũ cho nhà hàng: {row.get('Restaurant_name', url)} vì scrape thất bại.")
+
+    current_data["feature_type"] = feature_merged
+
+    # Cập nhật Crawl_date nếu có thay đổi, giữ nguyên cũ nếu không
+    if has_change:
+        current_data["Crawl_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(f"Cập nhật thay đổi cho nhà hàng: {row.get('Restaurant_name', url)}")
+    else:
+        current_data["Crawl_date"] = row.get("Crawl_date", "")
+        logger.info(f"Không có thay đổi cho nhà hàng: {row.get('Restaurant_name', url)}")
+
+    return current_data, has_change
+
+def scrape_row(driver, wait, row, feature_cols, row_index, single_script=False):
+    """Mở trang của một nhà hàng, scrape và gộp với dòng cũ.
+
+    Args:
+        driver: WebDriver instance.
+        wait: WebDriverWait instance.
+        row: Dòng cũ đọc từ CSV.
+        feature_cols: Danh sách cột feature trong CSV.
+        row_index: Vị trí dòng (dùng cho log).
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+
+    Returns:
+        tuple: (current_data, has_change) hoặc None nếu scrape thất bại.
+    """
+    url = row.get("Url", "")
+    try:
+        driver.get(url)
+    except TimeoutException as e:
+        logger.error(f"Lỗi scrape {url}: {e}")
+        return None
+    return scrape_loaded_row(driver, wait, row, feature_cols, row_index, single_script)
+
+def scrape_loaded_row(driver, wait, row, feature_cols, row_index, single_script=False):
+    """Scrape trang nhà hàng đang mở trong tab hiện tại và gộp với dòng cũ (xem scrape_row)."""
+    url = row.get("Url", "")
+    # Tọa độ có sẵn trong Url thì không cần đọc Plus Code trên trang
+    _, latitude, longitude = parse_place_url(url)
+    coords = (latitude, longitude) if latitude is not None and longitude is not None else None
+    try:
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.DUwDvf")))
+        data = scrape_restaurant(driver, wait, single_script, coords)
+        if data:
+            return merge_restaurant_data(row, data, feature_cols, row_index)
+    except (TimeoutException, NoSuchElementException) as e:
+        logger.error(f"Lỗi scrape {url}: {e}")
+    return None
+
+def scrape_rows(driver, wait, indexed_rows, feature_cols, total, single_script=False, num_tabs=1, label=""):
+    """Scrape lần lượt các dòng, tuần tự hoặc trên num_tabs tab của cùng một trình duyệt.
+
+    Với num_tabs > 1, các trang được tải song song trong các tab (TabPool) và được
+    trích xuất theo thứ tự tab nào sẵn sàng trước, nên thứ tự kết quả có thể khác
+    thứ tự dòng.
+
+    Args:
+        driver: WebDriver instance.
+        wait: WebDriverWait instance.
+        indexed_rows: Danh sách (row_index, row).
+        feature_cols: Danh sách cột feature trong CSV.
+        total: Tổng số nhà hàng (dùng cho log).
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        num_tabs: Số tab tải song song.
+        label: Tiền tố log (ví dụ "[Worker 1] ").
+
+    Yields:
+        tuple: (row_index, row, result, duration) với result như scrape_row và duration là
+        số giây từ lúc bắt đầu tải trang đến khi trích xuất xong.
+    """
+    if num_tabs <= 1:
+        for i, row in indexed_rows:
+            logger.info(f"{label}Scraping {i+1}/{total}: {row.get('Restaurant_name', 'Unknown')}")
+            start = time.monotonic()
+            result = scrape_row(driver, wait, row, feature_cols, i, single_script)
+            yield i, row, result, time.monotonic() - start
+        return
+
+    pool = TabPool(driver, num_tabs, "h1.DUwDvf")
+    try:
+        for (i, row), ready, elapsed in run_in_tabs(pool, indexed_rows, lambda item: item[1].get("Url", "")):
+            logger.info(f"{label}Scraping {i+1}/{total}: {row.get('Restaurant_name', 'Unknown')} "
+                        f"(tải {elapsed:.1f} giây)")
+            start = time.monotonic()
+            if ready:
+                result = scrape_loaded_row(driver, wait, row, feature_cols, i, single_script)
+            else:
+                logger.error(f"Lỗi scrape {row.get('Url', '')}: quá thời gian tải trang")
+                result = None
+            yield i, row, result, elapsed + time.monotonic() - start
+    finally:
+        pool.close()
+
+def save_restaurant_records(data_list, output_file):
+    """Lưu toàn bộ nhà hàng vào CSV với cột chứa JSON items cho từng feature type.
+
+    Args:
+        data_list: Danh sách record trả về từ merge_restaurant_data.
+        output_file: Đường dẫn file CSV.
+    """
+    unique_features = set()
+    for data in data_list:
+        if isinstance(data["feature_type"], dict):
+            unique_features.update(data["feature_type"].keys())
+    unique_features = sorted(unique_features)
+
+    output_data = {field: [] for field in BASE_FIELDNAMES}
+    for data in data_list:
+        for field in BASE_FIELDNAMES:
+            output_data[field].append(data.get(field, ""))
+
+    for feature in unique_features:
+        output_data[feature] = [
+            json.dumps(data["feature_type"].get(feature, []), ensure_ascii=False) 
+            if isinstance(data["feature_type"], dict) else "[]"
+            for data in data_list
+        ]
+
+    # Ghi ra file tạm rồi đổi tên để file CSV cũ không bị hỏng nếu tiến trình dừng giữa chừng
+    output_df = pd.DataFrame(output_data)
+    tmp_file = output_file + ".tmp"
+    output_df.to_csv(tmp_file, index=False, encoding="utf-8-sig", quoting=csv.QUOTE_NONNUMERIC)
+    os.replace(tmp_file, output_file)
+
+def journal_path(output_file):
+    """Đường dẫn file journal (checkpoint) của lần cập nhật chi tiết."""
+    return output_file + ".journal"
+
+def load_journal(journal_file):
+    """Đọc các nhà hàng đã scrape xong trong lần chạy bị gián đoạn trước đó.
+
+    Args:
+        journal_file: Đường dẫn file journal (JSON Lines).
+
+    Returns:
+        dict: Url -> (current_data, has_change).
+    """
+    done = {}
+    if not os.path.isfile(journal_file):
+        return done
+    with open(journal_file, mode="r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            try:
+                entry = json.loads(line)
+                done[entry["Url"]] = (entry["record"], entry["has_change"])
+            except (json.JSONDecodeError, KeyError):
+                # Dòng cuối có thể bị ghi dở khi tiến trình bị dừng
+                logger.warning(f"Bỏ qua dòng journal hỏng {line_no} trong {journal_file}")
+    logger.info(f"Tiếp tục từ journal {journal_file}: {len(done)} nhà hàng đã xong.")
+    return done
+
+def iter_journal(journal_file, stream=None):
+    """Đọc lần lượt các entry trong journal mà không nạp cả file vào bộ nhớ.
+
+    Args:
+        journal_file: Đường dẫn file journal.
+        stream: Nếu có, chỉ trả về entry của stream này.
+
+    Yields:
+        dict: Entry journal (Url, row_index, stream, has_change, record).
+    """
+    if not os.path.isfile(journal_file):
+        return
+    with open(journal_file, mode="r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if stream is None or entry.get("stream") == stream:
+                yield entry
+
+def append_journal(journal_file, current_data, has_change, row_index=None, stream=None):
+    """Ghi ngay một nhà hàng vừa scrape xong vào journal (flush + fsync).
+
+    Args:
+        journal_file: Đường dẫn file journal.
+        current_data: Record trả về từ merge_restaurant_data.
+        has_change: True nếu nhà hàng có thay đổi.
+        row_index: Vị trí dòng trong CSV (dùng cho stream_merge).
+        stream: Mã luồng ghi (serial, worker-N). Thứ tự row_index trong journal không
+            được đảm bảo (scheduler ghi theo độ ưu tiên, nhiều tab ghi theo tab xong trước).
+    """
+    line = json.dumps({"Url": current_data["Url"], "row_index": row_index, "stream": stream,
+                       "has_change": has_change, "record": current_data}, ensure_ascii=False)
+    with journal_lock:
+        with open(journal_file, mode="a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def index_journal(journal_file):
+    """Chỉ mục của journal để gộp theo thứ tự dòng mà không nạp các record vào bộ nhớ.
+
+    Entry có thể được ghi theo thứ tự bất kỳ, nên chỉ lưu vị trí (byte offset) của
+    entry cuối cùng cho mỗi row_index, giống load_journal (entry sau ghi đè entry trước).
+
+    Returns:
+        tuple: (offsets, features, updated) với offsets là dict row_index -> offset,
+        features là tập cột feature trong các record và updated là số nhà hàng thay đổi.
+    """
+    offsets = {}
+    changed = {}
+    features = set()
+    with open(journal_file, mode="rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                entry = json.loads(line)
+                row_index = entry["row_index"]
+                feature_type = entry["record"].get("feature_type")
+            except (json.JSONDecodeError, UnicodeDecodeError, KeyError, AttributeError):
+                # Dòng cuối có thể bị ghi dở khi tiến trình bị dừng
+                continue
+            if row_index is None:
+                continue
+            offsets[row_index] = offset
+            changed[row_index] = bool(entry.get("has_change"))
+            if isinstance(feature_type, dict):
+                features.update(feature_type.keys())
+    return offsets, features, sum(changed.values())
+
+def stream_merge(output_file, journal_file):
+    """Gộp journal vào CSV theo kiểu streaming, bộ nhớ không phụ thuộc kích thước record.
+
+    Lượt đầu (index_journal) chỉ ghi nhớ vị trí entry của từng dòng và tập cột feature.
+    Lượt sau đọc từng dòng CSV cũ, đọc entry của dòng đó từ journal theo vị trí đã
+    lưu và ghi ra file tạm, sau đó đổi tên. Dòng không có kết quả scrape mới được
+    giữ nguyên dữ liệu cũ.
+
+    Args:
+        output_file: Đường dẫn file CSV.
+        journal_file: Đường dẫn file journal.
+
+    Returns:
+        int: Số lượng nhà hàng có thay đổi.
+    """
+    offsets, new_features, updated = index_journal(journal_file) if os.path.isfile(journal_file) else ({}, set(), 0)
+
+    tmp_file = output_file + ".tmp"
+    journal = open(journal_file, mode="rb") if offsets else None
+    try:
+        with open(output_file, mode="r", encoding="utf-8-sig") as src, \
+                open(tmp_file, mode="w", newline="", encoding="utf-8-sig") as dst:
+            reader = csv.DictReader(src)
+            old_features = [col for col in reader.fieldnames if col not in BASE_FIELDNAMES]
+            features = sorted(set(old_features) | new_features)
+            writer = csv.writer(dst, quoting=csv.QUOTE_NONNUMERIC, lineterminator=os.linesep)
+            writer.writerow(BASE_FIELDNAMES + features)
+
+            for i, row in enumerate(reader):
+                entry = None
+                if i in offsets:
+                    journal.seek(offsets[i])
+                    entry = json.loads(journal.readline())
+                if entry is not None and entry["Url"] == row.get("Url", ""):
+                    record = entry["record"]
+                    feature_type = record["feature_type"] if isinstance(record["feature_type"], dict) else {}
+                    writer.writerow(
+                        [record.get(field, "") for field in BASE_FIELDNAMES] +
+                        [json.dumps(feature_type.get(feature, []), ensure_ascii=False) for feature in features]
+                    )
+                else:
+                    writer.writerow(
+                        [row.get(field, "") for field in BASE_FIELDNAMES] +
+                        [row.get(feature) or "[]" for feature in features]
+                    )
+    finally:
+        if journal is not None:
+            journal.close()
+    os.replace(tmp_file, output_file)
+    return updated
+
+def update_details_streaming(driver, output_file="restaurants.csv", batch_size=10, single_script=False):
+    """Cập nhật chi tiết nhà hàng với bộ nhớ cố định (streaming).
+
+    Đọc CSV từng dòng, ghi mỗi nhà hàng scrape xong vào journal thay vì giữ trong
+    bộ nhớ, rồi gộp bằng stream_merge. Journal cũng đóng vai trò checkpoint: chạy
+    lại sau khi bị dừng sẽ bỏ qua các nhà hàng đã có trong journal.
+
+    Args:
+        driver: WebDriver instance.
+        output_file: Đường dẫn file CSV.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+
+    Returns:
+        int: Số lượng nhà hàng được cập nhật.
+    """
+    wait = WebDriverWait(driver, 10)
+    journal_file = journal_path(output_file)
+    done_urls = {entry["Url"] for entry in iter_journal(journal_file)}
+    if done_urls:
+        logger.info(f"Tiếp tục từ journal {journal_file}: {len(done_urls)} nhà hàng đã xong.")
+    stream = datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+    try:
+        src = open(output_file, mode="r", encoding="utf-8-sig")
+    except OSError as e:
         logger.error(f"Lỗi khi đọc file CSV {output_file}: {e}")
         return 0
 
+    with src:
+        reader = csv.DictReader(src)
+        feature_cols = [col for col in reader.fieldnames if col not in BASE_FIELDNAMES]
+        for i, row in enumerate(reader):
+            url = row.get("Url", "")
+            if not url:
+                logger.warning(f"Bỏ qua dòng {i+1}: Không có URL")
+                continue
+            if url in done_urls:
+                logger.info(f"Bỏ qua {i+1}: {row.get('Restaurant_name', 'Unknown')} (đã xong trong journal)")
+                continue
+            logger.info(f"Scraping {i+1}: {row.get('Restaurant_name', 'Unknown')}")
+            result = scrape_row(driver, wait, row, feature_cols, i, single_script)
+            if result:
+                current_data, has_change = result
+                append_journal(journal_file, current_data, has_change, i, stream)
+
+            if (i + 1) % batch_size == 0:
+                logger.info(f"Đã xử lý {i+1} nhà hàng...")
+
+    updated = stream_merge(output_file, journal_file)
+    if os.path.isfile(journal_file):
+        os.remove(journal_file)
+    logger.info(f"Hoàn thành! Đã cập nhật {updated} nhà hàng và lưu vào {output_file}.")
+    return updated
+
+def unchanged_record(row, feature_cols, row_index):
+    """Record giữ nguyên dòng cũ cho nhà hàng không được crawl (không được lập lịch hoặc scrape thất bại).
+
+    Args:
+        row: Dòng cũ đọc từ CSV.
+        feature_cols: Danh sách cột feature trong CSV.
+        row_index: Vị trí dòng (dùng cho log).
+
+    Returns:
+        dict: Record cùng dạng với merge_restaurant_data.
+    """
+    current_data = {field: row.get(field, "") for field in BASE_FIELDNAMES}
+    feature_type = {}
+    for col in feature_cols:
+        val = row.get(col, "")
+        try:
+            feature_type[col] = json.loads(val) if val else []
+        except json.JSONDecodeError:
+            logger.warning(f"Lỗi parse JSON cho cột {col} ở row {row_index+1}")
+            feature_type[col] = []
+    current_data["feature_type"] = feature_type
+    return current_data
+
+def schedule_path(output_file):
+    """Đường dẫn file trạng thái lịch crawl (RecrawlScheduler) của file CSV."""
+    return os.path.splitext(output_file)[0] + "_schedule.json"
+
+def update_details_and_save(driver, output_file="restaurants.csv", batch_size=10, single_script=False, journal=False, db=None, scheduler=None, num_tabs=1):
+    """Cập nhật thông tin cơ bản và feature types cho từng nhà hàng.
+    Sau đó lưu toàn bộ vào CSV với cột chứa JSON items cho từng cho feature types.
+
+    Args:
+        driver: WebDriver instance.
+        output_file: Đường dẫn file CSV.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        journal: Ghi từng nhà hàng vào journal ngay khi xong; khi chạy lại sẽ bỏ qua
+            các nhà hàng đã có trong journal, rồi gộp vào CSV khi hoàn tất.
+        db: CrawlDB; nếu có thì đọc nhà hàng từ cơ sở dữ liệu và ghi kết quả vào đó
+            (CSV vẫn được xuất để tương thích).
+        scheduler: RecrawlScheduler; nếu có thì chỉ crawl các nhà hàng được lập lịch
+            trong budget, theo thứ tự ưu tiên. Các dòng còn lại được giữ nguyên.
+        num_tabs: Số tab tải trang song song trong trình duyệt (scrape_rows).
+
+    Returns:
+        int: Số lượng nhà hàng được cập nhật.
+    """
+    wait = WebDriverWait(driver, 10)
+    
+    # Đọc tất cả rows từ CSV hoặc cơ sở dữ liệu
+    rows, feature_cols = db.read_restaurant_rows() if db is not None else read_restaurant_rows(output_file)
+    if rows is None:
+        return 0
+
+    journal_file = journal_path(output_file) if journal else None
+    done = load_journal(journal_file) if journal else {}
+
     updated = 0
     total = len(rows)
-    data_list = []
+    records = {}
 
-    for i, row in enumerate(rows):
+    indexed_rows = list(enumerate(rows))
+    if scheduler is not None:
+        indexed_rows = scheduler.plan(indexed_rows)
+        planned = {i for i, _ in indexed_rows}
+        for i, row in enumerate(rows):
+            if i not in planned and row.get("Url", ""):
+                records[i] = unchanged_record(row, feature_cols, i)
+
+    to_scrape = []
+    for i, row in indexed_rows:
         url = row.get("Url", "")
         if not url:
             logger.warning(f"Bỏ qua dòng {i+1}: Không có URL")
             continue
-        logger.info(f"Scraping {i+1}/{total}: {row.get('Restaurant_name', 'Unknown')}")
-        try:
-            driver.get(url)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.DUwDvf")))
-            
-            # Reconstruct feature_type_old from row
-            feature_type_old = {}
-            for col in feature_cols:
-                val = row.get(col, "")
-                if val:
-                    try:
-                        feature_type_old[col] = json.loads(val)
-                    except json.JSONDecodeError:
-                        logger.warning(f"Lỗi parse JSON cho cột {col} ở row {i+1}")
-                        feature_type_old[col] = []
-                else:
-                    feature_type_old[col] = []
-            
-            data = scrape_restaurant(driver, wait)
-            if data:
-                has_change = False
-                current_data = {
-                    "Restaurant_id": row.get("Restaurant_id", ""),
-                    "Url": url,
-                    "Restaurant_name": row.get("Restaurant_name", "Unknown")
-                }
-                for k in data.keys():
-                    if k == "Crawl_date" or k == "feature_type":
-                        continue
-                    new_val = str(data.get(k, ""))
-                    old_val = str(row.get(k, ""))
-                    if new_val.strip() == "" and old_val.strip() != "":
-                        data[k] = old_val
-                    elif new_val != old_val:
-                        has_change = True
-                current_data.update({k: data.get(k, row.get(k, "")) for k in data.keys() if k != "feature_type" and k != "Crawl_date"})
-                
-                # Xử lý feature_type
-                feature_new = data["feature_type"]
-                if feature_new:  # Không rỗng
-                    feature_merged = {**feature_type_old, **feature_new}
-                    if feature_merged != feature_type_old:
-                        has_change = True
-                else:
-                    feature_merged = feature_type_old
-                    if feature_type_old:
-                        logger.info(f"Giữ nguyên features cũ cho nhà hàng: {row.get('Restaurant_name', url)} vì scrape thất bại.")
-                
-                current_data["feature_type"] = feature_merged
-                
-                # Cập nhật Crawl_date nếu có thay đổi, giữ nguyên cũ nếu không
-                if has_change:
-                    current_data["Crawl_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    updated += 1
-                    logger.info(f"Cập nhật thay đổi cho nhà hàng: {row.get('Restaurant_name', url)}")
-                else:
-                    current_data["Crawl_date"] = row.get("Crawl_date", "")
-                    logger.info(f"Không có thay đổi cho nhà hàng: {row.get('Restaurant_name', url)}")
-
-                data_list.append(current_data)
-        except (TimeoutException, NoSuchElementException) as e:
-            logger.error(f"Lỗi scrape {url}: {e}")
+        if url in done:
+            current_data, has_change = done[url]
+            logger.info(f"Bỏ qua {i+1}/{total}: {row.get('Restaurant_name', 'Unknown')} (đã xong trong journal)")
+            if has_change:
+                updated += 1
+            records[i] = current_data
             continue
+        to_scrape.append((i, row))
 
-        if (i + 1) % batch_size == 0:
-            logger.info(f"Đã xử lý {i+1}/{total} nhà hàng...")
+    for n, (i, row, result, duration) in enumerate(
+            scrape_rows(driver, wait, to_scrape, feature_cols, total, single_script, num_tabs), start=1):
+        if result and journal:
+            append_journal(journal_file, *result, i, "serial")
+        if result and scheduler is not None:
+            scheduler.record(row.get("Restaurant_id", ""), result[0].get("Num_of_reviews"), duration)
+        if result:
+            current_data, has_change = result
+            if has_change:
+                updated += 1
+            records[i] = current_data
+        else:
+            # Scrape thất bại: giữ nguyên dòng cũ như chế độ song song để file ghi lại không mất nhà hàng
+            records[i] = unchanged_record(row, feature_cols, i)
+
+        if n % batch_size == 0:
+            logger.info(f"Đã xử lý {n}/{len(to_scrape)} nhà hàng...")
+
+    # Giữ thứ tự dòng ban đầu
+    data_list = [records[i] for i in sorted(records)]
+    updated += fill_url_coordinates(data_list)
 
     # Lưu dữ liệu
     if data_list:
-        unique_features = set()
-        for data in data_list:
-            if isinstance(data["feature_type"], dict):
-                unique_features.update(data["feature_type"].keys())
-        unique_features = sorted(unique_features)
-
-        output_data = {field: [] for field in BASE_FIELDNAMES}
-        for data in data_list:
-            for field in BASE_FIELDNAMES:
-                output_data[field].append(data.get(field, ""))
-
-        for feature in unique_features:
-            output_data[feature] = [
-                json.dumps(data["feature_type"].get(feature, []), ensure_ascii=False) 
-                if isinstance(data["feature_type"], dict) else "[]"
-                for data in data_list
+        if db is not None:
+            db.save_restaurant_records(data_list)
+        save_restaurant_records(data_list, output_file)
+        logger.info(f"Hoàn thành! Đã cập nhật {updated} nhà hàng và lưu vào {output_file}.")
+        if journal and os.path.isfile(journal_file):
+            os.remove(journal_file)
+    else:
+        logger.warning("Không có dữ liệu để lưu.")
+
+    return updated
+
+def scrape_shard(worker_id, shard, feature_cols, total, headless=False, batch_size=10, single_script=False, journal_file=None, scheduler=None, num_tabs=1):
+    """Worker: scrape một phần (shard) các nhà hàng trên trình duyệt riêng.
+
+    Args:
+        worker_id: Số thứ tự worker (dùng cho log).
+        shard: Danh sách (row_index, row) được giao cho worker.
+        feature_cols: Danh sách cột feature trong CSV.
+        total: Tổng số nhà hàng (dùng cho log).
+        headless: Chạy headless nếu True.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        journal_file: Nếu có, ghi từng nhà hàng vào journal ngay khi xong.
+        scheduler: RecrawlScheduler; nếu có thì ghi nhận từng lần crawl.
+        num_tabs: Số tab tải trang song song trong trình duyệt của worker.
+
+    Returns:
+        list: Danh sách (row_index, current_data, has_change).
+    """
+    results = []
+    driver = None
+    try:
+        # ChromeDriverManager không an toàn khi cài đặt song song
+        with driver_setup_lock:
+            driver = setup_driver(headless=headless, background_tabs=num_tabs > 1)
+        wait = WebDriverWait(driver, 10)
+        for done, (i, row, result, duration) in enumerate(
+                scrape_rows(driver, wait, shard, feature_cols, total, single_script, num_tabs,
+                            f"[Worker {worker_id}] "), start=1):
+            if result:
+                current_data, has_change = result
+                results.append((i, current_data, has_change))
+                if journal_file:
+                    append_journal(journal_file, current_data, has_change, i, f"worker-{worker_id}")
+                if scheduler is not None:
+                    scheduler.record(row.get("Restaurant_id", ""), current_data.get("Num_of_reviews"), duration)
+            if done % batch_size == 0:
+                logger.info(f"[Worker {worker_id}] Đã xử lý {done}/{len(shard)} nhà hàng...")
+    except WebDriverException as e:
+        logger.error(f"[Worker {worker_id}] Lỗi trình duyệt, dừng worker: {e}")
+    finally:
+        if driver:
+            driver.quit()
+            logger.info(f"[Worker {worker_id}] Đã đóng trình duyệt.")
+    return results
+
+def update_details_parallel(output_file="restaurants.csv", num_workers=2, batch_size=10, headless=False, single_script=False, journal=False, db=None, scheduler=None, num_tabs=1):
+    """Cập nhật chi tiết nhà hàng bằng nhiều trình duyệt chạy song song.
+
+    Các dòng của CSV được chia đều (round-robin) cho num_workers worker, mỗi
+    worker có một Chrome riêng tạo bằng setup_driver. Kết quả được gộp lại
+    theo thứ tự dòng ban đầu nên file đầu ra giống hệt chế độ tuần tự.
+
+    Args:
+        output_file: Đường dẫn file CSV.
+        num_workers: Số trình duyệt chạy song song.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        headless: Chạy headless nếu True.
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        journal: Ghi từng nhà hàng vào journal ngay khi xong và bỏ qua các nhà hàng
+            đã có trong journal của lần chạy bị gián đoạn trước.
+        db: CrawlDB; nếu có thì đọc nhà hàng từ cơ sở dữ liệu và ghi kết quả vào đó.
+        scheduler: RecrawlScheduler; nếu có thì chỉ crawl các nhà hàng được lập lịch
+            trong budget (budget tính theo tổng giây của mọi trình duyệt).
+        num_tabs: Số tab tải trang song song trong mỗi trình duyệt.
+
+    Returns:
+        int: Số lượng nhà hàng được cập nhật.
+    """
+    rows, feature_cols = db.read_restaurant_rows() if db is not None else read_restaurant_rows(output_file)
+    if rows is None:
+        return 0
+
+    journal_file = journal_path(output_file) if journal else None
+    done = load_journal(journal_file) if journal else {}
+
+    results = []
+    indexed_rows = []
+    for i, row in enumerate(rows):
+        url = row.get("Url", "")
+        if not url:
+            logger.warning(f"Bỏ qua dòng {i+1}: Không có URL")
+            continue
+        if url in done:
+            current_data, has_change = done[url]
+            results.append((i, current_data, has_change))
+            continue
+        indexed_rows.append((i, row))
+
+    if scheduler is not None:
+        # Các shard chia round-robin theo thứ tự ưu tiên nên nhà hàng quan trọng được crawl trước
+        planned = scheduler.plan(indexed_rows)
+        planned_indices = {i for i, _ in planned}
+        for i, row in indexed_rows:
+            if i not in planned_indices:
+                results.append((i, unchanged_record(row, feature_cols, i), False))
+        indexed_rows = planned
+
+    total = len(rows)
+    if indexed_rows:
+        num_workers = max(1, min(num_workers, len(indexed_rows)))
+        shards = [indexed_rows[w::num_workers] for w in range(num_workers)]
+        logger.info(f"Chia {len(indexed_rows)} nhà hàng cho {num_workers} worker.")
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(scrape_shard, w + 1, shard, feature_cols, total, headless, batch_size,
+                                single_script, journal_file, scheduler, num_tabs)
+                for w, shard in enumerate(shards)
             ]
+            for future in as_completed(futures):
+                results.extend(future.result())
+
+    # Dòng chưa có kết quả (scrape thất bại hoặc worker dừng vì lỗi trình duyệt) được giữ
+    # nguyên, để file ghi lại không làm mất các nhà hàng trong shard của worker bị dừng
+    finished = {i for i, _, _ in results}
+    for i, row in indexed_rows:
+        if i not in finished:
+            results.append((i, unchanged_record(row, feature_cols, i), False))
+
+    # Gộp kết quả theo thứ tự dòng ban đầu
+    results.sort(key=lambda item: item[0])
+    data_list = [current_data for _, current_data, _ in results]
+    updated = sum(1 for _, _, has_change in results if has_change)
+    updated += fill_url_coordinates(data_list)
 
-        output_df = pd.DataFrame(output_data)
-        output_df.to_csv(output_file, index=False, encoding="utf-8-sig", quoting=csv.QUOTE_NONNUMERIC)
+    if data_list:
+        if db is not None:
+            db.save_restaurant_records(data_list)
+        save_restaurant_records(data_list, output_file)
         logger.info(f"Hoàn thành! Đã cập nhật {updated} nhà hàng và lưu vào {output_file}.")
+        if journal and os.path.isfile(journal_file):
+            os.remove(journal_file)
     else:
         logger.warning("Không có dữ liệu để lưu.")
 
     return updated
 
+def detail_queue_worker(worker_id, row_queue, feature_cols, headless=False, batch_size=10, single_script=False):
+    """Worker của pipeline: lấy (row_index, row) từ hàng đợi và scrape trên trình duyệt riêng.
+
+    Dừng khi gặp None trong hàng đợi.
+
+    Returns:
+        list: Danh sách (row_index, current_data, has_change).
+    """
+    results = []
+    driver = None
+    try:
+        with driver_setup_lock:
+            driver = setup_driver(headless=headless)
+        wait = WebDriverWait(driver, 10)
+        while True:
+            item = row_queue.get()
+            if item is None:
+                break
+            i, row = item
+            logger.info(f"[Worker {worker_id}] Scraping {i+1}: {row.get('Restaurant_name', 'Unknown')}")
+            result = scrape_row(driver, wait, row, feature_cols, i, single_script)
+            if result:
+                results.append((i, *result))
+            if len(results) % batch_size == 0 and results:
+                logger.info(f"[Worker {worker_id}] Đã xử lý {len(results)} nhà hàng...")
+    except WebDriverException as e:
+        logger.error(f"[Worker {worker_id}] Lỗi trình duyệt, dừng worker: {e}")
+    finally:
+        if driver:
+            driver.quit()
+            logger.info(f"[Worker {worker_id}] Đã đóng trình duyệt.")
+    return results
+
+def update_details_pipelined(driver, search_url, output_file="restaurants.csv", num_workers=1, batch_size=10,
+                             headless=False, single_script=False, db=None):
+    """Tìm kiếm và cập nhật chi tiết cùng lúc.
+
+    Trình duyệt driver cuộn danh sách kết quả; mỗi khi có link mới, nhà hàng được đưa
+    ngay vào hàng đợi cho num_workers worker (mỗi worker một trình duyệt riêng) scrape
+    chi tiết. Khi hết danh sách, các nhà hàng cũ không xuất hiện trong kết quả tìm kiếm
+    cũng được đưa vào hàng đợi. Toàn bộ kết quả được ghi vào CSV (và cơ sở dữ liệu nếu
+    có) một lần ở cuối, theo thứ tự dòng như update_details_and_save. Không dùng
+    journal và lịch crawl.
+
+    Args:
+        driver: WebDriver dùng để tìm kiếm.
+        search_url: URL tìm kiếm Google Maps.
+        output_file: Đường dẫn file CSV.
+        num_workers: Số trình duyệt scrape chi tiết.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        headless: Chạy headless nếu True.
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        db: CrawlDB; nếu có thì đọc nhà hàng từ cơ sở dữ liệu và ghi kết quả vào đó.
+
+    Returns:
+        int: Số lượng nhà hàng được cập nhật.
+    """
+    rows, feature_cols = db.read_restaurant_rows() if db is not None else read_restaurant_rows(output_file)
+    if rows is None:
+        return 0
+
+    # Khóa chống trùng (place ID) -> vị trí dòng, giống write_links
+    known = {}
+    for i, key in enumerate(restaurant_keys([row.get("Url", "") for row in rows],
+                                            [row.get("Restaurant_name", "") for row in rows])):
+        if isinstance(key, str):
+            known.setdefault(key, i)
+    next_id_ref = {'value': max([int(row["Restaurant_id"]) for row in rows
+                                 if str(row.get("Restaurant_id", "")).isdigit()] + [0]) + 1}
+    queued = set()
+    row_queue = queue.Queue()
+    # Số div đầu feed đã đọc: mỗi lần cuộn chỉ đọc các thẻ mới xuất hiện
+    position_ref = {'value': 0}
+
+    def enqueue(i):
+        if i not in queued and rows[i].get("Url", ""):
+            queued.add(i)
+            row_queue.put((i, rows[i]))
+
+    def publish_links():
+        # Được gọi sau mỗi lần cuộn: đưa nhà hàng vừa xuất hiện vào hàng đợi
+        count_new = 0
+        for restaurant in collect_links(driver, position_ref) or []:
+            key = restaurant_key(restaurant["Url"], restaurant["Restaurant_name"])
+            if key not in known:
+                _, latitude, longitude = parse_place_url(restaurant["Url"])
+                rows.append({
+                    "Restaurant_id": str(next_id_ref['value']),
+                    "Url": restaurant["Url"],
+                    "Restaurant_name": restaurant["Restaurant_name"],
+                    "Latitude": "" if latitude is None else str(latitude),
+                    "Longitude": "" if longitude is None else str(longitude),
+                })
+                next_id_ref['value'] += 1
+                known[key] = len(rows) - 1
+                count_new += 1
+            enqueue(known[key])
+        logger.info(f"Pipeline: {len(queued)} nhà hàng đã vào hàng đợi ({count_new} nhà hàng mới).")
+
+    num_workers = max(1, num_workers)
+    results = []
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(detail_queue_worker, w + 1, row_queue, feature_cols, headless, batch_size,
+                                   single_script)
+                   for w in range(num_workers)]
+        try:
+            driver.get(search_url)
+            scrollable_div = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='feed']"))
+            )
+            logger.info("Bắt đầu cuộn và scrape chi tiết song song...")
+            scroll_until_end(driver, scrollable_div, on_new_items=publish_links)
+        except TimeoutException as e:
+            logger.error(f"Không thể tìm thấy danh sách nhà hàng: {e}")
+        finally:
+            # Nhà hàng cũ không có trong kết quả tìm kiếm vẫn được cập nhật như chế độ thường
+            for i in range(len(rows)):
+                enqueue(i)
+            for _ in futures:
+                row_queue.put(None)
+        for future in as_completed(futures):
+            results.extend(future.result())
+
+    records = {i: current_data for i, current_data, _ in results}
+    updated = sum(1 for _, _, has_change in results if has_change)
+    # Nhà hàng scrape thất bại vẫn được giữ (kể cả nhà hàng mới tìm thấy, chưa từng được ghi)
+    for i in queued - records.keys():
+        records[i] = unchanged_record(rows[i], feature_cols, i)
+    data_list = [records[i] for i in sorted(records)]
+    updated += fill_url_coordinates(data_list)
+
+    if data_list:
+        if db is not None:
+            db.save_restaurant_records(data_list)
+        save_restaurant_records(data_list, output_file)
+        logger.info(f"Hoàn thành! Đã cập nhật {updated} nhà hàng và lưu vào {output_file}.")
+    else:
+        logger.warning("Không có dữ liệu để lưu.")
+    return updated
+
+async def extract_features_cdp(page, timeout=10):
+    """Như extract_features nhưng trên một CDPPage: click tab 'About' và đọc feature bằng một script."""
+    try:
+        await page.wait_for_selector(ABOUT_TAB_XPATH, timeout)
+        if not await page.click(ABOUT_TAB_XPATH):
+            logger.warning("Không tìm thấy hoặc không click được tab 'About'")
+            return {}
+        await page.wait_for_selector(FEATURE_TITLE_XPATH, timeout)
+        features = await page.evaluate(EXTRACT_FEATURES_JS, FEATURE_TITLE_XPATH, FEATURE_ITEMS_XPATH) or []
+    except (CDPError, asyncio.TimeoutError) as e:
+        logger.warning(f"Lỗi khi truy cập tab 'About': {e}")
+        return {}
+    return {title.title(): items for title, items in features if title}
+
+async def scrape_row_cdp(page, row, feature_cols, row_index, timeout=10):
+    """Như scrape_row (chế độ single_script) nhưng trên một CDPPage.
+
+    Returns:
+        tuple: (current_data, has_change) hoặc None nếu scrape thất bại.
+    """
+    url = row.get("Url", "")
+    _, latitude, longitude = parse_place_url(url)
+    data = empty_restaurant_data((latitude, longitude) if latitude is not None and longitude is not None else None)
+    try:
+        # navigate chờ document mới thay trang trước của tab, nên h1 không phải của nhà hàng cũ
+        await page.navigate(url)
+        await page.wait_for_selector("h1.DUwDvf", timeout)
+        type_order, address_order, arguments = overview_arguments()
+        panel = await page.evaluate(EXTRACT_OVERVIEW_JS, *arguments) or {}
+    except (CDPError, asyncio.TimeoutError) as e:
+        logger.error(f"Lỗi scrape {url}: {e}")
+        return None
+    apply_overview(data, panel, type_order, address_order)
+    data["feature_type"] = await extract_features_cdp(page, timeout)
+    return merge_restaurant_data(row, data, feature_cols, row_index)
+
+async def scrape_rows_cdp(indexed_rows, feature_cols, total, num_pages=10, headless=False, batch_size=10):
+    """Scrape các dòng trên num_pages tab của một Chrome điều khiển qua CDP.
+
+    Mỗi tab là một coroutine lấy dòng tiếp theo từ danh sách chung, nên trong lúc
+    một tab chờ mạng hay chờ selector, các tab khác vẫn tiếp tục trên cùng một luồng.
+
+    Returns:
+        list: Các (row_index, result) với result như scrape_row.
+    """
+    results = []
+    pending = iter(indexed_rows)
+
+    async def run_page(page):
+        for i, row in pending:
+            logger.info(f"Scraping {i+1}/{total}: {row.get('Restaurant_name', 'Unknown')}")
+            results.append((i, await scrape_row_cdp(page, row, feature_cols, i)))
+            if len(results) % batch_size == 0:
+                logger.info(f"Đã xử lý {len(results)}/{len(indexed_rows)} nhà hàng...")
+
+    browser = await CDPBrowser.launch(headless=headless)
+    try:
+        pages = [await browser.new_page() for _ in range(max(1, min(num_pages, len(indexed_rows))))]
+        await asyncio.gather(*(run_page(page) for page in pages))
+    finally:
+        await browser.close()
+    return results
+
+def update_details_cdp(output_file="restaurants.csv", num_pages=10, batch_size=10, headless=False, db=None):
+    """Cập nhật chi tiết nhà hàng bằng engine CDP (cdp_engine) thay vì Selenium.
+
+    Args:
+        output_file: Đường dẫn file CSV.
+        num_pages: Số trang tải và trích xuất đồng thời.
+        batch_size: Số lượng mỗi batch log tiến độ.
+        headless: Chạy headless nếu True.
+        db: CrawlDB; nếu có thì đọc nhà hàng từ cơ sở dữ liệu và ghi kết quả vào đó.
+
+    Returns:
+        int: Số lượng nhà hàng được cập nhật.
+    """
+    rows, feature_cols = db.read_restaurant_rows() if db is not None else read_restaurant_rows(output_file)
+    if rows is None:
+        return 0
+
+    indexed_rows = []
+    for i, row in enumerate(rows):
+        if not row.get("Url", ""):
+            logger.warning(f"Bỏ qua dòng {i+1}: Không có URL")
+            continue
+        indexed_rows.append((i, row))
+
+    results = asyncio.run(scrape_rows_cdp(indexed_rows, feature_cols, len(rows), num_pages, headless, batch_size))
+
+    updated = 0
+    records = {}
+    for i, result in results:
+        if result:
+            current_data, has_change = result
+            if has_change:
+                updated += 1
+            records[i] = current_data
+    # Nhà hàng scrape thất bại vẫn được giữ như pipeline
+    for i, row in indexed_rows:
+        if i not in records:
+            records[i] = unchanged_record(row, feature_cols, i)
+    data_list = [records[i] for i in sorted(records)]
+    updated += fill_url_coordinates(data_list)
+
+    if data_list:
+        if db is not None:
+            db.save_restaurant_records(data_list)
+        save_restaurant_records(data_list, output_file)
+        logger.info(f"Hoàn thành! Đã cập nhật {updated} nhà hàng và lưu vào {output_file}.")
+    else:
+        logger.warning("Không có dữ liệu để lưu.")
+    return updated
+
+# Vùng bao Đà Nẵng (không gồm Hoàng Sa) cho tìm kiếm theo ô: (min_lat, min_lng, max_lat, max_lng)
+DA_NANG_BOUNDS = (15.90, 107.80, 16.20, 108.35)
+# Vị trí giả lập mặc định của trình duyệt (giống setup_driver)
+DEFAULT_GEOLOCATION = (16.0544, 108.2022)
+# Maps chỉ liệt kê khoảng 120 kết quả cho một tìm kiếm; ô có từ ngần này kết quả được chia nhỏ
+TILE_RESULT_CAP = 110
+# Cạnh nhỏ nhất của một ô (độ, khoảng 500 m), không chia tiếp dù vẫn chạm ngưỡng
+MIN_TILE_SPAN = 0.005
+# Từ khóa tìm kiếm trong mỗi ô lưới
+TILE_QUERY = "Restaurants"
+QUAN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Code_Crawl", "Quan.csv")
+
+def split_bounds(bounds, rows=2, cols=2):
+    """Chia vùng (min_lat, min_lng, max_lat, max_lng) thành rows x cols ô bằng nhau."""
+    min_lat, min_lng, max_lat, max_lng = bounds
+    lat_step = (max_lat - min_lat) / rows
+    lng_step = (max_lng - min_lng) / cols
+    return [(min_lat + r * lat_step, min_lng + c * lng_step, min_lat + (r + 1) * lat_step, min_lng + (c + 1) * lng_step)
+            for r in range(rows) for c in range(cols)]
+
+def tile_center(tile):
+    if tile["bounds"] is None:
+        return DEFAULT_GEOLOCATION
+    min_lat, min_lng, max_lat, max_lng = tile["bounds"]
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+def tile_url(tile, viewport_px=1000):
+    """URL tìm kiếm của một ô: ô lưới dùng khung nhìn @lat,lng,zoom vừa với ô, ô quận dùng tên quận."""
+    url = f"https://www.google.com/maps/search/{quote_plus(tile['query'])}"
+    if tile["bounds"] is not None:
+        min_lat, min_lng, max_lat, max_lng = tile["bounds"]
+        span = max(max_lng - min_lng, max_lat - min_lat, 1e-6)
+        # Ở mức zoom z, 360 độ kinh tuyến dài 256 * 2^z pixel
+        zoom = min(18, max(10, int(math.log2(360 * viewport_px / (256 * span)))))
+        latitude, longitude = tile_center(tile)
+        url += f"/@{latitude:.6f},{longitude:.6f},{zoom}z"
+    return url + "?hl=en"
+
+def initial_tiles(mode, num_workers=1):
+    """Danh sách ô ban đầu.
+
+    Args:
+        mode: "district" (mỗi quận/huyện trong Quan.csv một ô) hoặc "grid" (lưới trên DA_NANG_BOUNDS,
+            ít nhất num_workers ô).
+        num_workers: Số trình duyệt tìm kiếm song song.
+
+    Returns:
+        list: Các ô (dict query, bounds, label, depth).
+    """
+    if mode == "district":
+        names = pd.read_csv(QUAN_FILE, encoding="utf-8-sig")["Quận huyện"].dropna().tolist()
+        # Hoàng Sa không có nhà hàng trên Maps
+        return [{"query": f"Restaurants in {name}, Da Nang", "bounds": None, "label": name, "depth": 0}
+                for name in names if name != "Hoàng Sa"]
+    size = max(2, math.ceil(math.sqrt(num_workers)))
+    return [{"query": TILE_QUERY, "bounds": bounds, "label": f"ô {k + 1}", "depth": 0}
+            for k, bounds in enumerate(split_bounds(DA_NANG_BOUNDS, size, size))]
+
+def subdivide_tile(tile, restaurants):
+    """Chia một ô chạm ngưỡng kết quả thành 4 ô con.
+
+    Ô quận (không có khung) được chia theo khung bao tọa độ các nhà hàng vừa tìm thấy.
+
+    Returns:
+        list: Các ô con, rỗng nếu ô đã nhỏ hơn MIN_TILE_SPAN.
+    """
+    bounds = tile["bounds"]
+    if bounds is None:
+        coords = parse_place_urls([r["Url"] for r in restaurants]).dropna(subset=["Latitude", "Longitude"])
+        if coords.empty:
+            return []
+        bounds = (coords["Latitude"].min(), coords["Longitude"].min(), coords["Latitude"].max(), coords["Longitude"].max())
+    if max(bounds[2] - bounds[0], bounds[3] - bounds[1]) < 2 * MIN_TILE_SPAN:
+        return []
+    return [{"query": TILE_QUERY, "bounds": child, "label": f"{tile['label']}.{k + 1}", "depth": tile["depth"] + 1}
+            for k, child in enumerate(split_bounds(bounds))]
+
+class TiledSearch:
+    """Hàng đợi ô tìm kiếm dùng chung cho nhiều trình duyệt, chống trùng kết quả theo place ID.
+
+    Mỗi worker lấy một ô (next_tile), tìm kiếm rồi trả kết quả (finish_tile). Ô có
+    từ cap kết quả trở lên nghĩa là Maps đã cắt bớt danh sách, nên được chia thành
+    4 ô con và đưa lại vào hàng đợi; worker nào rảnh sẽ lấy trước.
+    """
+
+    def __init__(self, tiles, cap=TILE_RESULT_CAP):
+        self.cap = cap
+        self.tiles = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.found = {}
+        self.searched = 0
+        self.subdivided = 0
+        for tile in tiles:
+            self.add_tile(tile)
+
+    def add_tile(self, tile):
+        with self.lock:
+            self.pending += 1
+        self.tiles.put(tile)
+
+    def done(self):
+        with self.lock:
+            return self.pending == 0
+
+    def next_tile(self, timeout=1):
+        """Ô tiếp theo, None nếu chưa có ô nào trong timeout giây."""
+        try:
+            return self.tiles.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def finish_tile(self, tile, restaurants):
+        """Ghi nhận kết quả của một ô; chia nhỏ ô nếu chạm ngưỡng.
+
+        Ô luôn được tính là xong (pending giảm) kể cả khi xử lý kết quả bị lỗi, để các
+        worker khác không chờ mãi.
+
+        Returns:
+            int: Số nhà hàng mới (chưa thấy ở ô khác).
+        """
+        try:
+            children = subdivide_tile(tile, restaurants) if len(restaurants) >= self.cap else []
+            for child in children:
+                self.add_tile(child)
+            with self.lock:
+                count_new = 0
+                for restaurant in restaurants:
+                    key = restaurant_key(restaurant["Url"], restaurant["Restaurant_name"])
+                    if key not in self.found:
+                        self.found[key] = restaurant
+                        count_new += 1
+                self.searched += 1
+                self.subdivided += 1 if children else 0
+            return count_new
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def restaurants(self):
+        with self.lock:
+            return list(self.found.values())
+
+def search_tile(driver, tile):
+    """Tìm kiếm một ô: đặt vị trí giả lập vào tâm ô, mở URL tìm kiếm, cuộn hết danh sách.
+
+    Returns:
+        list: Các dict {Url, Restaurant_name} tìm thấy trong ô.
+    """
+    latitude, longitude = tile_center(tile)
+    driver.execute_cdp_cmd("Emulation.setGeolocationOverride", {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accuracy": 100
+    })
+    driver.get(tile_url(tile))
+    try:
+        scrollable_div = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='feed']"))
+        )
+    except TimeoutException:
+        # Không có danh sách: ô không có kết quả hoặc Maps mở thẳng một địa điểm
+        logger.info(f"Ô {tile['label']} không có danh sách kết quả.")
+        return []
+    scroll_until_end(driver, scrollable_div)
+    return collect_links(driver) or []
+
+def search_tiles_worker(worker_id, search, headless=False):
+    """Worker: lấy lần lượt các ô từ TiledSearch và tìm kiếm trên trình duyệt riêng."""
+    driver = None
+    try:
+        with driver_setup_lock:
+            driver = setup_driver(headless=headless)
+        while not search.done():
+            tile = search.next_tile()
+            if tile is None:
+                continue
+            restaurants = []
+            try:
+                restaurants = search_tile(driver, tile)
+            except WebDriverException as e:
+                logger.error(f"[Worker {worker_id}] Lỗi khi tìm kiếm ô {tile['label']}: {e}")
+            finally:
+                # Lỗi khác vẫn làm dừng worker nhưng ô phải được trả lại, nếu không pending
+                # không về 0 và các worker còn lại chờ mãi
+                count_new = search.finish_tile(tile, restaurants)
+            logger.info(f"[Worker {worker_id}] Ô {tile['label']}: {len(restaurants)} kết quả, {count_new} nhà hàng mới"
+                        + (" (chạm ngưỡng, chia nhỏ)" if len(restaurants) >= search.cap else ""))
+    except WebDriverException as e:
+        logger.error(f"[Worker {worker_id}] Lỗi trình duyệt, dừng worker: {e}")
+    finally:
+        if driver:
+            driver.quit()
+            logger.info(f"[Worker {worker_id}] Đã đóng trình duyệt.")
+
+def discover_tiled(mode="grid", num_workers=1, headless=False):
+    """Tìm nhà hàng theo từng ô (quận hoặc lưới tọa độ) trên nhiều trình duyệt song song.
+
+    Vượt giới hạn khoảng 120 kết quả của một lần tìm kiếm: ô nào chạm ngưỡng được
+    chia nhỏ cho đến khi mỗi ô trả về ít hơn TILE_RESULT_CAP kết quả.
+
+    Args:
+        mode: "district" hoặc "grid" (xem initial_tiles).
+        num_workers: Số trình duyệt tìm kiếm song song.
+        headless: Chạy headless nếu True.
+
+    Returns:
+        list: Các dict {Url, Restaurant_name} đã chống trùng theo place ID.
+    """
+    num_workers = max(1, num_workers)
+    search = TiledSearch(initial_tiles(mode, num_workers))
+    logger.info(f"Tìm kiếm theo ô ({mode}): {search.pending} ô ban đầu, {num_workers} trình duyệt.")
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(search_tiles_worker, w + 1, search, headless) for w in range(num_workers)]
+        for future in as_completed(futures):
+            future.result()
+    if not search.done():
+        logger.warning(f"Còn {search.pending} ô chưa tìm kiếm do mọi trình duyệt đã dừng.")
+    restaurants = search.restaurants()
+    logger.info(f"Đã tìm {search.searched} ô ({search.subdivided} ô được chia nhỏ), "
+                f"tổng cộng {len(restaurants)} nhà hàng khác nhau.")
+    return restaurants
+
 def main(search_url="https://www.google.com/maps/search/Restaurants+in+Da+Nang", 
          output_dir=r"D:\Nam3_Ky2\DeAnThucHanh\Crawl\Data", 
          batch_size=10, 
-         headless=False):
+         headless=False,
+         num_workers=1,
+         single_script=False,
+         journal=False,
+         streaming=False,
+         db_file=None,
+         budget_minutes=None,
+         tiles=None,
+         pipeline=False,
+         num_tabs=1,
+         engine="selenium",
+         num_pages=10,
+         prefetch=False):
     """Hàm chính để chạy chương trình crawl.
 
     Args:
@@ -515,7 +1906,29 @@ def main(search_url="https://www.google.com/maps/search/Restaurants+in+Da+Nang",
         output_file: Đường dẫn file CSV.
         batch_size: Số lượng mỗi batch log tiến độ.
         headless: Chạy headless nếu True.
+        num_workers: Số trình duyệt cập nhật chi tiết song song (1 = tuần tự).
+        single_script: Đọc panel tổng quan bằng một script duy nhất.
+        journal: Ghi checkpoint từng nhà hàng và tiếp tục từ checkpoint nếu lần trước bị dừng.
+        streaming: Cập nhật tuần tự với bộ nhớ cố định (update_details_streaming).
+        db_file: Đường dẫn file SQLite; nếu có thì lưu nhà hàng vào cơ sở dữ liệu
+            (restaurants.csv vẫn được xuất lại sau khi cập nhật).
+        budget_minutes: Nếu có, lập lịch crawl lại theo tốc độ thay đổi và chỉ cập nhật
+            các nhà hàng vừa đủ số phút chạy này (mỗi worker).
+        tiles: "district" hoặc "grid" để tìm nhà hàng theo từng ô trên num_workers trình duyệt
+            (discover_tiled) thay vì một lần tìm kiếm search_url.
+        pipeline: Scrape chi tiết ngay trong lúc cuộn danh sách search_url, trên num_workers
+            trình duyệt riêng (update_details_pipelined). Bỏ qua nếu có tiles.
+        num_tabs: Số tab tải trang chi tiết song song trong mỗi trình duyệt (không dùng cho
+            pipeline và streaming).
+        engine: "selenium" (mặc định) hoặc "cdp" để cập nhật chi tiết bằng engine CDP bất đồng
+            bộ (update_details_cdp) với num_pages trang cùng lúc. Tìm kiếm vẫn dùng Selenium;
+            bỏ qua nếu có pipeline.
+        num_pages: Số trang đồng thời của engine CDP.
+        prefetch: Tải trước nhà hàng kế tiếp trong tab nền trong lúc trích xuất nhà hàng
+            hiện tại; tương đương num_tabs=2 (TabPool).
     """
+    if prefetch:
+        num_tabs = max(num_tabs, 2)
     
     output_file = os.path.join(output_dir, "restaurants.csv")
     
@@ -523,28 +1936,68 @@ def main(search_url="https://www.google.com/maps/search/Restaurants+in+Da+Nang",
     logger.info(f"Bắt đầu crawl: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
     driver = None
+    db = None
     try:
-        driver = setup_driver(headless=headless)
-        driver.get(search_url)
-
         init_csv(output_file)
+        if db_file:
+            db = open_restaurant_db(db_file, output_file)
 
-        try:
-            wait = WebDriverWait(driver, 10)
-            scrollable_div = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='feed']"))
-            )
-            logger.info("Bắt đầu cuộn để tải thêm nhà hàng...")
-            scroll_until_end(driver, scrollable_div)
+        if tiles:
+            restaurants = discover_tiled(tiles, num_workers, headless)
             logger.info("Lưu danh sách link vào CSV...")
-            save_links(driver, output_file)
-        except TimeoutException as e:
-            logger.error(f"Không thể tìm thấy danh sách nhà hàng: {e}")
-            raise
+            write_links(restaurants, output_file, db)
+            if num_workers <= 1:
+                driver = setup_driver(headless=headless, background_tabs=num_tabs > 1)
+        elif pipeline:
+            # Tìm kiếm diễn ra trong update_details_pipelined, song song với scrape chi tiết
+            driver = setup_driver(headless=headless)
+        else:
+            driver = setup_driver(headless=headless, background_tabs=num_tabs > 1)
+            driver.get(search_url)
+            try:
+                wait = WebDriverWait(driver, 10)
+                scrollable_div = wait.until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[role='feed']"))
+                )
+                logger.info("Bắt đầu cuộn để tải thêm nhà hàng...")
+                scroll_until_end(driver, scrollable_div)
+                logger.info("Lưu danh sách link vào CSV...")
+                save_links(driver, output_file, db)
+            except TimeoutException as e:
+                logger.error(f"Không thể tìm thấy danh sách nhà hàng: {e}")
+                raise
+
+        scheduler = None
+        if budget_minutes is not None:
+            # Budget là số giây trình duyệt: mỗi worker có budget_minutes phút
+            scheduler = RecrawlScheduler(schedule_path(output_file), budget_minutes * 60 * max(1, num_workers),
+                                         default_cost=20.0)
 
         logger.info("Bắt đầu cập nhật chi tiết và đặc điểm nhà hàng...")
-        updated = update_details_and_save(driver, output_file, batch_size)
+        if pipeline and not tiles:
+            updated = update_details_pipelined(driver, search_url, output_file, num_workers, batch_size, headless,
+                                               single_script, db)
+        elif engine == "cdp":
+            # Engine CDP tự khởi động Chrome riêng
+            if driver:
+                driver.quit()
+                driver = None
+            updated = update_details_cdp(output_file, num_pages, batch_size, headless, db)
+        elif num_workers > 1:
+            # Giải phóng trình duyệt tìm kiếm, mỗi worker tự tạo trình duyệt riêng
+            if driver:
+                driver.quit()
+                driver = None
+            updated = update_details_parallel(output_file, num_workers, batch_size, headless, single_script, journal, db,
+                                              scheduler, num_tabs)
+        elif streaming and db is None and scheduler is None and num_tabs <= 1:
+            updated = update_details_streaming(driver, output_file, batch_size, single_script)
+        else:
+            updated = update_details_and_save(driver, output_file, batch_size, single_script, journal, db, scheduler,
+                                              num_tabs)
         logger.info(f"Hoàn thành cập nhật dữ liệu! Đã cập nhật {updated} nhà hàng.")
+        for selectors in (TYPE_SELECTORS, ADDRESS_SELECTORS):
+            logger.info(f"Thống kê selector {selectors.stats()}")
 
     except (TimeoutException, WebDriverException) as e:
         logger.error(f"Lỗi trong quá trình thực thi: {e}")
@@ -553,8 +2006,34 @@ def main(search_url="https://www.google.com/maps/search/Restaurants+in+Da+Nang",
         if driver:
             driver.quit()
             logger.info("Đã đóng trình duyệt.")
+        if db is not None:
+            db.close()
         end_time = datetime.now()
         logger.info(f"Kết thúc crawl: {end_time.strftime('%Y-%m-%d %H:%M:%S')}, thời gian chạy: {end_time - start_time}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl danh sách và chi tiết nhà hàng trên Google Maps.")
+    parser.add_argument("--workers", type=int, default=1, help="Số trình duyệt cập nhật chi tiết song song.")
+    parser.add_argument("--headless", action="store_true", help="Chạy trình duyệt ở chế độ không giao diện.")
+    parser.add_argument("--single-script", action="store_true", help="Đọc panel tổng quan bằng một lần execute_script.")
+    parser.add_argument("--journal", action="store_true", help="Ghi checkpoint từng nhà hàng và tiếp tục nếu lần trước bị dừng.")
+    parser.add_argument("--streaming", action="store_true", help="Cập nhật tuần tự với bộ nhớ cố định (bỏ qua nếu --workers > 1, --tabs > 1, có --db hoặc --budget).")
+    parser.add_argument("--db", default=None, help="File SQLite để lưu nhà hàng (CSV vẫn được xuất để tương thích).")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Số phút chạy cho mỗi trình duyệt; chỉ cập nhật các nhà hàng thay đổi nhanh nhất trong budget.")
+    parser.add_argument("--tiles", choices=["district", "grid"], default=None,
+                        help="Tìm nhà hàng theo từng quận hoặc ô lưới trên --workers trình duyệt, chia nhỏ ô chạm giới hạn kết quả.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Scrape chi tiết ngay trong lúc cuộn danh sách, trên --workers trình duyệt riêng (bỏ qua nếu có --tiles).")
+    parser.add_argument("--tabs", type=int, default=1,
+                        help="Số tab tải trang chi tiết song song trong mỗi trình duyệt.")
+    parser.add_argument("--engine", choices=["selenium", "cdp"], default="selenium",
+                        help="Engine cập nhật chi tiết: Selenium, hoặc CDP bất đồng bộ giữ --pages trang cùng lúc.")
+    parser.add_argument("--pages", type=int, default=10, help="Số trang đồng thời khi dùng --engine cdp.")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Tải trước trang nhà hàng kế tiếp trong tab nền (tương đương --tabs 2).")
+    args = parser.parse_args()
+    main(headless=args.headless, num_workers=args.workers, single_script=args.single_script,
+         journal=args.journal, streaming=args.streaming, db_file=args.db, budget_minutes=args.budget,
+         tiles=args.tiles, pipeline=args.pipeline, num_tabs=args.tabs, engine=args.engine,
+         num_pages=args.pages, prefetch=args.prefetch)
\ No newline at end of file
@@ -0,0 +1,359 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from urllib.parse import urlparse
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection, CloseConnection, Ping, RejectConnection, Request, TextMessage
+
+from tab_pool import BACKGROUND_TAB_ARGUMENTS
+
+logger = logging.getLogger(__name__)
+
+# Vị trí giả lập mặc định của trang (giống setup_driver)
+DEFAULT_GEOLOCATION = (16.0544, 108.2022)
+# Nơi tìm Chrome nếu không có biến môi trường CHROME_PATH
+CHROME_CANDIDATES = [
+    "google-chrome", "chrome", "chromium", "chromium-browser",
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+]
+
+# Kiểm tra selector trong trang; selector bắt đầu bằng "/" hoặc "(" là XPath
+FIND_JS = """
+const selector = arguments[0];
+if (selector.startsWith("/") || selector.startsWith("(")) {
+    return document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+return document.querySelector(selector);
+"""
+EXISTS_JS = "const find = () => {" + FIND_JS + "}; return find() !== null;"
+# Đánh dấu document hiện tại của tab trước khi điều hướng; document mới không có dấu này
+MARK_DOCUMENT_JS = "window.__cdpPreviousDocument = true; return true;"
+IS_PREVIOUS_DOCUMENT_JS = "return window.__cdpPreviousDocument === true;"
+# Click bằng JavaScript như safe_click của crawler Selenium
+CLICK_JS = """
+const find = () => {""" + FIND_JS + """};
+const element = find();
+if (!element) return false;
+element.scrollIntoView({block: "center"});
+element.click();
+return true;
+"""
+
+
+class CDPError(Exception):
+    """Lỗi trả về từ Chrome DevTools Protocol."""
+
+
+def find_chrome(chrome_path=None):
+    """Đường dẫn Chrome: chrome_path, biến môi trường CHROME_PATH, hoặc CHROME_CANDIDATES."""
+    for candidate in [chrome_path, os.environ.get("CHROME_PATH")] + CHROME_CANDIDATES:
+        if not candidate:
+            continue
+        path = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+        if path:
+            return path
+    raise FileNotFoundError("Không tìm thấy Chrome; đặt biến môi trường CHROME_PATH.")
+
+
+async def stop_chrome(process, user_data_dir=None):
+    """Buộc dừng tiến trình Chrome và xóa hồ sơ tạm (nếu có)."""
+    process.kill()
+    await asyncio.to_thread(process.wait)
+    if user_data_dir:
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+
+class CDPConnection:
+    """Một kết nối websocket tới trình duyệt, dùng chung cho mọi trang (session phẳng).
+
+    Mỗi lệnh có id riêng; một task đọc websocket và trả kết quả về đúng future nên
+    nhiều coroutine có thể gửi lệnh cùng lúc trên một kết nối.
+    """
+
+    def __init__(self, reader, writer, ws):
+        self.reader = reader
+        self.writer = writer
+        self.ws = ws
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.closed = False
+        self.reader_task = asyncio.get_running_loop().create_task(self.read_loop())
+
+    @classmethod
+    async def connect(cls, ws_url):
+        url = urlparse(ws_url)
+        reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        ws = WSConnection(ConnectionType.CLIENT)
+        writer.write(ws.send(Request(host=url.netloc, target=url.path)))
+        await writer.drain()
+        while True:
+            data = await reader.read(65536)
+            ws.receive_data(data or None)
+            for event in ws.events():
+                if isinstance(event, AcceptConnection):
+                    return cls(reader, writer, ws)
+                if isinstance(event, RejectConnection):
+                    raise CDPError(f"Trình duyệt từ chối kết nối {ws_url} (HTTP {event.status_code})")
+            if not data:
+                raise CDPError(f"Mất kết nối tới {ws_url}")
+
+    async def read_loop(self):
+        parts = []
+        try:
+            while True:
+                data = await self.reader.read(1 << 20)
+                self.ws.receive_data(data or None)
+                for event in self.ws.events():
+                    if isinstance(event, TextMessage):
+                        parts.append(event.data)
+                        if event.message_finished:
+                            self.dispatch(json.loads("".join(parts)))
+                            parts = []
+                    elif isinstance(event, Ping):
+                        self.writer.write(self.ws.send(event.response()))
+                    elif isinstance(event, CloseConnection):
+                        return
+                if not data:
+                    return
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Lỗi đọc websocket CDP: {e}")
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("Kết nối CDP đã đóng"))
+            self.pending.clear()
+
+    def dispatch(self, message):
+        # Chỉ xử lý kết quả lệnh; sự kiện (không có id) được bỏ qua
+        future = self.pending.pop(message.get("id"), None)
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(CDPError(message["error"].get("message", str(message["error"]))))
+        else:
+            future.set_result(message.get("result", {}))
+
+    async def send(self, method, params=None, session_id=None, timeout=30):
+        """Gửi một lệnh CDP và chờ kết quả.
+
+        Raises:
+            CDPError: Nếu trình duyệt trả lỗi hoặc kết nối đã đóng.
+            asyncio.TimeoutError: Nếu không có kết quả sau timeout giây.
+        """
+        if self.closed:
+            raise CDPError("Kết nối CDP đã đóng")
+        message_id = next(self.ids)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        try:
+            self.writer.write(self.ws.send(TextMessage(data=json.dumps(message))))
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message_id, None)
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.writer.write(self.ws.send(CloseConnection(code=1000)))
+                await self.writer.drain()
+            except (OSError, RuntimeError):
+                pass
+        self.writer.close()
+        self.reader_task.cancel()
+
+
+class CDPPage:
+    """Một tab điều khiển qua CDP, với các thao tác crawler cần dưới dạng coroutine."""
+
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=30):
+        return await self.connection.send(method, params, self.session_id, timeout)
+
+    async def navigate(self, url, timeout=30, poll_interval=0.1):
+        """Mở url; trả về khi document mới đã thay document cũ (dùng wait_for_selector để chờ nội dung).
+
+        Tab được dùng lại cho nhiều trang, nên document cũ được đánh dấu trước khi điều hướng
+        và navigate chờ đến khi dấu đó biến mất; nhờ vậy wait_for_selector sau đó không
+        khớp nhầm phần tử của trang trước.
+
+        Raises:
+            CDPError: Nếu trình duyệt không mở được url.
+            asyncio.TimeoutError: Nếu document mới không xuất hiện sau timeout giây.
+        """
+        try:
+            await self.evaluate(MARK_DOCUMENT_JS)
+        except CDPError:
+            pass
+        result = await self.send("Page.navigate", {"url": url}, timeout)
+        if result.get("errorText"):
+            raise CDPError(f"Không mở được {url}: {result['errorText']}")
+        if not result.get("loaderId"):
+            # Điều hướng trong cùng document (chỉ đổi fragment), không có document mới để chờ
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                if not await self.evaluate(IS_PREVIOUS_DOCUMENT_JS):
+                    return
+            except CDPError:
+                # Context cũ đã bị hủy, context mới chưa sẵn sàng
+                pass
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError(f"Trang {url} không thay trang cũ sau {timeout} giây")
+            await asyncio.sleep(poll_interval)
+
+    async def evaluate(self, script, *args, timeout=30):
+        """Chạy script giống driver.execute_script: dùng arguments[i] và return.
+
+        Returns:
+            Giá trị trả về của script (đã chuyển qua JSON).
+        """
+        expression = f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})"
+        result = await self.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": True,
+        }, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CDPError(details.get("exception", {}).get("description") or details.get("text", "Lỗi JavaScript"))
+        return result.get("result", {}).get("value")
+
+    async def wait_for_selector(self, selector, timeout=10, poll_interval=0.1):
+        """Chờ đến khi selector (CSS hoặc XPath) có trong trang.
+
+        Raises:
+            asyncio.TimeoutError: Nếu quá timeout giây.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                if await self.evaluate(EXISTS_JS, selector):
+                    return
+            except CDPError:
+                # Trang đang chuyển, context cũ đã bị hủy
+                pass
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError(f"Không tìm thấy {selector} sau {timeout} giây")
+            await asyncio.sleep(poll_interval)
+
+    async def click(self, selector):
+        """Click phần tử đầu tiên khớp selector (CSS hoặc XPath) bằng JavaScript.
+
+        Returns:
+            bool: False nếu không tìm thấy phần tử.
+        """
+        return bool(await self.evaluate(CLICK_JS, selector))
+
+    async def close(self):
+        try:
+            await self.connection.send("Target.closeTarget", {"targetId": self.target_id})
+        except (CDPError, asyncio.TimeoutError) as e:
+            logger.warning(f"Không đóng được tab {self.target_id}: {e}")
+
+
+class CDPBrowser:
+    """Chrome chạy với --remote-debugging-port, điều khiển trực tiếp qua một websocket CDP.
+
+    Khác với Selenium (mỗi thao tác là một lời gọi HTTP chặn tới chromedriver), mọi
+    thao tác là coroutine nên một luồng asyncio giữ được nhiều trang cùng lúc.
+    """
+
+    def __init__(self, connection, process=None, user_data_dir=None, geolocation=DEFAULT_GEOLOCATION):
+        self.connection = connection
+        self.process = process
+        self.user_data_dir = user_data_dir
+        self.geolocation = geolocation
+
+    @classmethod
+    async def launch(cls, headless=False, chrome_path=None, geolocation=DEFAULT_GEOLOCATION, startup_timeout=30):
+        """Khởi động Chrome với hồ sơ tạm và kết nối websocket tới trình duyệt."""
+        user_data_dir = tempfile.mkdtemp(prefix="cdp-chrome-")
+        args = [
+            find_chrome(chrome_path),
+            "--remote-debugging-port=0",
+            f"--user-data-dir={user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-extensions",
+            "--disable-blink-features=AutomationControlled",
+            *BACKGROUND_TAB_ARGUMENTS,
+        ]
+        if headless:
+            args += ["--headless=new", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage"]
+        process = subprocess.Popen(args + ["about:blank"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # Với cổng 0, Chrome ghi cổng và đường dẫn websocket vào DevToolsActivePort
+        port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + startup_timeout
+        while True:
+            try:
+                with open(port_file, encoding="utf-8") as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    break
+            except OSError:
+                pass
+            if process.poll() is not None or loop.time() >= deadline:
+                await stop_chrome(process, user_data_dir)
+                raise CDPError("Chrome không khởi động được với --remote-debugging-port")
+            await asyncio.sleep(0.1)
+
+        try:
+            connection = await CDPConnection.connect(f"ws://127.0.0.1:{lines[0]}{lines[1]}")
+        except BaseException:
+            # Không kết nối được thì không ai đóng Chrome và hồ sơ tạm nữa
+            await stop_chrome(process, user_data_dir)
+            raise
+        logger.info("Thiết lập trình duyệt CDP thành công.")
+        return cls(connection, process, user_data_dir, geolocation)
+
+    async def new_page(self):
+        """Mở một tab mới (đã đặt vị trí giả lập)."""
+        target = await self.connection.send("Target.createTarget", {"url": "about:blank"})
+        session = await self.connection.send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True})
+        page = CDPPage(self.connection, target["targetId"], session["sessionId"])
+        if self.geolocation:
+            await page.send("Emulation.setGeolocationOverride", {
+                "latitude": self.geolocation[0],
+                "longitude": self.geolocation[1],
+                "accuracy": 100
+            })
+        return page
+
+    async def close(self):
+        try:
+            await self.connection.send("Browser.close", timeout=5)
+        except (CDPError, asyncio.TimeoutError):
+            pass
+        await self.connection.close()
+        if self.process is not None:
+            try:
+                # wait chặn luồng nên chạy ở thread khác để không dừng event loop
+                await asyncio.to_thread(self.process.wait, 10)
+            except subprocess.TimeoutExpired:
+                await stop_chrome(self.process)
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+        logger.info("Đã đóng trình duyệt CDP.")
@@ -0,0 +1,409 @@
+import csv
+import json
+import logging
+import sqlite3
+import threading
+
+from maps_url import parse_place_url, restaurant_key
+
+logger = logging.getLogger(__name__)
+
+# Cột của bảng restaurants, cùng thứ tự với BASE_FIELDNAMES trong Crawl_res_feature_Final.py
+RESTAURANT_COLUMNS = [
+    "Restaurant_id", "Url", "Restaurant_name", "Restaurant_type", "Rating_average",
+    "Num_of_reviews", "Phone", "Price_level", "Address",
+    "Latitude", "Longitude", "Crawl_date"
+]
+
+# Cột của bảng reviews, cùng thứ tự với REVIEW_FIELDNAMES trong Crawl_reviews_Final.py
+REVIEW_COLUMNS = [
+    "Review_id", "Google_review_id", "Restaurant_id", "Reviewer_name", "Reviewer_info", "Rating", "Review_time",
+    "Review_text", "Service_rating", "Food_rating", "Atmosphere_rating",
+    "Service_type", "Meal_type", "Language", "Created_at", "Crawl_date"
+]
+
+# Tách riêng để migrate() dựng lại được bảng; điểm thành phần (Service/Food/Atmosphere)
+# là TEXT, giữ nguyên chuỗi lấy từ trang như trong CSV ("5" chứ không phải "5.0")
+REVIEWS_TABLE = """
+CREATE TABLE IF NOT EXISTS reviews (
+    Review_id INTEGER PRIMARY KEY,
+    Google_review_id TEXT NOT NULL,
+    Restaurant_id INTEGER NOT NULL,
+    Reviewer_name TEXT,
+    Reviewer_info TEXT,
+    Rating REAL,
+    Review_time TEXT,
+    Review_text TEXT,
+    Service_rating TEXT,
+    Food_rating TEXT,
+    Atmosphere_rating TEXT,
+    Service_type TEXT,
+    Meal_type TEXT,
+    Language TEXT,
+    Created_at TEXT,
+    Crawl_date TEXT
+);
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restaurants (
+    Restaurant_id INTEGER PRIMARY KEY,
+    Url TEXT NOT NULL,
+    Restaurant_name TEXT,
+    Restaurant_key TEXT,
+    Restaurant_type TEXT,
+    Rating_average REAL,
+    Num_of_reviews INTEGER,
+    Phone TEXT,
+    Price_level TEXT,
+    Address TEXT,
+    Latitude REAL,
+    Longitude REAL,
+    Crawl_date TEXT
+);
+CREATE TABLE IF NOT EXISTS restaurant_features (
+    Restaurant_id INTEGER NOT NULL REFERENCES restaurants(Restaurant_id),
+    Feature TEXT NOT NULL,
+    Items TEXT NOT NULL,
+    PRIMARY KEY (Restaurant_id, Feature)
+);
+""" + REVIEWS_TABLE + """
+CREATE TABLE IF NOT EXISTS review_watermarks (
+    Restaurant_id INTEGER PRIMARY KEY,
+    Google_review_id TEXT NOT NULL,
+    Created_at TEXT,
+    Num_of_reviews INTEGER
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_restaurants_key ON restaurants (Restaurant_key);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_reviews_restaurant_google ON reviews (Restaurant_id, Google_review_id);
+"""
+
+REAL_COLUMNS = {"Rating_average", "Latitude", "Longitude", "Rating"}
+SUB_RATING_COLUMNS = ["Service_rating", "Food_rating", "Atmosphere_rating"]
+INTEGER_COLUMNS = {"Restaurant_id", "Num_of_reviews", "Review_id"}
+
+
+def to_db_value(column, value):
+    """Chuyển giá trị dạng CSV (chuỗi, '' là rỗng) sang kiểu của cột trong SQLite."""
+    if value is None or (isinstance(value, str) and value.strip() == ""):
+        return None
+    try:
+        if column in INTEGER_COLUMNS:
+            return int(float(value))
+        if column in REAL_COLUMNS:
+            return float(str(value).replace(",", "."))
+    except ValueError:
+        logger.warning(f"Giá trị không hợp lệ cho cột {column}: {value}")
+        return None
+    return value
+
+
+def to_csv_value(value):
+    """Chuyển giá trị SQLite về dạng chuỗi như khi đọc từ CSV."""
+    return "" if value is None else str(value)
+
+
+class CrawlDB:
+    """Kho lưu trữ SQLite (chế độ WAL) cho nhà hàng, feature và đánh giá.
+
+    Dùng thay cho CSV: chống trùng theo khóa (Restaurant_key của nhà hàng, chỉ mục duy nhất
+    (Restaurant_id, Google_review_id) của đánh giá), ghi theo lô trong một
+    transaction và cột có kiểu dữ liệu rõ ràng. Vẫn xuất được CSV cùng định dạng cũ.
+
+    Đối tượng cũng dùng được thay cho ReviewIndex/existing_reviews trong crawler
+    đánh giá (`(rid, gid) in db`, update, known_ids, release, next_id_ref,
+    watermark, set_watermark).
+    Một kết nối dùng chung cho nhiều luồng, được bảo vệ bằng khóa.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+        self.next_id_ref = {'value': self.max_review_id() + 1}
+        logger.info(f"Đã mở cơ sở dữ liệu {db_file}")
+
+    def migrate(self):
+        """Nâng cấp cơ sở dữ liệu cũ lên schema hiện tại."""
+        self.migrate_sub_ratings()
+        self.migrate_restaurant_key()
+
+    def migrate_sub_ratings(self):
+        """Dựng lại bảng reviews cũ có điểm thành phần kiểu REAL thành TEXT.
+
+        Giá trị nguyên được chuyển về dạng "5" như trong CSV. Đổi tên bảng, chép dữ liệu và
+        xóa bảng cũ trong một transaction nên lỗi giữa chừng không làm mất đánh giá.
+        """
+        types = {r[1]: r[2] for r in self.conn.execute("PRAGMA table_info(reviews)")}
+        if all(types.get(col, "TEXT") == "TEXT" for col in SUB_RATING_COLUMNS):
+            return
+        values = ", ".join(
+            f"CASE WHEN typeof({col}) = 'real' AND {col} = CAST({col} AS INTEGER) "
+            f"THEN CAST(CAST({col} AS INTEGER) AS TEXT) ELSE CAST({col} AS TEXT) END"
+            if col in SUB_RATING_COLUMNS else col
+            for col in REVIEW_COLUMNS
+        )
+        self.conn.commit()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("ALTER TABLE reviews RENAME TO reviews_old")
+            self.conn.execute(REVIEWS_TABLE)
+            self.conn.execute(f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) SELECT {values} FROM reviews_old")
+            self.conn.execute("DROP TABLE reviews_old")
+        logger.info("Đã chuyển điểm thành phần của bảng reviews sang kiểu TEXT.")
+
+    def migrate_restaurant_key(self):
+        """Nâng cấp cơ sở dữ liệu cũ chống trùng theo Name_key (tên) lên Restaurant_key (place ID)."""
+        columns = {r[1] for r in self.conn.execute("PRAGMA table_info(restaurants)")}
+        if "Restaurant_key" in columns:
+            return
+        self.conn.execute("ALTER TABLE restaurants ADD COLUMN Restaurant_key TEXT")
+        rows = self.conn.execute("SELECT Restaurant_id, Url, Restaurant_name FROM restaurants").fetchall()
+        self.conn.executemany("UPDATE restaurants SET Restaurant_key = ? WHERE Restaurant_id = ?",
+                              [(restaurant_key(url, name), restaurant_id) for restaurant_id, url, name in rows])
+        logger.info(f"Đã chuyển {len(rows)} nhà hàng sang khóa chống trùng Restaurant_key.")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ---- Nhà hàng ----
+
+    def add_restaurants(self, restaurants):
+        """Thêm các nhà hàng mới (Url, Restaurant_name), bỏ qua nhà hàng đã tồn tại.
+
+        Chống trùng theo place ID trong Url (tên nếu Url không có place ID); tọa độ
+        được lấy luôn từ Url.
+
+        Returns:
+            int: Số nhà hàng mới được thêm.
+        """
+        values = []
+        for r in restaurants:
+            _, latitude, longitude = parse_place_url(r["Url"])
+            key = restaurant_key(r["Url"], r["Restaurant_name"])
+            values.append((r["Url"], r["Restaurant_name"], latitude, longitude, key, key))
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT INTO restaurants (Url, Restaurant_name, Latitude, Longitude, Restaurant_key) "
+                "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM restaurants WHERE Restaurant_key = ?)",
+                values
+            )
+            return self.conn.total_changes - before
+
+    def read_restaurant_rows(self):
+        """Đọc nhà hàng theo cùng định dạng với read_restaurant_rows trên CSV.
+
+        Returns:
+            tuple: (rows, feature_cols), mỗi row là dict chuỗi, cột feature chứa JSON.
+        """
+        with self.lock:
+            feature_cols = [r[0] for r in self.conn.execute(
+                "SELECT DISTINCT Feature FROM restaurant_features ORDER BY Feature")]
+            features = {}
+            for restaurant_id, feature, items in self.conn.execute(
+                    "SELECT Restaurant_id, Feature, Items FROM restaurant_features"):
+                features.setdefault(restaurant_id, {})[feature] = items
+            rows = []
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(RESTAURANT_COLUMNS)} FROM restaurants ORDER BY Restaurant_id")
+            for values in cursor:
+                row = {col: to_csv_value(v) for col, v in zip(RESTAURANT_COLUMNS, values)}
+                row_features = features.get(values[0], {})
+                for col in feature_cols:
+                    row[col] = row_features.get(col, "")
+                rows.append(row)
+        return rows, feature_cols
+
+    def save_restaurant_records(self, data_list):
+        """Ghi (upsert) các record của merge_restaurant_data trong một transaction."""
+        columns = RESTAURANT_COLUMNS
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col != "Restaurant_id")
+        sql = (f"INSERT INTO restaurants ({', '.join(columns)}, Restaurant_key) "
+               f"VALUES ({', '.join('?' for _ in columns)}, ?) "
+               f"ON CONFLICT(Restaurant_id) DO UPDATE SET {updates}")
+        with self.lock, self.conn:
+            for data in data_list:
+                self.conn.execute(sql, [to_db_value(col, data.get(col, "")) for col in columns] +
+                                  [restaurant_key(data.get("Url", ""), data.get("Restaurant_name", ""))])
+                feature_type = data.get("feature_type")
+                if isinstance(feature_type, dict):
+                    restaurant_id = to_db_value("Restaurant_id", data.get("Restaurant_id"))
+                    self.conn.execute("DELETE FROM restaurant_features WHERE Restaurant_id = ?", (restaurant_id,))
+                    self.conn.executemany(
+                        "INSERT INTO restaurant_features (Restaurant_id, Feature, Items) VALUES (?, ?, ?)",
+                        [(restaurant_id, feature, json.dumps(items, ensure_ascii=False))
+                         for feature, items in feature_type.items()]
+                    )
+
+    def import_restaurants_csv(self, output_file):
+        """Nạp restaurants.csv có sẵn vào cơ sở dữ liệu (dùng khi bảng restaurants còn trống).
+
+        Cột ngoài RESTAURANT_COLUMNS được coi là cột feature chứa JSON.
+
+        Returns:
+            int: Số nhà hàng đã nạp.
+        """
+        records = []
+        with open(output_file, mode="r", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                features = {}
+                for col, value in row.items():
+                    if col in RESTAURANT_COLUMNS or not col or not value:
+                        continue
+                    try:
+                        features[col] = json.loads(value)
+                    except ValueError:
+                        logger.warning(f"Feature {col} không hợp lệ cho nhà hàng {row.get('Restaurant_id')}")
+                row["feature_type"] = features
+                records.append(row)
+        self.save_restaurant_records(records)
+        logger.info(f"Đã nạp {len(records)} nhà hàng từ {output_file} vào cơ sở dữ liệu.")
+        return len(records)
+
+    def count_restaurants(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM restaurants").fetchone()[0]
+
+    def restaurants_for_reviews(self):
+        """Danh sách (Restaurant_id, Url, Restaurant_name, Num_of_reviews) cho crawler đánh giá."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT Restaurant_id, Url, Restaurant_name, Num_of_reviews FROM restaurants ORDER BY Restaurant_id").fetchall()
+
+    # ---- Đánh giá ----
+
+    def review_dates(self):
+        """Danh sách (Restaurant_id, Created_at) của mọi đánh giá, dùng để ước lượng tốc độ."""
+        with self.lock:
+            return self.conn.execute("SELECT Restaurant_id, Created_at FROM reviews").fetchall()
+
+    def max_review_id(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(Review_id), 0) FROM reviews").fetchone()[0]
+
+    def __contains__(self, key):
+        restaurant_id, google_review_id = key
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM reviews WHERE Restaurant_id = ? AND Google_review_id = ?",
+                (to_db_value("Restaurant_id", restaurant_id), google_review_id)
+            ).fetchone() is not None
+
+    def known_ids(self, restaurant_id):
+        """Tập Google_review_id đã lưu của một nhà hàng."""
+        with self.lock:
+            return {r[0] for r in self.conn.execute(
+                "SELECT Google_review_id FROM reviews WHERE Restaurant_id = ?",
+                (to_db_value("Restaurant_id", restaurant_id),))}
+
+    def update(self, keys):
+        """Không cần làm gì: khóa đã nằm trong bảng reviews sau insert_reviews."""
+
+    def release(self, restaurant_id):
+        """Không cần làm gì: tập ID không được giữ trong bộ nhớ."""
+
+    def watermark(self, restaurant_id):
+        """Watermark {Google_review_id, Created_at} của nhà hàng, None nếu chưa có.
+
+        Nếu chưa lưu watermark thì suy ra từ bảng reviews: Created_at lớn nhất, rồi
+        Crawl_date lớn nhất, rồi Review_id nhỏ nhất.
+        """
+        restaurant_id = to_db_value("Restaurant_id", restaurant_id)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT Google_review_id, Created_at FROM review_watermarks WHERE Restaurant_id = ?",
+                (restaurant_id,)).fetchone()
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT Google_review_id, Created_at FROM reviews "
+                    "WHERE Restaurant_id = ? AND Created_at IS NOT NULL "
+                    "ORDER BY Created_at DESC, Crawl_date DESC, Review_id ASC LIMIT 1",
+                    (restaurant_id,)).fetchone()
+        if row is None:
+            return None
+        return {"Google_review_id": row[0], "Created_at": to_csv_value(row[1])}
+
+    def set_watermark(self, restaurant_id, google_review_id, created_at, num_of_reviews=None):
+        """Ghi nhận đánh giá mới nhất (và số lượt đánh giá lúc crawl) sau khi đã crawl xong một nhà hàng."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO review_watermarks (Restaurant_id, Google_review_id, Created_at, Num_of_reviews) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(Restaurant_id) DO UPDATE SET Google_review_id = excluded.Google_review_id, "
+                "Created_at = excluded.Created_at, Num_of_reviews = excluded.Num_of_reviews",
+                (to_db_value("Restaurant_id", restaurant_id), google_review_id, created_at or None,
+                 to_db_value("Num_of_reviews", num_of_reviews)))
+
+    def crawled_count(self, restaurant_id):
+        """Num_of_reviews của nhà hàng ở lần crawl đánh giá trước, None nếu chưa có."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT Num_of_reviews FROM review_watermarks WHERE Restaurant_id = ?",
+                (to_db_value("Restaurant_id", restaurant_id),)).fetchone()
+        return row[0] if row else None
+
+    def insert_reviews(self, reviews, assign_ids=True):
+        """Ghi một lô đánh giá trong một transaction.
+
+        Args:
+            reviews: Danh sách dict đánh giá theo REVIEW_COLUMNS.
+            assign_ids: Gán Review_id từ next_id_ref. Bộ đếm chỉ tăng cho đánh giá thực sự
+                được thêm (đánh giá trùng khóa bị bỏ qua không giữ ID) nên Review_id không bị hở.
+                False để giữ Review_id có sẵn (nạp từ CSV).
+
+        Returns:
+            int: Số đánh giá thực sự được thêm (trùng khóa bị bỏ qua).
+        """
+        sql = (f"INSERT OR IGNORE INTO reviews ({', '.join(REVIEW_COLUMNS)}) "
+               f"VALUES ({', '.join('?' for _ in REVIEW_COLUMNS)})")
+        with self.lock:
+            next_id = self.next_id_ref['value']
+            inserted = []
+            with self.conn:
+                for r in reviews:
+                    values = [to_db_value(col, r.get(col, "")) for col in REVIEW_COLUMNS]
+                    if assign_ids:
+                        values[0] = next_id
+                    if self.conn.execute(sql, values).rowcount == 1:
+                        inserted.append((r, next_id))
+                        next_id += 1
+            # Chỉ ghi nhận ID sau khi transaction đã commit
+            if assign_ids:
+                for r, review_id in inserted:
+                    r["Review_id"] = str(review_id)
+                self.next_id_ref['value'] = next_id
+            return len(inserted)
+
+    def import_reviews_csv(self, output_file):
+        """Nạp reviews_all.csv có sẵn vào bảng reviews (dùng khi cơ sở dữ liệu còn trống).
+
+        Returns:
+            int: Số đánh giá đã nạp.
+        """
+        with open(output_file, mode="r", encoding="utf-8-sig") as f:
+            reviews = [row for row in csv.DictReader(f) if row.get("Google_review_id", "").strip()]
+        added = self.insert_reviews(reviews, assign_ids=False)
+        self.next_id_ref['value'] = self.max_review_id() + 1
+        logger.info(f"Đã nạp {added} đánh giá từ {output_file} vào cơ sở dữ liệu.")
+        return added
+
+    def export_reviews_csv(self, output_file):
+        """Xuất bảng reviews ra CSV cùng định dạng reviews_all.csv."""
+        with self.lock, open(output_file, mode="w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(REVIEW_COLUMNS)
+            cursor = self.conn.execute(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM reviews ORDER BY Review_id")
+            for values in cursor:
+                writer.writerow([to_csv_value(v) for v in values])
+        logger.info(f"Đã xuất bảng reviews ra {output_file}")
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Khi chưa có lịch sử, giả định số đánh giá hiện có được tích lũy trong khoảng thời gian này
+PRIOR_AGE_DAYS = 3 * 365
+# Trọng số của lần đo mới khi cập nhật tốc độ và chi phí (trung bình trượt lũy thừa)
+EWMA_ALPHA = 0.5
+# Cửa sổ (ngày) dùng để ước lượng tốc độ từ phân bố Created_at của đánh giá đã lưu
+CREATED_AT_WINDOW_DAYS = 90
+# Các định dạng Crawl_date đã xuất hiện trong restaurants.csv
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M", "%d/%m/%Y"]
+
+
+def parse_date(value):
+    """Đọc Crawl_date/Created_at theo các định dạng đã biết, None nếu không đọc được."""
+    if value is None or (not isinstance(value, str) and pd.isnull(value)):
+        return None
+    value = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_count(value):
+    """Num_of_reviews dạng chuỗi/số (có thể rỗng hoặc NaN) thành int hoặc None."""
+    try:
+        if value is None or (not isinstance(value, str) and pd.isnull(value)) or str(value).strip() == "":
+            return None
+        return int(float(str(value).replace(",", "")))
+    except (TypeError, ValueError):
+        return None
+
+
+class RecrawlScheduler:
+    """Lập lịch crawl lại theo tốc độ thay đổi của từng nhà hàng.
+
+    Mỗi nhà hàng có tốc độ ước lượng (số đánh giá mới mỗi ngày) và chi phí crawl
+    (giây trình duyệt). Số thay đổi kỳ vọng từ lần crawl trước là tốc độ nhân số
+    ngày đã trôi qua; plan() sắp xếp nhà hàng theo số thay đổi kỳ vọng trên mỗi giây
+    crawl và lấy lần lượt cho đến khi hết budget, để mỗi giờ trình duyệt thu được
+    nhiều dữ liệu mới nhất.
+
+    Tốc độ lấy từ (theo thứ tự ưu tiên): chênh lệch Num_of_reviews giữa các lần crawl
+    (lưu trong state_file), phân bố Created_at của đánh giá đã lưu (seed_from_reviews),
+    hoặc Num_of_reviews / PRIOR_AGE_DAYS. Thời điểm crawl trước lấy từ state_file,
+    nếu chưa có thì từ Crawl_date. Nhà hàng chưa từng crawl luôn được ưu tiên trước.
+
+    state_file (JSON) lưu cho mỗi Restaurant_id: count, crawled_at, rate, cost.
+    """
+
+    def __init__(self, state_file, budget_seconds=None, default_cost=30.0):
+        self.state_file = state_file
+        self.budget_seconds = budget_seconds
+        self.default_cost = default_cost
+        self.lock = threading.Lock()
+        self.state = {}
+        if os.path.isfile(state_file):
+            try:
+                with open(state_file, encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Không đọc được lịch crawl {state_file}: {e}")
+
+    def save(self):
+        with self.lock:
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, mode="w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+
+    def seed_from_reviews(self, reviews_df, now=None):
+        """Ước lượng tốc độ từ Created_at cho các nhà hàng chưa có tốc độ đo được.
+
+        Args:
+            reviews_df: DataFrame có cột Restaurant_id và Created_at.
+        """
+        now = now or datetime.now()
+        created = pd.to_datetime(reviews_df["Created_at"], errors="coerce")
+        recent = reviews_df.loc[created >= now - pd.Timedelta(days=CREATED_AT_WINDOW_DAYS), "Restaurant_id"]
+        counts = recent.astype(str).value_counts()
+        with self.lock:
+            for restaurant_id, count in counts.items():
+                entry = self.state.setdefault(restaurant_id, {})
+                if entry.get("rate") is None:
+                    entry["rate"] = count / CREATED_AT_WINDOW_DAYS
+        logger.info(f"Ước lượng tốc độ từ Created_at cho {len(counts)} nhà hàng.")
+
+    def rate(self, restaurant_id, row):
+        entry = self.state.get(restaurant_id, {})
+        if entry.get("rate") is not None:
+            return entry["rate"]
+        count = parse_count(row.get("Num_of_reviews"))
+        return (count or 0) / PRIOR_AGE_DAYS
+
+    def last_crawled(self, restaurant_id, row):
+        entry = self.state.get(restaurant_id, {})
+        return parse_date(entry.get("crawled_at")) or parse_date(row.get("Crawl_date"))
+
+    def cost(self, restaurant_id):
+        return self.state.get(restaurant_id, {}).get("cost") or self.default_cost
+
+    def plan(self, indexed_rows, now=None):
+        """Sắp xếp và chọn các nhà hàng cần crawl trong budget.
+
+        Args:
+            indexed_rows: Danh sách (row_index, row); row có Restaurant_id,
+                Num_of_reviews và Crawl_date (nếu có).
+
+        Returns:
+            list: Các (row_index, row) được chọn, theo thứ tự ưu tiên giảm dần.
+        """
+        now = now or datetime.now()
+        scored = []
+        with self.lock:
+            for i, row in indexed_rows:
+                restaurant_id = str(row.get("Restaurant_id", ""))
+                last = self.last_crawled(restaurant_id, row)
+                cost = self.cost(restaurant_id)
+                if last is None:
+                    expected = float("inf")
+                else:
+                    days = max((now - last).total_seconds() / 86400, 0)
+                    expected = self.rate(restaurant_id, row) * days
+                # Nhà hàng chưa từng crawl xếp trước, nhiều đánh giá hơn xếp trước
+                tie = parse_count(row.get("Num_of_reviews")) or 0
+                scored.append((expected / cost, tie, expected, cost, i, row))
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+
+        selected = []
+        used = 0.0
+        expected_total = sum(item[2] for item in scored if item[2] != float("inf"))
+        expected_selected = 0.0
+        for _, _, expected, cost, i, row in scored:
+            if self.budget_seconds is not None and used + cost > self.budget_seconds:
+                continue
+            selected.append((i, row))
+            used += cost
+            if expected != float("inf"):
+                expected_selected += expected
+
+        coverage = expected_selected / expected_total if expected_total else 1.0
+        logger.info(f"Lịch crawl: chọn {len(selected)}/{len(scored)} nhà hàng, ước tính {used / 60:.1f} phút, "
+                    f"bao phủ {coverage:.1%} số thay đổi kỳ vọng.")
+        return selected
+
+    def record(self, restaurant_id, num_of_reviews, duration, now=None):
+        """Ghi nhận một lần crawl: cập nhật tốc độ theo chênh lệch Num_of_reviews và chi phí.
+
+        Args:
+            restaurant_id: Restaurant_id.
+            num_of_reviews: Num_of_reviews đọc được ở lần crawl này (None nếu không có).
+            duration: Thời gian crawl (giây), None nếu không mở trình duyệt (không cập nhật chi phí).
+        """
+        now = now or datetime.now()
+        restaurant_id = str(restaurant_id)
+        count = parse_count(num_of_reviews)
+        with self.lock:
+            entry = self.state.setdefault(restaurant_id, {})
+            last = parse_date(entry.get("crawled_at"))
+            if count is not None and entry.get("count") is not None and last is not None:
+                days = (now - last).total_seconds() / 86400
+                if days > 0:
+                    measured = max(count - entry["count"], 0) / days
+                    old = entry.get("rate")
+                    entry["rate"] = measured if old is None else EWMA_ALPHA * measured + (1 - EWMA_ALPHA) * old
+            if count is not None:
+                entry["count"] = count
+            entry["crawled_at"] = now.strftime("%Y-%m-%d %H:%M:%S")
+            if duration is not None:
+                old_cost = entry.get("cost")
+                entry["cost"] = duration if old_cost is None else EWMA_ALPHA * duration + (1 - EWMA_ALPHA) * old_cost
+        self.save()
@@ -0,0 +1,67 @@
+import re
+
+import pandas as pd
+
+# Url nhà hàng trên Google Maps có dạng .../place/<tên>/data=!4m7!3m6!1s0x...:0x...!8m2!3d<lat>!4d<lng>...
+# !1s là feature ID (cố định cho mỗi địa điểm), !3d/!4d là tọa độ của địa điểm.
+PLACE_ID_PATTERN = r"!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)"
+LATITUDE_PATTERN = r"!3d(-?\d+(?:\.\d+)?)"
+LONGITUDE_PATTERN = r"!4d(-?\d+(?:\.\d+)?)"
+
+PLACE_ID_REGEX = re.compile(PLACE_ID_PATTERN)
+LATITUDE_REGEX = re.compile(LATITUDE_PATTERN)
+LONGITUDE_REGEX = re.compile(LONGITUDE_PATTERN)
+
+
+def parse_place_url(url):
+    """Đọc place ID và tọa độ từ một Url Google Maps.
+
+    Returns:
+        tuple: (place_id, latitude, longitude), phần nào không có thì là None.
+    """
+    if not isinstance(url, str):
+        return None, None, None
+    place_id = PLACE_ID_REGEX.search(url)
+    latitude = LATITUDE_REGEX.search(url)
+    longitude = LONGITUDE_REGEX.search(url)
+    return (place_id.group(1).lower() if place_id else None,
+            float(latitude.group(1)) if latitude else None,
+            float(longitude.group(1)) if longitude else None)
+
+
+def parse_place_urls(urls):
+    """Đọc place ID và tọa độ cho cả một cột Url trong một lượt vector hóa.
+
+    Args:
+        urls: Series (hoặc list) Url.
+
+    Returns:
+        DataFrame cùng index với các cột Place_id, Latitude, Longitude (NaN nếu không có).
+    """
+    urls = pd.Series(urls, dtype=object).astype("string")
+    return pd.DataFrame({
+        "Place_id": urls.str.extract(PLACE_ID_PATTERN, expand=False).str.lower().astype(object),
+        "Latitude": pd.to_numeric(urls.str.extract(LATITUDE_PATTERN, expand=False), errors="coerce"),
+        "Longitude": pd.to_numeric(urls.str.extract(LONGITUDE_PATTERN, expand=False), errors="coerce"),
+    }, index=urls.index)
+
+
+def restaurant_key(url, name):
+    """Khóa chống trùng nhà hàng: place ID trong Url, nếu Url không có thì tên viết thường.
+
+    Hai chi nhánh cùng tên có place ID khác nhau nên không bị gộp làm một.
+    """
+    place_id = parse_place_url(url)[0]
+    if place_id:
+        return "place:" + place_id
+    return name.strip().lower() if name else None
+
+
+def restaurant_keys(urls, names):
+    """restaurant_key cho cả một cột Url/Restaurant_name."""
+    urls = pd.Series(urls, dtype=object)
+    names = pd.Series(names, dtype=object, index=urls.index)
+    place_ids = parse_place_urls(urls)["Place_id"]
+    name_keys = names.where(names.notna(), "").astype(str).str.strip().str.lower()
+    keys = ("place:" + place_ids.astype(str)).where(place_ids.notna(), name_keys)
+    return keys.where(keys != "", None)
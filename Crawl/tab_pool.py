@@ -0,0 +1,149 @@
+import logging
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# Tham số Chrome để tab nền vẫn tải và render với tốc độ bình thường
+BACKGROUND_TAB_ARGUMENTS = [
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+]
+
+# Bắt đầu điều hướng mà không chờ trang tải xong (driver.get thì chặn đến khi tải xong).
+# Dấu đánh dấu nằm trên window cũ, trang mới không có nên phân biệt được trang cũ còn hiển thị.
+NAVIGATE_JS = "window.__tabPoolPending = true; window.location.href = arguments[0];"
+READY_JS = """
+return !window.__tabPoolPending && document.readyState !== 'loading'
+    && document.querySelector(arguments[0]) !== null;
+"""
+
+
+class TabPool:
+    """Nhiều tab trong cùng một Chrome, mỗi tab tải một trang song song với các tab khác.
+
+    load() bắt đầu tải một trang trong tab mà không chờ; next_ready() xoay vòng qua các
+    tab đang tải và chuyển driver sang tab đầu tiên đã có ready_selector, để trích xuất
+    trên tab đó trong khi các tab còn lại tiếp tục tải. Nên tạo driver với
+    BACKGROUND_TAB_ARGUMENTS để Chrome không làm chậm các tab nền.
+    """
+
+    def __init__(self, driver, num_tabs, ready_selector, timeout=30, poll_interval=0.2):
+        """
+        Args:
+            driver: WebDriver; tab hiện tại là tab đầu tiên của pool.
+            num_tabs: Số tab.
+            ready_selector: CSS selector cho biết trang đã sẵn sàng để trích xuất.
+            timeout: Số giây tối đa chờ một trang.
+            poll_interval: Số giây nghỉ khi chưa có tab nào sẵn sàng.
+        """
+        self.driver = driver
+        self.ready_selector = ready_selector
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.handles = [driver.current_window_handle]
+        for _ in range(num_tabs - 1):
+            driver.switch_to.new_window("tab")
+            self.handles.append(driver.current_window_handle)
+        driver.switch_to.window(self.handles[0])
+        # handle -> (item, thời điểm bắt đầu tải) của tab đang tải
+        self.loading = {}
+        # Tab không tải được trang (trả về ngay với ready=False)
+        self.failed = set()
+        self.next_index = 0
+
+    def free_tabs(self):
+        return [handle for handle in self.handles if handle not in self.loading]
+
+    def busy(self):
+        return bool(self.loading)
+
+    def load(self, handle, item, url):
+        """Bắt đầu tải url trong tab handle; item được trả lại qua next_ready()."""
+        self.driver.switch_to.window(handle)
+        self.loading[handle] = (item, time.monotonic())
+        try:
+            self.driver.execute_script(NAVIGATE_JS, url)
+        except WebDriverException as e:
+            # Trang cũ treo không chạy được script: điều hướng kiểu chặn
+            logger.warning(f"Không điều hướng bất đồng bộ được, dùng driver.get: {e}")
+            try:
+                self.driver.get(url)
+            except WebDriverException as e:
+                # Kể cả TimeoutException khi tải trang: bỏ qua item như một lần quá thời gian chờ
+                logger.warning(f"Không tải được {url}: {e}")
+                self.failed.add(handle)
+
+    def next_ready(self):
+        """Chờ tab tiếp theo (xoay vòng) sẵn sàng hoặc quá timeout và chuyển driver sang tab đó.
+
+        Returns:
+            tuple: (handle, item, ready, elapsed) với ready False nếu quá timeout hoặc
+            không tải được trang;
+            None nếu không có tab nào đang tải.
+        """
+        while self.loading:
+            handles = [h for h in self.handles if h in self.loading]
+            for k in range(len(handles)):
+                handle = handles[(self.next_index + k) % len(handles)]
+                item, started = self.loading[handle]
+                elapsed = time.monotonic() - started
+                failed = handle in self.failed
+                self.driver.switch_to.window(handle)
+                ready = False
+                if not failed:
+                    try:
+                        ready = bool(self.driver.execute_script(READY_JS, self.ready_selector))
+                    except WebDriverException:
+                        # Đang chuyển trang, thử lại ở vòng sau
+                        ready = False
+                if ready or failed or elapsed > self.timeout:
+                    self.failed.discard(handle)
+                    self.next_index = (self.handles.index(handle) + 1) % len(self.handles)
+                    del self.loading[handle]
+                    return handle, item, ready, elapsed
+            time.sleep(self.poll_interval)
+        return None
+
+    def close(self):
+        """Đóng các tab phụ, giữ lại tab đầu tiên."""
+        for handle in self.handles[1:]:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except WebDriverException:
+                pass
+        self.driver.switch_to.window(self.handles[0])
+        self.handles = self.handles[:1]
+        self.loading = {}
+        self.failed = set()
+
+
+def run_in_tabs(pool, items, url_of):
+    """Tải lần lượt items trong các tab của pool, trả về từng item khi trang của nó sẵn sàng.
+
+    Tab vừa trả về được nạp item tiếp theo ngay sau khi người gọi xử lý xong (ở lần
+    lặp kế tiếp), nên luôn có tối đa số tab trang đang tải song song.
+
+    Args:
+        pool: TabPool.
+        items: Iterable các item cần tải.
+        url_of: Hàm lấy URL từ item.
+
+    Yields:
+        tuple: (item, ready, elapsed); driver đang ở tab của item.
+    """
+    items = iter(items)
+    for handle in pool.free_tabs():
+        item = next(items, None)
+        if item is None:
+            break
+        pool.load(handle, item, url_of(item))
+    while pool.busy():
+        handle, item, ready, elapsed = pool.next_ready()
+        yield item, ready, elapsed
+        following = next(items, None)
+        if following is not None:
+            pool.load(handle, following, url_of(following))